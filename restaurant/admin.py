@@ -1,8 +1,9 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.db.models import F
 from .forms import CustomUserCreationForm, CustomUserChangeForm
 
-from .models import User, Table, MenuItem, Reservation, Order, OrderItem
+from .models import User, Table, MenuItem, Reservation, Order, OrderItem, Ticket, Job
 
 
 class UserAdmin(BaseUserAdmin):
@@ -49,6 +50,17 @@ class OrderAdmin(admin.ModelAdmin):
     list_filter = ('is_paid',)
     search_fields = ('table__number',)
 
+    def save_formset(self, request, form, formset, change):
+        # lines edited here bypass the order endpoints: price new or switched
+        # items at today's menu, then rebuild the totals from the lines
+        for line_form in formset.forms:
+            if 'menu_item' in line_form.changed_data:
+                line_form.instance.unit_price = None
+        super().save_formset(request, form, formset, change)
+        if formset.model is OrderItem:
+            order = form.instance
+            Order.objects.filter(pk=order.pk).update(version=F('version') + 1, **Order.line_totals(order.pk))
+
 
 class ReservationAdmin(admin.ModelAdmin):
     list_display = ('user', 'table', 'datetime', 'status')
@@ -62,9 +74,21 @@ class MenuItemAdmin(admin.ModelAdmin):
     list_filter = ("item_type",)
 
 
+class TicketAdmin(admin.ModelAdmin):
+    list_display = ('id', 'station', 'table_number', 'status', 'created_at')
+    list_filter = ('station', 'status')
+
+
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'run_at', 'finished_at')
+    list_filter = ('status', 'name')
+
+
 admin.site.register(User, UserAdmin)
 admin.site.register(Table, TableAdmin)
 admin.site.register(MenuItem, MenuItemAdmin)
 admin.site.register(Reservation, ReservationAdmin)
 admin.site.register(Order, OrderAdmin)
 admin.site.register(OrderItem)
+admin.site.register(Ticket, TicketAdmin)
+admin.site.register(Job, JobAdmin)
@@ -6,4 +6,5 @@ class RestaurantConfig(AppConfig):
     name = "restaurant"
 
     def ready(self):
+        import restaurant.checks
         import restaurant.signals
@@ -0,0 +1,112 @@
+from django.db import router, transaction
+from django.db.models.functions import Coalesce
+
+from .availability import index as reservation_index
+from .models import Order, OrderItem, Reservation, ArchivedOrder, ArchivedReservation, Ticket
+
+ORDER_LINE_FIELDS = ('order_id', 'menu_item_id', 'menu_item__code', 'menu_item__name',
+                     'menu_item__item_type', 'unit_price', 'quantity')
+
+
+def _raw_delete(model, pks):
+    # a plain DELETE: post_delete receivers would queue per-row cache bumps and
+    # events for records that are no longer part of the floor or the index
+    model.objects.filter(pk__in=pks)._raw_delete(router.db_for_write(model))
+
+
+def orders_before(cutoff):
+    """Paid orders sold before ``cutoff``."""
+    return (
+        Order.objects.filter(is_paid=True)
+        .annotate(sold_at=Coalesce('paid_at', 'created_at'))
+        .filter(sold_at__lt=cutoff)
+    )
+
+
+def reservations_before(cutoff):
+    return Reservation.objects.filter(datetime__lt=cutoff)
+
+
+def archive_orders(cutoff, batch_size=500):
+    """Move orders paid before ``cutoff`` into the archive, one transaction per batch.
+
+    Yields the number of orders moved by each batch.
+    """
+    return archive_paid(orders_before(cutoff), batch_size)
+
+
+def archive_paid(orders, batch_size=500):
+    """Move the paid orders among ``orders`` into the archive, one transaction per batch."""
+    paid = orders.filter(is_paid=True).order_by('pk')
+    while True:
+        with transaction.atomic():
+            orders = list(paid.values(
+                'id', 'table_id', 'table__number', 'created_at', 'paid_at', 'total', 'items_count'
+            )[:batch_size])
+            if not orders:
+                return
+            ids = [o['id'] for o in orders]
+            lines = {}
+            line_ids = []
+            for row in OrderItem.objects.filter(order_id__in=ids).order_by('pk').values('id', *ORDER_LINE_FIELDS):
+                line_ids.append(row['id'])
+                lines.setdefault(row['order_id'], []).append({
+                    'menu_item_id': row['menu_item_id'],
+                    'code': row['menu_item__code'],
+                    'name': row['menu_item__name'],
+                    'item_type': row['menu_item__item_type'],
+                    'price': row['unit_price'],
+                    'quantity': row['quantity'],
+                })
+            ArchivedOrder.objects.bulk_create(
+                ArchivedOrder(
+                    id=o['id'],
+                    table_id=o['table_id'],
+                    table_number=o['table__number'],
+                    created_at=o['created_at'],
+                    paid_at=o['paid_at'],
+                    total=o['total'],
+                    items_count=o['items_count'],
+                    lines=lines.get(o['id'], []),
+                )
+                for o in orders
+            )
+            _raw_delete(OrderItem, line_ids)
+            # tickets of a paid order are long done; they aren't archived
+            Ticket.objects.filter(order_id__in=ids)._raw_delete(router.db_for_write(Ticket))
+            _raw_delete(Order, ids)
+        yield len(ids)
+
+
+def archive_reservations(cutoff, batch_size=500):
+    """Move reservations dated before ``cutoff`` into the archive, one transaction per batch.
+
+    Yields the number of reservations moved by each batch.
+    """
+    past = reservations_before(cutoff).order_by('pk')
+    while True:
+        with transaction.atomic():
+            rows = list(past.values(
+                'id', 'user_id', 'user__username', 'table_id', 'table__number',
+                'datetime', 'description', 'status'
+            )[:batch_size])
+            if not rows:
+                return
+            ArchivedReservation.objects.bulk_create(
+                ArchivedReservation(
+                    id=r['id'],
+                    user_id=r['user_id'],
+                    username=r['user__username'],
+                    table_id=r['table_id'],
+                    table_number=r['table__number'],
+                    datetime=r['datetime'],
+                    description=r['description'],
+                    status=r['status'],
+                )
+                for r in rows
+            )
+            ids = [r['id'] for r in rows]
+            _raw_delete(Reservation, ids)
+            entries = [(pk, None, None, False) for pk in ids]
+            transaction.on_commit(lambda: reservation_index.apply_many(entries))
+        yield len(ids)
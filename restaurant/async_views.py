@@ -0,0 +1,125 @@
+import math
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, HttpResponseNotAllowed, HttpResponseNotModified, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+
+from . import events
+from .authentication import RoleTokenUser, aauthenticate
+from .catalog import amenu_catalog
+from .models import User, Zone
+from .renderers import ORJSONRenderer
+from .snapshot import afloor_snapshot, floor_etag
+from .tickets import STATIONS, await_tickets
+from .views import etag_matches
+
+
+def _json(data, status=200):
+    # the same bytes the DRF views render, not JsonResponse's ASCII-escaped, spaced output
+    return HttpResponse(ORJSONRenderer().render(data), status=status, content_type=ORJSONRenderer.media_type)
+
+
+def _denied(user, roles=None):
+    if user is None:
+        return _json({"detail": "Authentication credentials were not provided."}, status=401)
+    if roles is not None and user.role not in roles:
+        return _json({"detail": "You do not have permission to perform this action."}, status=403)
+    return None
+
+
+def _etag_response(request, data, etag):
+    if etag_matches(request, etag):
+        response = HttpResponseNotModified()
+    else:
+        response = _json(data)
+    response['ETag'] = etag
+    return response
+
+
+def async_get(async_view, sync_view):
+    """Serve GET/HEAD with ``async_view`` and hand every other method to the DRF view."""
+
+    @csrf_exempt
+    async def view(request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            return await async_view(request, *args, **kwargs)
+        return await sync_to_async(sync_view)(request, *args, **kwargs)
+
+    # replica routing and the metrics labels read the DRF view's class and actions
+    for attr in ('cls', 'actions', 'initkwargs'):
+        if hasattr(sync_view, attr):
+            setattr(view, attr, getattr(sync_view, attr))
+    return view
+
+
+async def table_status(request):
+    user = await aauthenticate(request)
+    denied = _denied(user, ['manager', 'waiter'])
+    if denied:
+        return denied
+    version, data = await afloor_snapshot()
+    return _etag_response(request, data, floor_etag(version))
+
+
+async def menu_list(request):
+    denied = _denied(await aauthenticate(request))
+    if denied:
+        return denied
+    catalog = await amenu_catalog()
+    return _etag_response(request, catalog.rows, catalog.etag)
+
+
+async def zone_list(request):
+    # ZoneViewSet has no permission classes, so zones stay public here too
+    data = [z async for z in Zone.objects.values('id', 'type', 'top', 'left', 'width', 'height')]
+    return _json(data)
+
+
+async def me(request):
+    u = await aauthenticate(request)
+    denied = _denied(u)
+    if denied:
+        return denied
+    if isinstance(u, RoleTokenUser):
+        u = await User.objects.aget(pk=u.id)
+    return _json({
+        "id": u.id,
+        "username": u.username,
+        "email": u.email,
+        "role": getattr(u, "role", None),
+    })
+
+
+async def event_stream(request):
+    # EventSource cannot send headers, so the token may also come as ?token=
+    user = await aauthenticate(request, allow_query_token=True)
+    denied = _denied(user, ['manager', 'waiter'])
+    if denied:
+        return denied
+
+    response = StreamingHttpResponse(events.stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def station_tickets(request, station):
+    """Long-poll for a station's open tickets past ``?after=``, waiting up to ``?wait=`` seconds."""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    denied = _denied(await aauthenticate(request), ['manager', 'waiter'])
+    if denied:
+        return denied
+    if station not in STATIONS.values():
+        return _json({"detail": "Not found."}, status=404)
+    try:
+        after = int(request.GET.get('after', 0))
+        wait = float(request.GET.get('wait', 0))
+        if not math.isfinite(wait):
+            # float() accepts nan and inf, which would never time out
+            raise ValueError(wait)
+    except ValueError:
+        return _json({"detail": "after and wait must be finite numbers."}, status=400)
+
+    tickets = await await_tickets(station, after, wait)
+    return _json({"tickets": tickets, "cursor": tickets[-1]['id'] if tickets else after})
@@ -0,0 +1,136 @@
+from django.core.cache import cache
+from django.db import router
+from django.utils.functional import cached_property
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+
+ROLE_CLAIM = 'role'
+USER_STATE_KEY = 'restaurant:auth:user:{}'
+USER_STATE_TIMEOUT = 60
+
+
+class RoleTokenUser(TokenUser):
+    """Request user built from the token claims alone."""
+
+    @cached_property
+    def role(self):
+        return self.token.get(ROLE_CLAIM)
+
+    def get_user(self):
+        return User.objects.get(pk=self.id)
+
+
+def _state_from_row(row):
+    if row is None:
+        return {'is_active': False, 'role_changed_at': None}
+    changed = row['role_changed_at']
+    return {'is_active': row['is_active'], 'role_changed_at': int(changed.timestamp()) if changed else None}
+
+
+def _primary_users():
+    # a lagging replica would revive a deactivated user or an old role, and the
+    # state is cached once read
+    return User.objects.using(router.db_for_write(User))
+
+
+def _state_query(user_id):
+    return _primary_users().filter(pk=user_id).values('is_active', 'role_changed_at')
+
+
+def user_state(user_id, fresh=False):
+    """``is_active`` and the last role change of a user, cached for a short while."""
+    key = USER_STATE_KEY.format(user_id)
+    state = None if fresh else cache.get(key)
+    if state is None:
+        state = _state_from_row(_state_query(user_id).first())
+        cache.set(key, state, timeout=USER_STATE_TIMEOUT)
+    return state
+
+
+async def auser_state(user_id):
+    key = USER_STATE_KEY.format(user_id)
+    state = await cache.aget(key)
+    if state is None:
+        state = _state_from_row(await _state_query(user_id).afirst())
+        await cache.aset(key, state, timeout=USER_STATE_TIMEOUT)
+    return state
+
+
+def forget_user_state(user_id):
+    cache.delete(USER_STATE_KEY.format(user_id))
+
+
+def check_token(token, state):
+    if not state['is_active']:
+        raise AuthenticationFailed("User not found or inactive.", code='user_inactive')
+    changed = state['role_changed_at']
+    # iat has one-second resolution, so a token from the same second is treated as stale
+    if changed is not None and token.get('iat', 0) <= changed:
+        raise AuthenticationFailed("The token was issued before a role change.", code='token_revoked')
+
+
+class RoleClaimsJWTAuthentication(JWTAuthentication):
+    """JWT authentication that trusts the role claim instead of loading the user row.
+
+    Tokens issued before the role claim existed fall back to the usual lookup.
+    """
+
+    def get_user(self, validated_token):
+        if ROLE_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+        check_token(validated_token, user_state(user_id))
+        return RoleTokenUser(validated_token)
+
+
+async def aauthenticate(request, allow_query_token=False):
+    """Async counterpart of ``RoleClaimsJWTAuthentication``; returns the user or None."""
+    auth = RoleClaimsJWTAuthentication()
+    header = auth.get_header(request)
+    raw = auth.get_raw_token(header) if header else None
+    if raw is None and allow_query_token:
+        raw = request.GET.get('token')
+    if not raw:
+        return None
+    try:
+        token = auth.get_validated_token(raw)
+        user_id = token[api_settings.USER_ID_CLAIM]
+    except (InvalidToken, TokenError, KeyError):
+        return None
+
+    if ROLE_CLAIM not in token:
+        return await _primary_users().filter(pk=user_id, is_active=True).afirst()
+    try:
+        check_token(token, await auser_state(user_id))
+    except AuthenticationFailed:
+        return None
+    return RoleTokenUser(token)
+
+
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token[ROLE_CLAIM] = user.role
+        return token
+
+
+class RoleTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        if user_id is not None and ROLE_CLAIM in refresh.payload:
+            try:
+                check_token(refresh.payload, user_state(user_id, fresh=True))
+            except AuthenticationFailed as e:
+                raise InvalidToken(e.detail)
+        return super().validate(attrs)
@@ -0,0 +1,98 @@
+import bisect
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import router
+
+from .models import Reservation
+from .versions import current_version, bump_version
+
+INDEX_VERSION_KEY = 'restaurant:reservations:version'
+
+
+def reservation_duration() -> timedelta:
+    return getattr(settings, 'RESERVATION_DURATION', timedelta(hours=2))
+
+
+class ReservationIndex:
+    """Approved reservation start times per table, kept sorted for interval lookups.
+
+    Every process keeps its own copy. Changes are applied in place only when
+    our bump is the next version after the one we loaded; otherwise the copy
+    is reloaded, and the shared version tells other processes to reload theirs.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._starts = {}
+        self._entries = {}
+
+    def _load(self):
+        self._starts = {}
+        self._entries = {}
+        rows = (
+            Reservation.objects.using(router.db_for_write(Reservation))
+            .filter(status='approved').values_list('id', 'table_id', 'datetime')
+        )
+        for pk, table_id, dt in rows:
+            self._entries[pk] = (table_id, dt)
+            self._starts.setdefault(table_id, []).append((dt, pk))
+        for starts in self._starts.values():
+            starts.sort()
+
+    def _ensure_current(self):
+        version = current_version(INDEX_VERSION_KEY)
+        if self._version != version:
+            self._load()
+            self._version = version
+
+    def _remove(self, pk):
+        entry = self._entries.pop(pk, None)
+        if entry is None:
+            return
+        table_id, dt = entry
+        starts = self._starts.get(table_id, [])
+        i = bisect.bisect_left(starts, (dt, pk))
+        if i < len(starts) and starts[i] == (dt, pk):
+            del starts[i]
+
+    def apply(self, pk, table_id, dt, approved):
+        self.apply_many([(pk, table_id, dt, approved)])
+
+    def apply_many(self, entries):
+        """Apply ``(pk, table_id, datetime, approved)`` changes under one version bump."""
+        with self._lock:
+            version = bump_version(INDEX_VERSION_KEY)
+            if self._version is None or version != self._version + 1:
+                # another change landed since our copy was loaded; reload
+                # lazily on the next search
+                self._version = None
+                return
+            for pk, table_id, dt, approved in entries:
+                self._remove(pk)
+                if approved:
+                    self._entries[pk] = (table_id, dt)
+                    bisect.insort(self._starts.setdefault(table_id, []), (dt, pk))
+            self._version = version
+
+    def discard(self, pk):
+        self.apply(pk, None, None, approved=False)
+
+    def is_free(self, table_id, start, end) -> bool:
+        # a reservation at t occupies [t, t + duration), so it overlaps
+        # [start, end) exactly when start - duration < t < end
+        starts = self._starts.get(table_id)
+        if not starts:
+            return True
+        i = bisect.bisect_right(starts, (start - reservation_duration(), float('inf')))
+        return i == len(starts) or starts[i][0] >= end
+
+    def free_tables(self, table_ids, start, end) -> list:
+        with self._lock:
+            self._ensure_current()
+            return [t for t in table_ids if self.is_free(t, start, end)]
+
+
+index = ReservationIndex()
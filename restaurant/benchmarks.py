@@ -0,0 +1,213 @@
+import itertools
+import random
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .authentication import RoleTokenObtainPairSerializer
+from .models import User, Table, Zone, MenuItem, Reservation, Order, OrderItem
+
+DEFAULT_VOLUMES = {
+    'tables': 200,
+    'zones': 6,
+    'menu_items': 120,
+    'reservations': 5000,
+    'orders': 2000,
+    'lines_per_order': 4,
+}
+
+# most queries one request may run, counting BEGIN/COMMIT/SAVEPOINT, cold cache rebuilds
+# and the first lookup of the caller's auth state; none may grow with the seeded volumes
+QUERY_BUDGETS = {
+    'GET /api/tables/status/': 2,
+    'GET /api/menu-items/': 2,
+    'GET /api/orders/': 3,
+    'POST /api/orders/{id}/add_item/': 14,
+    'POST /api/orders/{id}/set_item_qty/': 11,
+    'POST /api/orders/{id}/batch/': 12,
+    'GET /api/reservations/': 3,
+    'POST /api/reservations/{id}/approve/': 9,
+}
+
+
+def seed(volumes, rng=None):
+    """Fill an empty database with synthetic floor, menu, reservation and order data."""
+    rng = rng or random.Random(0)
+    v = {**DEFAULT_VOLUMES, **volumes}
+
+    manager = User.objects.create_user('bench-manager', password='bench', role='manager')
+    waiter = User.objects.create_user('bench-waiter', password='bench', role='waiter')
+    client = User.objects.create_user('bench-client', password='bench', role='client')
+
+    Zone.objects.bulk_create(
+        Zone(type=rng.choice(['glass', 'terrace', 'green']), top=i * 120, left=0, width=600, height=100)
+        for i in range(v['zones'])
+    )
+    items = MenuItem.objects.bulk_create(
+        MenuItem(name=f'Item {i}', item_type='food' if i % 3 else 'drink', price=rng.randint(80, 900), code=f'M{i:05d}')
+        for i in range(v['menu_items'])
+    )
+    tables = Table.objects.bulk_create(
+        Table(number=i + 1, chairs=rng.choice([2, 4, 6, 8]), status='available', top=rng.random() * 800, left=rng.random() * 1200)
+        for i in range(v['tables'])
+    )
+
+    start = timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(days=180)
+    Reservation.objects.bulk_create(
+        Reservation(
+            user=client,
+            table=tables[i % len(tables)],
+            # one slot per table per hour keeps the approved-uniqueness constraint satisfied
+            datetime=start + timedelta(hours=i // len(tables)),
+            description='',
+            status=rng.choice(['pending', 'approved', 'rejected']),
+        )
+        for i in range(v['reservations'])
+    )
+
+    # every table gets at most one open order; the rest is paid history
+    open_tables = tables[: len(tables) // 2]
+    specs = [(t, False) for t in open_tables[: v['orders']]]
+    specs += [(tables[i % len(tables)], True) for i in range(max(v['orders'] - len(specs), 0))]
+    lines = [[(mi, rng.randint(1, 3)) for mi in rng.sample(items, min(v['lines_per_order'], len(items)))] for _ in specs]
+    orders = Order.objects.bulk_create(
+        Order(
+            table=t,
+            is_paid=paid,
+            total=sum(mi.price * q for mi, q in ls),
+            items_count=len(ls),
+        )
+        for (t, paid), ls in zip(specs, lines)
+    )
+    OrderItem.objects.bulk_create(
+        OrderItem(order=o, menu_item=mi, quantity=q, unit_price=mi.price)
+        for o, ls in zip(orders, lines) for mi, q in ls
+    )
+    Table.objects.filter(pk__in=[t.pk for t, paid in specs if not paid]).update(status='occupied')
+
+    return {'manager': manager, 'waiter': waiter, 'client': client}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    rank = max(int(round(pct / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def measure(name, make_request, iterations, budget=None):
+    latencies = []
+    queries = []
+    statuses = set()
+    for _ in range(iterations):
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            response = make_request()
+            latencies.append((time.perf_counter() - start) * 1000)
+        queries.append(len(ctx.captured_queries))
+        statuses.add(response.status_code)
+
+    # a separate traced call, so tracemalloc overhead stays out of the latencies
+    tracemalloc.start()
+    make_request()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        'endpoint': name,
+        'iterations': iterations,
+        'status_codes': sorted(statuses),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 3),
+            'p95': round(percentile(latencies, 95), 3),
+            'p99': round(percentile(latencies, 99), 3),
+            'max': round(latencies[-1], 3),
+        },
+        'queries': {
+            'min': min(queries), 'max': max(queries), 'mean': round(sum(queries) / len(queries), 2),
+            'budget': budget,
+        },
+        'over_budget': budget is not None and max(queries) > budget,
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def _client(user):
+    # real bearer tokens: the async read views don't see force_authenticate
+    client = APIClient()
+    token = RoleTokenObtainPairSerializer.get_token(user).access_token
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+    return client
+
+
+def _pending_reservations(client, count):
+    """Ids of ``count`` pending reservations, adding fresh ones when the seed has too few."""
+    ids = list(Reservation.objects.filter(status='pending').values_list('id', flat=True)[:count])
+    if len(ids) < count:
+        tables = list(Table.objects.values_list('id', flat=True))
+        # a year out and an hour apart, clear of every seeded slot
+        start = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=365)
+        ids += [r.id for r in Reservation.objects.bulk_create(
+            Reservation(user=client, table_id=tables[i % len(tables)], datetime=start + timedelta(hours=i),
+                        description='', status='pending')
+            for i in range(count - len(ids))
+        )]
+    return ids
+
+
+def endpoints(users, iterations):
+    waiter = _client(users['waiter'])
+    manager = _client(users['manager'])
+
+    open_orders = list(Order.objects.filter(is_paid=False).values_list('id', flat=True))
+    menu_ids = list(MenuItem.objects.values_list('id', flat=True))
+    lines = list(OrderItem.objects.filter(order_id__in=open_orders).values_list('order_id', 'id'))
+    # every timed call approves a different reservation, plus the one traced for memory
+    pending = iter(_pending_reservations(users['client'], iterations + 1))
+
+    order_cycle = itertools.cycle(open_orders)
+    menu_cycle = itertools.cycle(menu_ids)
+    line_cycle = itertools.cycle(lines)
+
+    def add_item():
+        return waiter.post(f'/api/orders/{next(order_cycle)}/add_item/',
+                           {'menu_item': next(menu_cycle), 'quantity': 1}, format='json')
+
+    def set_item_qty():
+        order_id, line_id = next(line_cycle)
+        return waiter.post(f'/api/orders/{order_id}/set_item_qty/',
+                           {'order_item_id': line_id, 'quantity': 2}, format='json')
+
+    def batch():
+        ops = [{'op': 'add_item', 'menu_item': next(menu_cycle), 'quantity': 1} for _ in range(8)]
+        return waiter.post(f'/api/orders/{next(order_cycle)}/batch/', {'operations': ops}, format='json')
+
+    def approve():
+        return manager.post(f'/api/reservations/{next(pending)}/approve/')
+
+    return [
+        ('GET /api/tables/status/', lambda: waiter.get('/api/tables/status/')),
+        ('GET /api/menu-items/', lambda: waiter.get('/api/menu-items/')),
+        ('GET /api/orders/', lambda: waiter.get('/api/orders/')),
+        ('POST /api/orders/{id}/add_item/', add_item),
+        ('POST /api/orders/{id}/set_item_qty/', set_item_qty),
+        ('POST /api/orders/{id}/batch/', batch),
+        ('GET /api/reservations/', lambda: manager.get('/api/reservations/')),
+        ('POST /api/reservations/{id}/approve/', approve),
+    ]
+
+
+def run_suite(volumes, iterations, only=None):
+    users = seed(volumes)
+    results = []
+    for name, make_request in endpoints(users, iterations):
+        if only and not any(o in name for o in only):
+            continue
+        results.append(measure(name, make_request, iterations, QUERY_BUDGETS.get(name)))
+    return results
@@ -0,0 +1,77 @@
+import threading
+
+from django.core.cache import cache
+from django.db import router
+
+from .models import MenuItem
+from .versions import current_version, acurrent_version, bump_version
+
+MENU_VERSION_KEY = 'restaurant:menu:version'
+MENU_ROWS_KEY = 'restaurant:menu:rows:{}'
+MENU_ROWS_TIMEOUT = 24 * 60 * 60
+MENU_FIELDS = [f.attname for f in MenuItem._meta.concrete_fields]
+
+
+class MenuCatalog:
+    """Pre-serialized menu for one catalog version, indexed by id and code."""
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.rows = rows
+        self.etag = f'"menu-{version}"'
+        self.rows_by_id = {r['id']: r for r in rows}
+        self.by_id = {
+            r['id']: MenuItem.from_db('default', list(r.keys()), list(r.values()))
+            for r in rows
+        }
+        self.by_code = {item.code: item for item in self.by_id.values()}
+
+
+_local = None
+_lock = threading.Lock()
+
+
+def _menu_rows():
+    # same shape as MenuItemSerializer, which exposes every model field; read
+    # from the primary so a lagging replica can't be cached under a new version
+    return MenuItem.objects.using(router.db_for_write(MenuItem)).order_by('id').values(*MENU_FIELDS)
+
+
+def bump_menu_version():
+    bump_version(MENU_VERSION_KEY)
+
+
+def menu_catalog() -> MenuCatalog:
+    global _local
+    version = current_version(MENU_VERSION_KEY)
+    catalog = _local
+    if catalog is not None and catalog.version == version:
+        return catalog
+
+    with _lock:
+        if _local is not None and _local.version == version:
+            return _local
+        key = MENU_ROWS_KEY.format(version)
+        rows = cache.get(key)
+        if rows is None:
+            rows = list(_menu_rows())
+            cache.set(key, rows, timeout=MENU_ROWS_TIMEOUT)
+        _local = MenuCatalog(version, rows)
+        return _local
+
+
+async def amenu_catalog() -> MenuCatalog:
+    global _local
+    version = await acurrent_version(MENU_VERSION_KEY)
+    catalog = _local
+    if catalog is not None and catalog.version == version:
+        return catalog
+
+    # no lock here: two coroutines may both rebuild, which is harmless
+    key = MENU_ROWS_KEY.format(version)
+    rows = await cache.aget(key)
+    if rows is None:
+        rows = [r async for r in _menu_rows()]
+        await cache.aset(key, rows, timeout=MENU_ROWS_TIMEOUT)
+    _local = MenuCatalog(version, rows)
+    return _local
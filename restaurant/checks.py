@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+PROCESS_LOCAL_CACHES = {
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+}
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    # cache versions and replica pins set by one worker must be seen by the others
+    if settings.CACHES.get('default', {}).get('BACKEND') in PROCESS_LOCAL_CACHES:
+        return [Warning(
+            "The default cache is local to each process, so cache version bumps and "
+            "read-your-writes pins are invisible to other worker processes.",
+            hint="Set RESTAURANT_REDIS_URL, or serve the API from a single process.",
+            id='restaurant.W001',
+        )]
+    return []
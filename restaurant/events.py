@@ -0,0 +1,103 @@
+import asyncio
+import json
+import threading
+
+from .models import Order, Table
+
+SUBSCRIBER_QUEUE_SIZE = 100
+KEEPALIVE_SECONDS = 15
+
+
+class _Subscriber:
+    def __init__(self, loop, maxsize):
+        self.loop = loop
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def offer(self, message):
+        # a slow client loses its oldest events instead of holding up the hub
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+
+class EventHub:
+    """In-process fan-out of floor events to every connected stream."""
+
+    def __init__(self, queue_size=SUBSCRIBER_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._subscribers)
+
+    def subscribe(self) -> _Subscriber:
+        sub = _Subscriber(asyncio.get_running_loop(), self.queue_size)
+        with self._lock:
+            self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            self._subscribers.discard(sub)
+
+    def publish(self, kind: str, payload: dict):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        if not subscribers:
+            return
+        message = f'event: {kind}\ndata: {json.dumps(payload, separators=(",", ":"))}\n\n'
+        for sub in subscribers:
+            try:
+                sub.loop.call_soon_threadsafe(sub.offer, message)
+            except RuntimeError:
+                self.unsubscribe(sub)
+
+
+hub = EventHub()
+
+
+def publish_table(table_id, number, status):
+    hub.publish('table', {'id': table_id, 'number': number, 'status': status})
+
+
+def publish_tables(table_ids):
+    if not len(hub):
+        return
+    for row in Table.objects.filter(pk__in=table_ids).values('id', 'number', 'status'):
+        publish_table(row['id'], row['number'], row['status'])
+
+
+def publish_floor(status, count):
+    # bulk transitions don't know which rows moved; clients refetch the snapshot
+    hub.publish('floor', {'status': status, 'count': count})
+
+
+def publish_order(order_id):
+    if not len(hub):
+        return
+    row = Order.objects.filter(pk=order_id).values('id', 'table_id', 'is_paid', 'items_count', 'total').first()
+    if row is None:
+        return
+    hub.publish('order', {
+        'id': row['id'],
+        'table': row['table_id'],
+        'is_paid': row['is_paid'],
+        'items_count': row['items_count'],
+        'total': row['total'],
+    })
+
+
+async def stream():
+    sub = hub.subscribe()
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            try:
+                message = await asyncio.wait_for(sub.queue.get(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            yield message
+    finally:
+        hub.unsubscribe(sub)
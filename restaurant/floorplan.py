@@ -0,0 +1,160 @@
+import math
+import threading
+
+from django.conf import settings
+from django.db import router
+
+from .models import Table, Zone
+from .versions import current_version, bump_version
+
+FLOORPLAN_VERSION_KEY = 'restaurant:floorplan:version'
+
+
+def bump_floorplan_version():
+    bump_version(FLOORPLAN_VERSION_KEY)
+
+
+def grid_cell_size() -> float:
+    return getattr(settings, 'FLOOR_GRID_CELL', 100.0)
+
+
+class FloorIndex:
+    """Uniform grid over the floor plan: tables by position, zones by the cells they cover.
+
+    A table belongs to every zone whose rectangle contains its top-left corner.
+    Every process keeps its own copy; table moves are applied in place and a
+    shared version in the cache tells other processes to reload theirs. A move
+    is only patched in when our own increment is the next version after the
+    one we loaded; any other bump in between forces a reload.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._cell = grid_cell_size()
+        self._tables = {}
+        self._table_cells = {}
+        self._zones = {}
+        self._zone_cells = {}
+
+    def _cell_of(self, top, left):
+        return int(top // self._cell), int(left // self._cell)
+
+    def _load(self):
+        self._cell = grid_cell_size()
+        self._tables = {}
+        self._table_cells = {}
+        self._zones = {}
+        self._zone_cells = {}
+        db = router.db_for_write(Table)
+        for pk, top, left in Table.objects.using(db).values_list('id', 'top', 'left'):
+            self._put_table(pk, top, left)
+        for pk, type_, top, left, width, height in Zone.objects.using(db).values_list(
+            'id', 'type', 'top', 'left', 'width', 'height'
+        ):
+            self._zones[pk] = (type_, top, left, width, height)
+            rows = range(int(top // self._cell), int((top + height) // self._cell) + 1)
+            cols = range(int(left // self._cell), int((left + width) // self._cell) + 1)
+            for cell in ((r, c) for r in rows for c in cols):
+                self._zone_cells.setdefault(cell, []).append(pk)
+
+    def _ensure_current(self):
+        version = current_version(FLOORPLAN_VERSION_KEY)
+        if self._version != version:
+            self._load()
+            self._version = version
+
+    def _put_table(self, pk, top, left):
+        self._tables[pk] = (top, left)
+        self._table_cells.setdefault(self._cell_of(top, left), set()).add(pk)
+
+    def _drop_table(self, pk):
+        position = self._tables.pop(pk, None)
+        if position is not None:
+            self._table_cells.get(self._cell_of(*position), set()).discard(pk)
+
+    def move_table(self, pk, top, left):
+        """Record a saved table's position; ``top=None`` means it was deleted."""
+        with self._lock:
+            was_current = self._version is not None and self._version == current_version(FLOORPLAN_VERSION_KEY)
+            if was_current and self._tables.get(pk) == (top, left):
+                # most table saves are status changes
+                return
+            version = bump_version(FLOORPLAN_VERSION_KEY)
+            if not was_current or version != self._version + 1:
+                # someone else bumped in between; their change is not in our copy
+                self._version = None
+                return
+            self._drop_table(pk)
+            if top is not None:
+                self._put_table(pk, top, left)
+            self._version = version
+
+    def _contains(self, zone_id, top, left):
+        _, z_top, z_left, width, height = self._zones[zone_id]
+        return z_top <= top < z_top + height and z_left <= left < z_left + width
+
+    def zones_of(self, table_id) -> list:
+        with self._lock:
+            self._ensure_current()
+            position = self._tables.get(table_id)
+            if position is None:
+                return []
+            return sorted(z for z in self._zone_cells.get(self._cell_of(*position), ())
+                          if self._contains(z, *position))
+
+    def zone_ids(self, zone) -> list:
+        """Resolve a zone id or a zone type such as ``terrace`` to zone ids."""
+        with self._lock:
+            self._ensure_current()
+            if str(zone).isdigit():
+                return [int(zone)] if int(zone) in self._zones else []
+            return sorted(pk for pk, (type_, *_) in self._zones.items() if type_ == zone)
+
+    def tables_in(self, zone_ids) -> set:
+        with self._lock:
+            self._ensure_current()
+            found = set()
+            for zone_id in zone_ids:
+                if zone_id not in self._zones:
+                    continue
+                _, top, left, width, height = self._zones[zone_id]
+                rows = range(int(top // self._cell), int((top + height) // self._cell) + 1)
+                cols = range(int(left // self._cell), int((left + width) // self._cell) + 1)
+                for cell in ((r, c) for r in rows for c in cols):
+                    found.update(t for t in self._table_cells.get(cell, ())
+                                 if self._contains(zone_id, *self._tables[t]))
+            return found
+
+    def nearest(self, top, left, allowed=None):
+        """Return ``(table_id, distance)`` for the closest table in ``allowed`` (all if None), or None.
+
+        Searches outward one ring of cells at a time and stops once no
+        unvisited cell can hold anything closer than the best hit.
+        """
+        with self._lock:
+            self._ensure_current()
+            if not self._table_cells:
+                return None
+            row, col = self._cell_of(top, left)
+            occupied = [cell for cell, ids in self._table_cells.items() if ids]
+            max_ring = max((max(abs(r - row), abs(c - col)) for r, c in occupied), default=0)
+            best = None
+            for ring in range(max_ring + 1):
+                if best is not None and best[1] <= (ring - 1) * self._cell:
+                    break
+                for r in range(row - ring, row + ring + 1):
+                    for c in range(col - ring, col + ring + 1):
+                        if max(abs(r - row), abs(c - col)) != ring:
+                            continue
+                        for pk in self._table_cells.get((r, c), ()):
+                            if allowed is not None and pk not in allowed:
+                                continue
+                            t_top, t_left = self._tables[pk]
+                            distance = math.hypot(t_top - top, t_left - left)
+                            if best is None or (distance, pk) < (best[1], best[0]):
+                                best = (pk, distance)
+            return best
+
+
+index = FloorIndex()
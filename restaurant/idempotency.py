@@ -0,0 +1,109 @@
+"""
+``Idempotency-Key`` support for unsafe requests.
+
+The first request carrying a key runs normally and its response is stored
+under ``(user, key)`` in the ``idempotency`` cache, a bounded store whose
+entries expire after ``IDEMPOTENCY_TTL`` seconds. A retry with the same key
+and body gets the stored response, headers included, back before the view
+touches the database; the same key with a different body is refused, as is
+a retry that arrives while the first attempt is still running.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+HEADER = 'Idempotency-Key'
+RESPONSE_KEY = 'restaurant:idem:{}:{}'
+LOCK_KEY = 'restaurant:idem-lock:{}:{}'
+LOCK_TIMEOUT = 30
+UNSTORED_HEADERS = {'content-type', 'content-length'}
+
+
+def idempotency_store():
+    return caches['idempotency']
+
+
+def idempotency_ttl() -> int:
+    return getattr(settings, 'IDEMPOTENCY_TTL', 24 * 60 * 60)
+
+
+class IdempotencyConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "A request with this Idempotency-Key is still being processed."
+    default_code = 'idempotency_conflict'
+
+
+class _Replay(Exception):
+    def __init__(self, response):
+        self.response = response
+
+
+def _fingerprint(request):
+    body = request._request.body
+    return hashlib.sha256(b'%s %s\n%s' % (request.method.encode(), request.path.encode(), body)).hexdigest()
+
+
+class IdempotentViewMixin:
+    """Makes a viewset's unsafe methods replayable through the ``Idempotency-Key`` header."""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self._idempotency = None
+        key = request.headers.get(HEADER)
+        if request.method in SAFE_METHODS or not key:
+            return
+        if len(key) > 255:
+            raise ValidationError({HEADER: "Keys are at most 255 characters."})
+
+        scope = (request.user.pk, hashlib.blake2b(key.encode(), digest_size=16).hexdigest())
+        fingerprint = _fingerprint(request)
+        store = idempotency_store()
+        stored = store.get(RESPONSE_KEY.format(*scope))
+        if stored is not None:
+            if stored['fingerprint'] != fingerprint:
+                raise ValidationError({HEADER: "This key was already used for a different request."})
+            raise _Replay(Response(stored['data'], status=stored['status'], headers={
+                **stored['headers'], 'Idempotent-Replayed': 'true',
+            }))
+        if not store.add(LOCK_KEY.format(*scope), True, timeout=LOCK_TIMEOUT):
+            raise IdempotencyConflict()
+        self._idempotency = (scope, fingerprint)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, _Replay):
+            return exc.response
+        try:
+            return super().handle_exception(exc)
+        except Exception:
+            # unhandled errors skip finalize_response; free the key for a retry
+            pending, self._idempotency = getattr(self, '_idempotency', None), None
+            if pending is not None:
+                idempotency_store().delete(LOCK_KEY.format(*pending[0]))
+            raise
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        pending = getattr(self, '_idempotency', None)
+        if pending is None:
+            return response
+        self._idempotency = None
+        scope, fingerprint = pending
+        store = idempotency_store()
+        # server errors are not stored, so the client can retry them
+        if response.status_code < 500 and hasattr(response, 'data'):
+            # every header the view set (ETag, Location, ...); the renderer sets the body's own
+            headers = {h: v for h, v in response.items() if h.lower() not in UNSTORED_HEADERS}
+            store.set(RESPONSE_KEY.format(*scope), {
+                'fingerprint': fingerprint,
+                'status': response.status_code,
+                'data': response.data,
+                'headers': headers,
+            }, timeout=idempotency_ttl())
+        store.delete(LOCK_KEY.format(*scope))
+        return response
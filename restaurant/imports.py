@@ -0,0 +1,208 @@
+"""
+Streaming CSV/NDJSON upserts for the menu and the floor plan.
+
+Rows are read lazily from any iterable of text lines and written in batches,
+so memory stays flat however long the input is. Each batch costs one lookup
+query plus at most one ``bulk_create`` and one ``bulk_update``, and commits on
+its own. A batch the database rejects is retried row by row. The report keeps
+counts and a capped sample of failed rows.
+"""
+
+import csv
+import json
+from contextlib import nullcontext
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from .catalog import bump_menu_version
+from .models import MenuItem, Table, Zone
+from .snapshot import bump_floor_version
+from .floorplan import bump_floorplan_version
+
+
+class ImportSpec:
+    def __init__(self, model, key, fields, defaults=None, on_commit=None):
+        self.model = model
+        self.key = key
+        self.fields = fields
+        self.defaults = defaults or {}
+        self.on_commit = on_commit
+
+    def clean(self, raw):
+        """Validate one input row into ``(key, values)`` using the model fields."""
+        values = {}
+        errors = {}
+        for name in self.key + self.fields:
+            field = self.model._meta.get_field(name)
+            value = raw.get(name)
+            if isinstance(value, str):
+                value = value.strip()
+            try:
+                values[name] = field.clean(value, None)
+            except ValidationError as e:
+                errors[name] = e.messages
+        if errors:
+            raise ValidationError(errors)
+        return tuple(values[k] for k in self.key), values
+
+    def existing(self, keys):
+        if len(self.key) == 1:
+            lookup = Q(**{f'{self.key[0]}__in': [k[0] for k in keys]})
+        else:
+            lookup = reduce(or_, [Q(**dict(zip(self.key, k))) for k in keys])
+        return {
+            tuple(getattr(obj, k) for k in self.key): obj
+            for obj in self.model.objects.filter(lookup)
+        }
+
+
+def _tables_changed():
+    bump_floor_version()
+    bump_floorplan_version()
+
+
+SPECS = {
+    'menu': ImportSpec(MenuItem, ('code',), ('name', 'item_type', 'price'), on_commit=bump_menu_version),
+    # status is owned by the table state machine, so imports never touch it
+    'tables': ImportSpec(Table, ('number',), ('chairs', 'top', 'left'), defaults={'status': 'available'},
+                         on_commit=_tables_changed),
+    # zones have no natural key; one of a given type at the same spot is the same zone
+    'zones': ImportSpec(Zone, ('type', 'top', 'left'), ('width', 'height'), on_commit=bump_floorplan_version),
+}
+
+
+def read_rows(lines, fmt):
+    """Yield ``(line_number, row)`` pairs; ``row`` is a dict or the parse error."""
+    if fmt == 'csv':
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield number, e
+            continue
+        yield number, row if isinstance(row, dict) else ValueError("Expected a JSON object.")
+
+
+class ImportReport:
+    """Counts of what an import did, plus the first ``ERROR_SAMPLE`` failed rows."""
+
+    ERROR_SAMPLE = 100
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.failed = 0
+        # how many updated rows changed each field
+        self.updated_fields = {}
+        self.errors = []
+
+    def add_error(self, line, errors):
+        self.failed += 1
+        if len(self.errors) < self.ERROR_SAMPLE:
+            self.errors.append({'line': line, 'errors': errors})
+
+    def as_dict(self):
+        return {
+            'kind': self.kind,
+            'created': self.created,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'failed': self.failed,
+            'updated_fields': self.updated_fields,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+        }
+
+
+def _write(spec, batch, report):
+    """Write ``{key: (line, values)}`` in one transaction; the report only counts it once it commits."""
+    with transaction.atomic():
+        existing = spec.existing(list(batch))
+        creates = []
+        updates = []
+        unchanged = 0
+        field_counts = {}
+        for key, (line, values) in batch.items():
+            obj = existing.get(key)
+            if obj is None:
+                creates.append(spec.model(**spec.defaults, **values))
+                continue
+            changed = [f for f in spec.fields if getattr(obj, f) != values[f]]
+            if not changed:
+                unchanged += 1
+                continue
+            for f in changed:
+                setattr(obj, f, values[f])
+                field_counts[f] = field_counts.get(f, 0) + 1
+            updates.append(obj)
+        if creates:
+            spec.model.objects.bulk_create(creates)
+        if updates:
+            spec.model.objects.bulk_update(updates, sorted(field_counts))
+        if spec.on_commit and (creates or updates):
+            transaction.on_commit(spec.on_commit)
+    report.created += len(creates)
+    report.updated += len(updates)
+    report.unchanged += unchanged
+    for f, count in field_counts.items():
+        report.updated_fields[f] = report.updated_fields.get(f, 0) + count
+
+
+def _flush(spec, batch, report):
+    """Write one batch; if the database rejects it, retry row by row so only the bad rows fail."""
+    try:
+        _write(spec, batch, report)
+    except IntegrityError:
+        # e.g. a concurrent import inserted the same code after the lookup
+        for key, (line, values) in batch.items():
+            try:
+                _write(spec, {key: (line, values)}, report)
+            except IntegrityError as e:
+                report.add_error(line, {'non_field_errors': [str(e)]})
+
+
+def import_rows(kind, rows, batch_size=500, dry_run=False):
+    """Upsert ``(line_number, row)`` pairs into ``kind`` and return an ``ImportReport``.
+
+    Each batch commits on its own, so a failure part way keeps the batches
+    before it. ``dry_run`` runs everything in one transaction and rolls it
+    back after building the report.
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1.")
+    spec = SPECS[kind]
+    report = ImportReport(kind)
+    with transaction.atomic() if dry_run else nullcontext():
+        batch = {}
+        for line, raw in rows:
+            if isinstance(raw, Exception):
+                report.add_error(line, {'non_field_errors': [str(raw)]})
+                continue
+            try:
+                key, values = spec.clean(raw)
+            except ValidationError as e:
+                report.add_error(line, e.message_dict)
+                continue
+            if key in batch or len(batch) >= batch_size:
+                # a repeated key is applied on top of the earlier row, not merged with it
+                _flush(spec, batch, report)
+                batch = {}
+            batch[key] = (line, values)
+        if batch:
+            _flush(spec, batch, report)
+
+        if dry_run:
+            transaction.set_rollback(True)
+    return report
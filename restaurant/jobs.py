@@ -0,0 +1,121 @@
+"""
+Database-backed background jobs.
+
+``@background`` turns a function into a job; ``fn.delay(*args, **kwargs)``
+writes a ``Job`` row inside the current transaction, so the job exists only
+if the surrounding change commits. ``manage.py run_jobs`` claims due jobs with
+a conditional UPDATE, runs each in its own transaction together with marking
+it done, and reschedules failures with exponential backoff until
+``max_attempts`` is reached. Workers refresh the locks of running jobs every
+``JOB_HEARTBEAT`` seconds; only jobs without a heartbeat for
+``JOB_LOCK_TIMEOUT`` are requeued, and a run that lost its lock rolls back.
+
+Arguments are stored as JSON, so pass ids rather than model instances.
+"""
+
+import traceback
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+JOB_LOCK_TIMEOUT = 10 * 60
+# how often a worker refreshes the locks of the jobs it is running
+JOB_HEARTBEAT = 60
+JOB_BACKOFF_BASE = 5
+JOB_BACKOFF_MAX = 60 * 60
+
+
+class BackgroundJob:
+    def __init__(self, func, max_attempts):
+        self.func = func
+        self.name = f'{func.__module__}.{func.__qualname__}'
+        self.max_attempts = max_attempts
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        """Queue a run with JSON-serializable arguments; it becomes visible when the transaction commits."""
+        return Job.objects.create(name=self.name, args=list(args), kwargs=kwargs, max_attempts=self.max_attempts)
+
+
+def background(max_attempts=5):
+    def decorator(func):
+        return BackgroundJob(func, max_attempts)
+    return decorator
+
+
+def backoff(attempts: int) -> timedelta:
+    return timedelta(seconds=min(JOB_BACKOFF_BASE * 2 ** (attempts - 1), JOB_BACKOFF_MAX))
+
+
+def heartbeat(jobs):
+    """Refresh the locks of claimed ``jobs`` that are still running; returns how many."""
+    return Job.objects.filter(
+        pk__in=[j.pk for j in jobs], locked_by__in=[j.locked_by for j in jobs], status='running',
+    ).update(locked_at=timezone.now())
+
+
+def requeue_stale():
+    """Put back jobs whose worker stopped sending heartbeats; returns how many."""
+    cutoff = timezone.now() - timedelta(seconds=JOB_LOCK_TIMEOUT)
+    return Job.objects.filter(status='running', locked_at__lt=cutoff).update(status='queued', locked_by='')
+
+
+def _held(job: Job):
+    # each claim bumps attempts, so this matches only the claim that produced ``job``
+    return Job.objects.filter(pk=job.pk, status='running', locked_by=job.locked_by, attempts=job.attempts)
+
+
+class LockLost(Exception):
+    pass
+
+
+def claim_next(worker: str):
+    """Claim the next due job for ``worker``, or return None when nothing is due."""
+    now = timezone.now()
+    while True:
+        pk = (
+            Job.objects.filter(status='queued', run_at__lte=now)
+            .order_by('run_at', 'id').values_list('pk', flat=True).first()
+        )
+        if pk is None:
+            return None
+        # another worker may have taken it between the read and the update
+        claimed = Job.objects.filter(pk=pk, status='queued').update(
+            status='running', locked_by=worker, locked_at=now, attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+
+
+def run_job(job: Job) -> bool:
+    """Run a claimed job; returns whether it succeeded."""
+    try:
+        with transaction.atomic():
+            import_string(job.name).func(*job.args, **job.kwargs)
+            # marked done in the same transaction, so a crash can't run it twice; a job
+            # requeued to another worker meanwhile rolls back here instead of counting twice
+            if not _held(job).update(status='done', finished_at=timezone.now(), last_error=''):
+                raise LockLost()
+        return True
+    except LockLost:
+        return False
+    except Exception:
+        error = traceback.format_exc()
+    now = timezone.now()
+    if job.attempts >= job.max_attempts:
+        _held(job).update(status='failed', finished_at=now, last_error=error)
+    else:
+        _held(job).update(status='queued', locked_by='', run_at=now + backoff(job.attempts), last_error=error)
+    return False
+
+
+def purge_finished(older_than: timedelta):
+    """Delete jobs that completed more than ``older_than`` ago; failed jobs are kept."""
+    return Job.objects.filter(status='done', finished_at__lt=timezone.now() - older_than).delete()[0]
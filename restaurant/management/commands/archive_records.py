@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from restaurant.archive import archive_orders, archive_reservations, orders_before, reservations_before
+
+
+class Command(BaseCommand):
+    help = "Move paid orders and past reservations older than a cutoff into the archive tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help="Archive records older than this many days.")
+        parser.add_argument('--batch-size', type=int, default=500, help="Records moved per transaction.")
+        parser.add_argument('--only', choices=['orders', 'reservations'], help="Archive just one kind of record.")
+        parser.add_argument('--dry-run', action='store_true', help="Only count what would be archived.")
+
+    def handle(self, *args, **options):
+        if options['days'] < 1 or options['batch_size'] < 1:
+            raise CommandError("--days and --batch-size must be positive.")
+        cutoff = timezone.now() - timedelta(days=options['days'])
+
+        jobs = [('orders', orders_before, archive_orders), ('reservations', reservations_before, archive_reservations)]
+        for name, due, archive in jobs:
+            if options['only'] not in (None, name):
+                continue
+            if options['dry_run']:
+                self.stdout.write(f"Would archive {due(cutoff).count()} {name} older than {cutoff:%Y-%m-%d %H:%M}.")
+                continue
+            moved = 0
+            for count in archive(cutoff, batch_size=options['batch_size']):
+                moved += count
+                self.stdout.write(f"  {name}: {moved} archived so far")
+            self.stdout.write(self.style.SUCCESS(f"Archived {moved} {name} older than {cutoff:%Y-%m-%d %H:%M}."))
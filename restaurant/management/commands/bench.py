@@ -0,0 +1,51 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from django.utils import timezone
+
+from restaurant.benchmarks import DEFAULT_VOLUMES, run_suite
+
+
+class Command(BaseCommand):
+    help = "Seed a throwaway database and benchmark the main API endpoints; prints JSON."
+
+    def add_arguments(self, parser):
+        for name, default in DEFAULT_VOLUMES.items():
+            parser.add_argument(f"--{name.replace('_', '-')}", dest=name, type=int, default=default)
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--only', action='append', help="Run endpoints whose name contains this text.")
+        parser.add_argument('--output', help="Write the JSON report to this file instead of stdout.")
+
+    def handle(self, *args, **options):
+        volumes = {name: options[name] for name in DEFAULT_VOLUMES}
+
+        setup_test_environment()
+        # test databases for every alias, replicas included: they mirror the throwaway primary
+        old_config = setup_databases(verbosity=0, interactive=False, serialized_aliases=set())
+        try:
+            results = run_suite(volumes, options['iterations'], options['only'])
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        report = json.dumps({
+            'generated_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'volumes': volumes,
+            'iterations': options['iterations'],
+            'results': results,
+        }, indent=2)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(report + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Wrote {len(results)} endpoint result(s) to {options['output']}"))
+        else:
+            self.stdout.write(report)
+
+        over = [f"{r['endpoint']} ({r['queries']['max']} > {r['queries']['budget']})"
+                for r in results if r['over_budget']]
+        if over:
+            raise CommandError(f"Over the query budget: {', '.join(over)}")
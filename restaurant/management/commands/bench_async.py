@@ -0,0 +1,106 @@
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+from rest_framework_simplejwt.tokens import AccessToken
+
+from restaurant import async_views
+from restaurant.benchmarks import percentile, seed
+from restaurant.views import TableViewSet, MenuItemViewSet, ZoneViewSet, MeView
+
+SYNC_VIEWS = {
+    '/api/tables/status/': TableViewSet.as_view({'get': 'status'}, **TableViewSet.status.kwargs),
+    '/api/menu-items/': MenuItemViewSet.as_view({'get': 'list'}),
+    '/api/zones/': ZoneViewSet.as_view({'get': 'list'}),
+    '/api/me/': MeView.as_view(),
+}
+
+ASYNC_VIEWS = {
+    '/api/tables/status/': async_views.table_status,
+    '/api/menu-items/': async_views.menu_list,
+    '/api/zones/': async_views.zone_list,
+    '/api/me/': async_views.me,
+}
+
+
+def _call_sync(view, request):
+    response = view(request)
+    response.render()
+    return response
+
+
+class Command(BaseCommand):
+    help = "Compare sync (DRF) and native async read endpoints under concurrent clients in one worker."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', default='1,10,50,200')
+        parser.add_argument('--requests', type=int, default=10, help="Requests per simulated client.")
+        parser.add_argument('--tables', type=int, default=100)
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        # test databases for every alias, replicas included: they mirror the throwaway primary
+        old_config = setup_databases(verbosity=0, interactive=False, serialized_aliases=set())
+        try:
+            users = seed({'tables': options['tables'], 'reservations': 0, 'orders': options['tables'] // 2})
+            token = str(AccessToken.for_user(users['waiter']))
+            levels = [int(c) for c in options['concurrency'].split(',')]
+            results = asyncio.run(self._run(token, levels, options['requests']))
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{'endpoint':<22} {'mode':<6} {'clients':>7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8}")
+        for r in results:
+            self.stdout.write(
+                f"{r['endpoint']:<22} {r['mode']:<6} {r['clients']:>7} {r['throughput']:>9.1f} "
+                f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f}"
+            )
+
+    async def _run(self, token, levels, per_client):
+        factory = RequestFactory()
+        results = []
+        for path in SYNC_VIEWS:
+            sync_view = sync_to_async(_call_sync, thread_sensitive=True)
+            variants = [
+                ('sync', lambda r, p=path: sync_view(SYNC_VIEWS[p], r)),
+                ('async', lambda r, p=path: ASYNC_VIEWS[p](r)),
+            ]
+            for mode, call in variants:
+                await call(factory.get(path, HTTP_AUTHORIZATION=f'Bearer {token}'))  # warm caches
+                for clients in levels:
+                    results.append(await self._level(factory, path, mode, call, token, clients, per_client))
+        return results
+
+    async def _level(self, factory, path, mode, call, token, clients, per_client):
+        latencies = []
+
+        async def client():
+            for _ in range(per_client):
+                request = factory.get(path, HTTP_AUTHORIZATION=f'Bearer {token}')
+                start = time.perf_counter()
+                response = await call(request)
+                latencies.append((time.perf_counter() - start) * 1000)
+                assert response.status_code == 200, response.status_code
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        return {
+            'endpoint': path,
+            'mode': mode,
+            'clients': clients,
+            'requests': len(latencies),
+            'throughput': round(len(latencies) / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 50), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+        }
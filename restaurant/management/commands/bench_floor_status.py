@@ -0,0 +1,115 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import (
+    CaptureQueriesContext, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+
+from restaurant.models import Table, MenuItem, Order, OrderItem
+from restaurant.serializers import TableSerializer
+from restaurant.snapshot import build_floor_snapshot, floor_snapshot, bump_floor_version
+
+
+def legacy_status():
+    tables = Table.objects.all()
+    orders = Order.objects.filter(is_paid=False).prefetch_related('orderitem_set__menu_item')
+    active_by_table = {o.table_id: o for o in orders}
+    data = []
+    for t in tables:
+        row = TableSerializer(t).data
+        o = active_by_table.get(t.id)
+        if o:
+            row['active_order'] = {
+                'order_id': o.id,
+                'items_count': o.orderitem_set.count(),
+                'total': o.total_price(),
+            }
+        else:
+            row['active_order'] = None
+        data.append(row)
+    return data
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Benchmark /api/tables/status/ (legacy vs snapshot) on a throwaway database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='50,500,5000')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        sizes = [int(s) for s in options['sizes'].split(',')]
+        setup_test_environment()
+        # seed a throwaway database, never the configured one
+        old_config = setup_databases(verbosity=0, interactive=False, serialized_aliases=set())
+        try:
+            self.stdout.write(f"{'tables':>7} {'variant':<16} {'queries':>7} {'ms':>9}")
+            for n in sizes:
+                # each size starts from an empty floor
+                try:
+                    with transaction.atomic():
+                        self._seed(n)
+                        self._run(n, options['repeat'])
+                        raise _Rollback
+                except _Rollback:
+                    pass
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+    def _seed(self, n):
+        base = (Table.objects.order_by('-number').values_list('number', flat=True).first() or 0) + 1
+        items = MenuItem.objects.bulk_create(
+            MenuItem(name=f'Bench {i}', item_type='food', price=100 + i, code=f'bench-{n}-{i}')
+            for i in range(20)
+        )
+        tables = Table.objects.bulk_create(
+            Table(number=base + i, chairs=4, status='available', top=0, left=0) for i in range(n)
+        )
+        # roughly half of the floor has an open order with a few lines
+        lines = [(items[(t.pk + j) % len(items)], j + 1) for t in tables for j in range(4)]
+        orders = Order.objects.bulk_create(
+            Order(
+                table=t,
+                total=sum(mi.price * qty for mi, qty in lines[i * 4:i * 4 + 4]),
+                items_count=4,
+            )
+            for i, t in enumerate(tables) if i % 2 == 0
+        )
+        OrderItem.objects.bulk_create(
+            OrderItem(order=o, menu_item=mi, quantity=qty, unit_price=mi.price)
+            for o, i in zip(orders, range(0, len(tables), 2))
+            for mi, qty in lines[i * 4:i * 4 + 4]
+        )
+
+    def _measure(self, fn, repeat):
+        best = None
+        queries = 0
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                fn()
+                elapsed = (time.perf_counter() - start) * 1000
+            queries = len(ctx.captured_queries)
+            best = elapsed if best is None else min(best, elapsed)
+        return queries, best
+
+    def _run(self, n, repeat):
+        def cold():
+            bump_floor_version()
+            floor_snapshot()
+
+        variants = [
+            ('legacy', legacy_status),
+            ('snapshot-build', build_floor_snapshot),
+            ('snapshot-cold', cold),
+            ('snapshot-warm', floor_snapshot),
+        ]
+        for name, fn in variants:
+            queries, ms = self._measure(fn, repeat)
+            self.stdout.write(f"{n:>7} {name:<16} {queries:>7} {ms:>9.2f}")
@@ -0,0 +1,93 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Prefetch
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+
+from restaurant.catalog import menu_catalog, bump_menu_version
+from restaurant.models import Table, MenuItem, Order, OrderItem
+from restaurant.payloads import ORDER_FIELDS, order_payloads, table_payloads
+from restaurant.renderers import ORJSONRenderer
+from restaurant.serializers import OrderSerializer, TableSerializer, MenuItemSerializer
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Benchmark order, table and menu payloads: serializers + JSONRenderer vs values() rows + orjson."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,100,1000', help="Orders (and tables) per run.")
+        parser.add_argument('--lines', type=int, default=4, help="Lines per order.")
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        sizes = [int(s) for s in options['sizes'].split(',')]
+        self.stdout.write(f"{'rows':>6} {'payload':<7} {'variant':<18} {'queries':>7} {'ms':>9} {'bytes':>9}")
+        for n in sizes:
+            try:
+                with transaction.atomic():
+                    self._seed(n, options['lines'])
+                    self._run(n, options['repeat'])
+                    raise _Rollback
+            except _Rollback:
+                pass
+
+    def _seed(self, n, lines_per_order):
+        base = (Table.objects.order_by('-number').values_list('number', flat=True).first() or 0) + 1
+        items = MenuItem.objects.bulk_create(
+            MenuItem(name=f'Bench {i}', item_type='food' if i % 3 else 'drink', price=100 + i, code=f'bench-{n}-{i}')
+            for i in range(max(lines_per_order, 20))
+        )
+        tables = Table.objects.bulk_create(
+            Table(number=base + i, chairs=4, status='occupied', top=i * 1.5, left=i * 0.25) for i in range(n)
+        )
+        orders = Order.objects.bulk_create(Order(table=t) for t in tables)
+        OrderItem.objects.bulk_create(
+            OrderItem(order=o, menu_item=mi, quantity=j + 1, unit_price=mi.price)
+            for i, o in enumerate(orders) for j in range(lines_per_order)
+            for mi in [items[(i + j) % len(items)]]
+        )
+        self.order_ids = [o.pk for o in orders]
+        self.table_ids = [t.pk for t in tables]
+
+    def _measure(self, fn, repeat):
+        best = None
+        queries = 0
+        size = 0
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                size = len(fn())
+                elapsed = (time.perf_counter() - start) * 1000
+            queries = len(ctx.captured_queries)
+            best = elapsed if best is None else min(best, elapsed)
+        return queries, best, size
+
+    def _run(self, n, repeat):
+        stock, fast = JSONRenderer(), ORJSONRenderer()
+        lines = OrderItem.objects.order_by('pk').select_related('menu_item')
+        orders = Order.objects.filter(pk__in=self.order_ids).order_by('pk')
+        tables = Table.objects.filter(pk__in=self.table_ids).order_by('pk')
+        menu = MenuItem.objects.order_by('pk')
+        # the seed's on_commit bump never fires inside the rolled back transaction
+        bump_menu_version()
+        menu_catalog()
+
+        variants = [
+            ('orders', 'serializer+json', lambda: stock.render(OrderSerializer(
+                orders.prefetch_related(Prefetch('orderitem_set', queryset=lines)), many=True).data)),
+            ('orders', 'values+json', lambda: stock.render(order_payloads(list(orders.values(*ORDER_FIELDS))))),
+            ('orders', 'values+orjson', lambda: fast.render(order_payloads(list(orders.values(*ORDER_FIELDS))))),
+            ('tables', 'serializer+json', lambda: stock.render(TableSerializer(tables.all(), many=True).data)),
+            ('tables', 'values+orjson', lambda: fast.render(table_payloads(tables))),
+            ('menu', 'serializer+json', lambda: stock.render(MenuItemSerializer(menu.all(), many=True).data)),
+            ('menu', 'catalog+orjson', lambda: fast.render(menu_catalog().rows)),
+        ]
+        for payload, name, fn in variants:
+            queries, ms, size = self._measure(fn, repeat)
+            self.stdout.write(f"{n:>6} {payload:<7} {name:<18} {queries:>7} {ms:>9.2f} {size:>9}")
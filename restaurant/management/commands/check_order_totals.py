@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, OuterRef
+
+from restaurant.models import Order
+from restaurant.snapshot import bump_floor_version
+
+
+class Command(BaseCommand):
+    help = "Compare stored order totals with their lines and optionally repair drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Rewrite drifted totals.")
+        parser.add_argument('--unpaid', action='store_true', help="Only check open orders.")
+
+    def handle(self, *args, **options):
+        # lines are priced as they were ordered, so a menu price change is not drift
+        real = Order.line_totals(OuterRef('pk'))
+        qs = Order.objects.annotate(real_total=real['total'], real_count=real['items_count'])
+        if options['unpaid']:
+            qs = qs.filter(is_paid=False)
+
+        drifted = list(
+            qs.exclude(total=F('real_total'), items_count=F('real_count'))
+            .values('id', 'total', 'items_count', 'real_total', 'real_count')
+        )
+
+        count = len(drifted)
+        for row in drifted:
+            self.stdout.write(
+                f"Order {row['id']}: total {row['total']} -> {row['real_total']}, "
+                f"items {row['items_count']} -> {row['real_count']}"
+            )
+            if options['fix']:
+                Order.objects.filter(pk=row['id']).update(
+                    total=row['real_total'], items_count=row['real_count']
+                )
+
+        if not count:
+            self.stdout.write(self.style.SUCCESS("All order totals are consistent."))
+        elif options['fix']:
+            bump_floor_version()
+            self.stdout.write(self.style.SUCCESS(f"Repaired {count} order(s)."))
+        else:
+            self.stdout.write(self.style.WARNING(f"{count} order(s) drifted; run with --fix to repair."))
@@ -0,0 +1,37 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from restaurant.exports import EXPORTS, encode
+
+
+class Command(BaseCommand):
+    help = "Stream orders (one row per line) or reservations for a date range as NDJSON or CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(EXPORTS))
+        parser.add_argument('--start', type=date.fromisoformat, help="First day (YYYY-MM-DD); default 30 days ago.")
+        parser.add_argument('--end', type=date.fromisoformat, help="Last day (YYYY-MM-DD); default today.")
+        parser.add_argument('--format', choices=['ndjson', 'csv'], default='ndjson')
+        parser.add_argument('--output', help="File to write; default stdout.")
+        parser.add_argument('--chunk-size', type=int, default=500, help="Records read per query.")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be at least 1.")
+        end = options['end'] or timezone.localdate()
+        start = options['start'] or end - timedelta(days=29)
+        if start > end:
+            raise CommandError("--start must not be after --end.")
+
+        rows, columns = EXPORTS[options['kind']]
+        pieces = encode(rows(start, end, chunk_size=options['chunk_size']), columns, options['format'])
+        if not options['output']:
+            for piece in pieces:
+                self.stdout.write(piece, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8', newline='') as out:
+            for piece in pieces:
+                out.write(piece)
+        self.stderr.write(self.style.SUCCESS(f"Wrote {options['kind']} {start}..{end} to {options['output']}."))
@@ -0,0 +1,43 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from restaurant.imports import SPECS, read_rows, import_rows
+
+
+class Command(BaseCommand):
+    help = "Upsert menu items (by code), tables (by number) or zones from a CSV or NDJSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(SPECS))
+        parser.add_argument('path', help="Input file, or - for stdin.")
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help="Default: from the file extension.")
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true', help="Report the changes without saving them.")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.endswith('.csv') else 'ndjson' if path != '-' else None)
+        if fmt is None:
+            raise CommandError("--format is required when reading stdin.")
+
+        stream = sys.stdin if path == '-' else open(path, encoding='utf-8-sig', newline='')
+        try:
+            report = import_rows(
+                options['kind'], read_rows(stream, fmt),
+                batch_size=options['batch_size'], dry_run=options['dry_run'],
+            )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        self.stdout.write(json.dumps(report.as_dict(), indent=2, default=str))
+        summary = (f"{report.created} created, {report.updated} updated, "
+                   f"{report.unchanged} unchanged, {report.failed} failed")
+        if options['dry_run']:
+            summary += " (dry run, nothing saved)"
+        style = self.style.WARNING if report.failed else self.style.SUCCESS
+        self.stdout.write(style(summary))
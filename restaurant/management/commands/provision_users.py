@@ -0,0 +1,58 @@
+import json
+import sys
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+
+from restaurant.imports import read_rows
+from restaurant.provisioning import provision_users
+
+
+class Command(BaseCommand):
+    help = "Create staff accounts in bulk from a CSV or NDJSON file of register_user payloads."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Input file, or - for stdin.")
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help="Default: from the file extension.")
+        parser.add_argument('--role', choices=['client', 'waiter', 'manager'], help="Role for rows that don't set one.")
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('csv' if path.endswith('.csv') else 'ndjson' if path != '-' else None)
+        if fmt is None:
+            raise CommandError("--format is required when reading stdin.")
+
+        stream = sys.stdin if path == '-' else open(path, encoding='utf-8-sig', newline='')
+        created = failed = 0
+        try:
+            rows = read_rows(stream, fmt)
+            while batch := list(islice(rows, options['batch_size'])):
+                for line, row in batch:
+                    if isinstance(row, Exception):
+                        failed += 1
+                        self.stdout.write(f"line {line}: {json.dumps({'non_field_errors': [str(row)]})}")
+                batch = [(line, row) for line, row in batch if not isinstance(row, Exception)]
+                lines = [line for line, _ in batch]
+                payloads = [self._payload(row, options['role']) for _, row in batch]
+                for line, result in zip(lines, provision_users(payloads)):
+                    if 'user' in result:
+                        created += 1
+                        continue
+                    failed += 1
+                    self.stdout.write(f"line {line}: {json.dumps(result['errors'])}")
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        style = self.style.WARNING if failed else self.style.SUCCESS
+        self.stdout.write(style(f"{created} user(s) created, {failed} row(s) rejected."))
+
+    def _payload(self, row, role):
+        row = dict(row)
+        # files usually carry one password column; register_user wants it twice
+        if 'password' in row and 'password1' not in row:
+            row['password1'] = row['password2'] = row.pop('password')
+        if role and not row.get('role'):
+            row['role'] = role
+        return row
@@ -0,0 +1,42 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Min, Max
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from restaurant.models import ArchivedOrder, Order
+from restaurant.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily revenue rollups from paid order history, live and archived."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help="First day (YYYY-MM-DD); default the oldest sale.")
+        parser.add_argument('--end', type=date.fromisoformat, help="Last day (YYYY-MM-DD); default today.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Orders read per query.")
+
+    def handle(self, *args, **options):
+        start, end = options['start'], options['end'] or timezone.localdate()
+        if start is None:
+            sold_at = Coalesce('paid_at', 'created_at')
+            bounds = [
+                b for b in (
+                    qs.aggregate(first=Min(sold_at), last=Max(sold_at))
+                    for qs in (Order.objects.filter(is_paid=True), ArchivedOrder.objects.all())
+                )
+                if b['first'] is not None
+            ]
+            if not bounds:
+                self.stdout.write("No paid orders; nothing to rebuild.")
+                return
+            start = timezone.localdate(min(b['first'] for b in bounds))
+            end = max(end, timezone.localdate(max(b['last'] for b in bounds)))
+        if start > end:
+            raise CommandError("--start must not be after --end.")
+
+        with transaction.atomic():
+            count = rebuild(start, end, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rollups for {start}..{end} from {count} order(s)."))
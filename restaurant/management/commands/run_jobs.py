@@ -0,0 +1,105 @@
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, close_old_connections, connection
+
+from restaurant.jobs import JOB_HEARTBEAT, claim_next, heartbeat, purge_finished, requeue_stale, run_job
+
+PURGE_EVERY = 60 * 60
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs on a pool of worker threads."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help="Jobs run at the same time.")
+        parser.add_argument('--poll', type=float, default=1.0, help="Seconds an idle thread waits before looking again.")
+        parser.add_argument('--once', action='store_true', help="Exit once no job is due instead of polling.")
+        parser.add_argument('--keep-days', type=int, default=7, help="Days finished jobs are kept before purging.")
+
+    def handle(self, *args, **options):
+        if options['threads'] < 1 or options['poll'] <= 0 or options['keep_days'] < 1:
+            raise CommandError("--threads, --poll and --keep-days must be positive.")
+        self.options = options
+        self.stop = threading.Event()
+        self.counts = {'done': 0, 'failed': 0}
+        self.counts_lock = threading.Lock()
+        # jobs the loops are running right now, by loop
+        self.running = {}
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+
+        requeue_stale()
+        purge_finished(timedelta(days=options['keep_days']))
+        connection.close()
+        self.stdout.write(f"Worker {worker} running {options['threads']} thread(s).")
+
+        beats = threading.Thread(target=self._heartbeat, daemon=True)
+        beats.start()
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            loops = [pool.submit(self._loop, f'{worker}/{n}') for n in range(options['threads'])]
+            try:
+                while not all(f.done() for f in loops):
+                    time.sleep(0.5)
+            except KeyboardInterrupt:
+                self.stdout.write("Stopping after the running jobs finish...")
+                self.stop.set()
+        self.stop.set()
+        beats.join()
+        for f in loops:
+            f.result()
+        self.stdout.write(self.style.SUCCESS(
+            f"{self.counts['done']} job(s) done, {self.counts['failed']} failed attempt(s)."
+        ))
+
+    def _heartbeat(self):
+        # keeps long jobs from looking abandoned to requeue_stale in other workers
+        try:
+            while not self.stop.wait(JOB_HEARTBEAT):
+                close_old_connections()
+                with self.counts_lock:
+                    running = list(self.running.values())
+                try:
+                    heartbeat(running)
+                except OperationalError:
+                    pass
+        finally:
+            connection.close()
+
+    def _loop(self, worker):
+        last_purge = time.monotonic()
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                try:
+                    job = claim_next(worker)
+                except OperationalError:
+                    # the database is busy; back off like an idle poll
+                    job = None
+                if job is None:
+                    if self.options['once']:
+                        return
+                    if time.monotonic() - last_purge > PURGE_EVERY:
+                        requeue_stale()
+                        purge_finished(timedelta(days=self.options['keep_days']))
+                        last_purge = time.monotonic()
+                    self.stop.wait(self.options['poll'])
+                    continue
+                with self.counts_lock:
+                    self.running[worker] = job
+                try:
+                    ok = run_job(job)
+                except OperationalError:
+                    # couldn't even record the outcome; requeue_stale picks the job up later
+                    ok = False
+                with self.counts_lock:
+                    del self.running[worker]
+                    self.counts['done' if ok else 'failed'] += 1
+                if not ok:
+                    self.stderr.write(f"Job {job.pk} ({job.name}) failed on attempt {job.attempts}.")
+        finally:
+            connection.close()
@@ -0,0 +1,29 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = "Copy the primary SQLite database over each local replica file (for local replica testing)."
+
+    def handle(self, *args, **options):
+        if not settings.REPLICA_DATABASES:
+            raise CommandError("No replicas configured; set RESTAURANT_REPLICA_DBS.")
+        primary = connections['default'].settings_dict
+        if primary['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError("Only SQLite replicas can be synced this way.")
+
+        source = sqlite3.connect(primary['NAME'])
+        try:
+            for alias in settings.REPLICA_DATABASES:
+                connections[alias].close()
+                target = sqlite3.connect(connections[alias].settings_dict['NAME'])
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(self.style.SUCCESS(f"Synced {alias}."))
+        finally:
+            source.close()
@@ -0,0 +1,41 @@
+# Generated by Django 5.2 on 2026-10-16 20:44
+
+from django.db import migrations, models
+from django.db.models import Count, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_totals(apps, schema_editor):
+    Order = apps.get_model("restaurant", "Order")
+    OrderItem = apps.get_model("restaurant", "OrderItem")
+    lines = OrderItem.objects.filter(order=OuterRef("pk")).values("order")
+    Order.objects.update(
+        total=Coalesce(
+            Subquery(
+                lines.annotate(s=Sum(F("quantity") * F("menu_item__price"))).values("s")
+            ),
+            0,
+        ),
+        items_count=Coalesce(Subquery(lines.annotate(c=Count("pk")).values("c")), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("restaurant", "0005_zone"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="items_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="total",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
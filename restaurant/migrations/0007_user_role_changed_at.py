@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-16 20:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("restaurant", "0006_order_totals"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="user",
+            name="role_changed_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,129 @@
+# Generated by Django 5.2 on 2026-10-16 21:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("restaurant", "0007_user_role_changed_at"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DailyRevenue",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField(unique=True)),
+                ("revenue", models.BigIntegerField(default=0)),
+                ("orders_count", models.PositiveIntegerField(default=0)),
+                ("items_count", models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="paid_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name="DailyItemTypeSales",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                (
+                    "item_type",
+                    models.CharField(
+                        choices=[("food", "Food"), ("drink", "Drink")], max_length=10
+                    ),
+                ),
+                ("quantity", models.PositiveIntegerField(default=0)),
+                ("revenue", models.BigIntegerField(default=0)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("day", "item_type"), name="uniq_daily_item_type_sales"
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="DailyMenuItemSales",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("quantity", models.PositiveIntegerField(default=0)),
+                ("revenue", models.BigIntegerField(default=0)),
+                (
+                    "menu_item",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="restaurant.menuitem",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("day", "menu_item"), name="uniq_daily_menu_item_sales"
+                    )
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="DailyTableRevenue",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("day", models.DateField()),
+                ("revenue", models.BigIntegerField(default=0)),
+                ("orders_count", models.PositiveIntegerField(default=0)),
+                (
+                    "table",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="restaurant.table",
+                    ),
+                ),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("day", "table"), name="uniq_daily_table_revenue"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2 on 2026-10-16 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("restaurant", "0008_revenue_rollups"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedOrder",
+            fields=[
+                ("id", models.IntegerField(primary_key=True, serialize=False)),
+                ("table_id", models.IntegerField(db_index=True)),
+                ("table_number", models.PositiveIntegerField()),
+                ("created_at", models.DateTimeField(db_index=True)),
+                ("paid_at", models.DateTimeField(blank=True, null=True)),
+                ("total", models.IntegerField()),
+                ("items_count", models.PositiveIntegerField()),
+                ("lines", models.JSONField(default=list)),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="ArchivedReservation",
+            fields=[
+                ("id", models.IntegerField(primary_key=True, serialize=False)),
+                ("user_id", models.IntegerField(db_index=True)),
+                ("username", models.CharField(max_length=150)),
+                ("table_id", models.IntegerField()),
+                ("table_number", models.PositiveIntegerField()),
+                ("datetime", models.DateTimeField(db_index=True)),
+                ("description", models.TextField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("approved", "Approved"),
+                            ("rejected", "Rejected"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
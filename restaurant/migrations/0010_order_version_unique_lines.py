@@ -0,0 +1,46 @@
+# Generated by Django 5.2 on 2026-10-16 21:05
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_duplicate_lines(apps, schema_editor):
+    # racing get_or_create calls could leave several lines for one item;
+    # fold them into the oldest line before the constraint goes on
+    Order = apps.get_model("restaurant", "Order")
+    OrderItem = apps.get_model("restaurant", "OrderItem")
+    duplicates = (
+        OrderItem.objects.values("order_id", "menu_item_id")
+        .annotate(n=Count("pk"), keep=Min("pk"), quantity=Sum("quantity"))
+        .filter(n__gt=1)
+    )
+    for row in duplicates:
+        OrderItem.objects.filter(pk=row["keep"]).update(quantity=row["quantity"])
+        OrderItem.objects.filter(
+            order_id=row["order_id"], menu_item_id=row["menu_item_id"]
+        ).exclude(pk=row["keep"]).delete()
+        Order.objects.filter(pk=row["order_id"]).update(
+            items_count=OrderItem.objects.filter(order_id=row["order_id"]).count()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("restaurant", "0009_archive"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="version",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(merge_duplicate_lines, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="orderitem",
+            constraint=models.UniqueConstraint(
+                fields=("order", "menu_item"), name="uniq_order_menu_item"
+            ),
+        ),
+    ]
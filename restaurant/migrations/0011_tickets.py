@@ -0,0 +1,67 @@
+# Generated by Django 5.2 on 2026-10-16 22:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("restaurant", "0010_order_version_unique_lines"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Ticket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "station",
+                    models.CharField(
+                        choices=[("kitchen", "Kitchen"), ("bar", "Bar")], max_length=10
+                    ),
+                ),
+                ("table_number", models.PositiveIntegerField()),
+                ("lines", models.JSONField(default=list)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("new", "New"),
+                            ("acked", "Acknowledged"),
+                            ("bumped", "Bumped"),
+                        ],
+                        default="new",
+                        max_length=10,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("acked_at", models.DateTimeField(blank=True, null=True)),
+                ("bumped_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "order",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="restaurant.order",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("status", "bumped"), _negated=True),
+                        fields=["station", "id"],
+                        name="open_tickets_by_station",
+                    )
+                ],
+            },
+        ),
+    ]
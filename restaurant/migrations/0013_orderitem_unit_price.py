@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-17 09:10
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def snapshot_prices(apps, schema_editor):
+    # existing lines were totalled at the current menu price, so that is their price
+    OrderItem = apps.get_model("restaurant", "OrderItem")
+    MenuItem = apps.get_model("restaurant", "MenuItem")
+    OrderItem.objects.update(
+        unit_price=Subquery(MenuItem.objects.filter(pk=OuterRef("menu_item_id")).values("price")[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("restaurant", "0012_jobs"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="orderitem",
+            name="unit_price",
+            field=models.IntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(snapshot_prices, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="orderitem",
+            name="unit_price",
+            field=models.IntegerField(editable=False),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-17 09:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("restaurant", "0013_orderitem_unit_price"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="dailymenuitemsales",
+            name="menu_item",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                to="restaurant.menuitem",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="dailytablerevenue",
+            name="table",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                to="restaurant.table",
+            ),
+        ),
+    ]
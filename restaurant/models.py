@@ -1,7 +1,9 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
-from django.db.models import ForeignKey, UniqueConstraint, Q
+from django.db.models import ForeignKey, UniqueConstraint, Q, F, Count, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 
 
 class User(AbstractUser):
@@ -12,6 +14,24 @@ class User(AbstractUser):
     )
 
     role = models.CharField(max_length=10, choices=ROLE_CHOICES)
+    # tokens issued before this moment carry a stale role claim and are rejected
+    role_changed_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_role = instance.__dict__.get('role')
+        return instance
+
+    def save(self, *args, **kwargs):
+        loaded_role = getattr(self, '_loaded_role', None)
+        if loaded_role is not None and loaded_role != self.role:
+            self.role_changed_at = timezone.now()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'role' in update_fields:
+                kwargs['update_fields'] = set(update_fields) | {'role_changed_at'}
+        super().save(*args, **kwargs)
+        self._loaded_role = self.role
 
 
 class Table(models.Model):
@@ -42,6 +62,20 @@ class Reservation(models.Model):
     description = models.TextField()
     status = models.CharField(max_length=10, choices=STATUS_CHOICES)
 
+    # stands in for the loaded slot when the instance wasn't read with its status
+    UNKNOWN_SLOT = object()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if 'status' in instance.__dict__:
+            instance._loaded_slot = instance.approved_slot()
+        return instance
+
+    def approved_slot(self):
+        """The ``(table_id, datetime)`` this reservation holds, or None unless it is approved."""
+        return (self.table_id, self.datetime) if self.status == 'approved' else None
+
     def __str__(self):
         return f'Reservation by {self.user.username} on {self.datetime}'
 
@@ -73,9 +107,41 @@ class Order(models.Model):
     menu_items = models.ManyToManyField(MenuItem, through='OrderItem')
     is_paid = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    paid_at = models.DateTimeField(null=True, blank=True)
+    total = models.IntegerField(default=0)
+    items_count = models.PositiveIntegerField(default=0)
+    # bumped by every change to the order or its lines, for optimistic concurrency
+    version = models.PositiveIntegerField(default=0)
 
     def total_price(self):
-        return sum(oi.menu_item.price * oi.quantity for oi in self.orderitem_set.all())
+        return sum(oi.unit_price * oi.quantity for oi in self.orderitem_set.all())
+
+    def claim(self, expected_version=None) -> bool:
+        """Bump the version of this unpaid order, row-locking it for the transaction.
+
+        Returns False when the order was paid meanwhile or is no longer at
+        ``expected_version``. Mutations claim the order before touching its
+        lines, so concurrent writers queue on one row and never deadlock.
+        """
+        qs = Order.objects.filter(pk=self.pk, is_paid=False)
+        if expected_version is not None:
+            qs = qs.filter(version=expected_version)
+        return qs.update(version=F('version') + 1) == 1
+
+    def adjust_totals(self, total_delta, count_delta=0):
+        Order.objects.filter(pk=self.pk).update(
+            total=F('total') + total_delta,
+            items_count=F('items_count') + count_delta,
+        )
+
+    @staticmethod
+    def line_totals(order_ref):
+        """``total``/``items_count`` expressions computed from the lines of ``order_ref``."""
+        lines = OrderItem.objects.filter(order=order_ref).values('order')
+        return {
+            'total': Coalesce(Subquery(lines.annotate(s=Sum(F('unit_price') * F('quantity'))).values('s')), 0),
+            'items_count': Coalesce(Subquery(lines.annotate(c=Count('pk')).values('c')), 0),
+        }
 
     class Meta:
         constraints = [
@@ -91,11 +157,26 @@ class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE)
     menu_item = models.ForeignKey(MenuItem, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField()
+    # the menu price when the line was first ordered; later menu changes don't reprice it
+    unit_price = models.IntegerField(editable=False)
+
+    def save(self, *args, **kwargs):
+        if self.unit_price is None:
+            self.unit_price = self.menu_item.price
+        super().save(*args, **kwargs)
 
     def clean(self):
         if self.quantity < 1:
             raise ValidationError("Количината мора да биде барем 1.")
 
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=['order', 'menu_item'],
+                name='uniq_order_menu_item'
+            )
+        ]
+
 class Zone(models.Model):
     ZONE_TYPE_CHOICES = (
         ('glass', 'Glass'),
@@ -112,3 +193,128 @@ class Zone(models.Model):
     def __str__(self):
         return f'{self.get_type_display()} zone ({self.width}x{self.height})'
 
+
+
+class DailyRevenue(models.Model):
+    day = models.DateField(unique=True)
+    revenue = models.BigIntegerField(default=0)
+    orders_count = models.PositiveIntegerField(default=0)
+    items_count = models.PositiveIntegerField(default=0)
+
+
+class DailyMenuItemSales(models.Model):
+    day = models.DateField()
+    # kept when the item is deleted, so the day's revenue history stays whole
+    menu_item = models.ForeignKey(MenuItem, null=True, on_delete=models.SET_NULL)
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['day', 'menu_item'], name='uniq_daily_menu_item_sales')
+        ]
+
+
+class DailyTableRevenue(models.Model):
+    day = models.DateField()
+    table = models.ForeignKey(Table, null=True, on_delete=models.SET_NULL)
+    revenue = models.BigIntegerField(default=0)
+    orders_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['day', 'table'], name='uniq_daily_table_revenue')
+        ]
+
+
+class DailyItemTypeSales(models.Model):
+    day = models.DateField()
+    item_type = models.CharField(max_length=10, choices=MenuItem.ITEM_TYPE_CHOICES)
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['day', 'item_type'], name='uniq_daily_item_type_sales')
+        ]
+
+
+class ArchivedOrder(models.Model):
+    """A paid order moved out of the live tables; ``lines`` keeps the menu data it was sold with."""
+    id = models.IntegerField(primary_key=True)
+    table_id = models.IntegerField(db_index=True)
+    table_number = models.PositiveIntegerField()
+    created_at = models.DateTimeField(db_index=True)
+    paid_at = models.DateTimeField(null=True, blank=True)
+    total = models.IntegerField()
+    items_count = models.PositiveIntegerField()
+    lines = models.JSONField(default=list)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+
+class ArchivedReservation(models.Model):
+    id = models.IntegerField(primary_key=True)
+    user_id = models.IntegerField(db_index=True)
+    username = models.CharField(max_length=150)
+    table_id = models.IntegerField()
+    table_number = models.PositiveIntegerField()
+    datetime = models.DateTimeField(db_index=True)
+    description = models.TextField()
+    status = models.CharField(max_length=10, choices=Reservation.STATUS_CHOICES)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+
+class Ticket(models.Model):
+    """New order lines routed to the station that prepares them."""
+    STATION_CHOICES = (
+        ('kitchen', 'Kitchen'),
+        ('bar', 'Bar'),
+    )
+    STATUS_CHOICES = (
+        ('new', 'New'),
+        ('acked', 'Acknowledged'),
+        ('bumped', 'Bumped'),
+    )
+    order = models.ForeignKey(Order, on_delete=models.CASCADE)
+    station = models.CharField(max_length=10, choices=STATION_CHOICES)
+    table_number = models.PositiveIntegerField()
+    # [{"menu_item": id, "name": ..., "quantity": n}], as they were when the ticket was sent
+    lines = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='new')
+    created_at = models.DateTimeField(auto_now_add=True)
+    acked_at = models.DateTimeField(null=True, blank=True)
+    bumped_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # a station screen only ever reads its open tickets past a cursor
+            models.Index(fields=['station', 'id'], condition=~Q(status='bumped'), name='open_tickets_by_station'),
+        ]
+
+
+class Job(models.Model):
+    """A unit of background work; see ``restaurant/jobs.py``."""
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+    # dotted path of a function decorated with ``jobs.background``
+    name = models.CharField(max_length=200)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['run_at', 'id'], condition=Q(status='queued'), name='queued_jobs_by_run_at'),
+        ]
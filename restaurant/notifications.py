@@ -0,0 +1,45 @@
+"""
+Emails telling guests what became of their reservations.
+
+Approving or rejecting queues a ``notify_reservations`` job in the same
+transaction as the status change, so a guest only hears about decisions that
+committed, and a process that dies right after the commit still leaves the
+job for ``manage.py run_jobs``. A send that fails is retried with the job's
+backoff; the job is marked done only after the mail went out, so a crash in
+between can send it a second time, never zero times.
+"""
+
+from django.core.mail import send_mass_mail
+from django.utils import timezone
+
+from .jobs import background
+from .models import Reservation
+
+SUBJECTS = {
+    'approved': "Your reservation is confirmed",
+    'rejected': "Your reservation could not be accepted",
+}
+
+
+def queue_decisions(ids, status):
+    """Queue the emails for reservations that just moved to ``status``; call inside that transaction."""
+    if ids:
+        notify_reservations.delay(sorted(ids), status)
+
+
+@background(max_attempts=5)
+def notify_reservations(ids, status):
+    """Email each guest whose reservation in ``ids`` is still ``status``."""
+    rows = Reservation.objects.filter(pk__in=ids, status=status).select_related('user', 'table').order_by('pk')
+    messages = [
+        (
+            SUBJECTS[status],
+            f"Hello {r.user.username},\n\nyour reservation for table {r.table.number} on "
+            f"{timezone.localtime(r.datetime):%Y-%m-%d %H:%M} has been {status}.\n",
+            None,
+            [r.user.email],
+        )
+        # a reservation decided again since then gets its own email from that decision
+        for r in rows if r.user.email
+    ]
+    send_mass_mail(messages, fail_silently=False)
@@ -0,0 +1,27 @@
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetPagination(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+
+class ReservationPagination(KeysetPagination):
+    ordering = ('-datetime', '-id')
+
+
+class OrderPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
+
+
+class TiebreakOrderingFilter(OrderingFilter):
+    """Ends every ordering on the primary key, so cursor pages over a
+    non-unique column like ``total`` keep ties in a stable order."""
+
+    def get_ordering(self, request, queryset, view):
+        ordering = list(super().get_ordering(request, queryset, view) or [])
+        if ordering and not any(f.lstrip('-') in ['id', 'pk'] for f in ordering):
+            ordering.append('-id' if ordering[-1].startswith('-') else 'id')
+        return ordering
@@ -0,0 +1,57 @@
+"""
+Plain-dict payloads for the hot order and table responses.
+
+Each builder returns exactly what ``OrderSerializer`` or ``TableSerializer``
+would, assembled from ``values()`` rows rather than model instances and
+nested serializer fields. Menu items already come pre-built from the
+catalog. ``tests.py`` checks that the rendered bytes match the serializers.
+"""
+
+from collections import defaultdict
+
+from rest_framework.fields import DateTimeField
+
+from .catalog import MENU_FIELDS
+from .models import Table, OrderItem
+
+TABLE_FIELDS = [f.attname for f in Table._meta.concrete_fields]
+# what the cursor pagination and ordering filter may sort a page of these rows by
+ORDER_FIELDS = ['id', 'table_id', 'is_paid', 'created_at', 'total', 'version']
+LINE_FIELDS = ['id', 'order_id', 'menu_item_id', 'quantity', *(f'menu_item__{f}' for f in MENU_FIELDS)]
+
+# the serializer field itself, so timezone and format settings apply the same way
+_datetime = DateTimeField().to_representation
+
+
+def table_payloads(queryset):
+    return list(queryset.values(*TABLE_FIELDS))
+
+
+def order_payloads(rows):
+    """Turn Order ``values(*ORDER_FIELDS)`` rows into ``OrderSerializer`` dicts, keeping their order."""
+    lines = defaultdict(list)
+    if rows:
+        queryset = (
+            OrderItem.objects.filter(order_id__in=[r['id'] for r in rows])
+            .order_by('pk').values_list(*LINE_FIELDS)
+        )
+        for line_id, order_id, menu_item_id, quantity, *menu_item in queryset:
+            lines[order_id].append({
+                'id': line_id,
+                'order': order_id,
+                'menu_item': menu_item_id,
+                'quantity': quantity,
+                'menu_item_detail': dict(zip(MENU_FIELDS, menu_item)),
+            })
+    return [
+        {
+            'id': r['id'],
+            'table': r['table_id'],
+            'is_paid': r['is_paid'],
+            'created_at': _datetime(r['created_at']),
+            'orderitem_set': lines.get(r['id'], []),
+            'total': r['total'],
+            'version': r['version'],
+        }
+        for r in rows
+    ]
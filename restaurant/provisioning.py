@@ -0,0 +1,168 @@
+"""
+Registration checks shared by ``register_user`` and bulk staff provisioning.
+
+Bulk provisioning checks every row first, looks up username and email clashes
+in one query, hashes the passwords on a small thread pool (PBKDF2 runs in
+OpenSSL with the GIL released) and inserts all valid users with one
+``bulk_create``.
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.db import transaction, IntegrityError
+from django.db.models import Q
+
+ROLES = ['client', 'waiter', 'manager']
+
+
+# a missing role registers a client; an empty one is invalid like any other unknown role
+FIELD_DEFAULTS = {'username': '', 'email': '', 'password1': '', 'password2': '', 'role': 'client'}
+
+
+def clean_registration(data):
+    """Return ``(values, errors)`` for a ``register_user`` payload, leaving out the uniqueness checks."""
+    raw = {name: data.get(name, default) for name, default in FIELD_DEFAULTS.items()}
+    type_errors = {name: ['This field must be a string'] for name, value in raw.items() if not isinstance(value, str)}
+    fields = {name: value if isinstance(value, str) else '' for name, value in raw.items()}
+    username = fields['username'].strip()
+    email = fields['email'].strip()
+    password1 = fields['password1']
+    password2 = fields['password2']
+    role = fields['role']
+
+    errors = {}
+
+    if not username:
+        errors['username'] = ['Username is required']
+    elif len(username) < 3:
+        errors['username'] = ['Username must be at least 3 characters']
+
+    if not email:
+        errors['email'] = ['Email is required']
+    elif '@' not in email or '.' not in email:
+        errors['email'] = ['Please enter a valid email address']
+
+    if not password1:
+        errors['password1'] = ['Password is required']
+    elif len(password1) < 6:
+        errors['password1'] = ['Password must be at least 6 characters']
+
+    if not password2:
+        errors['password2'] = ['Password confirmation is required']
+    elif password1 != password2:
+        errors['password2'] = ['Passwords do not match']
+
+    if role not in ROLES:
+        errors['role'] = ['Invalid role selected']
+
+    if password1 and not errors.get('password1'):
+        try:
+            validate_password(password1)
+        except ValidationError as e:
+            errors['password1'] = list(e.messages)
+
+    # a JSON number or null is reported as such, not as the empty value it stood in for
+    errors.update(type_errors)
+    values = {'username': username, 'email': email, 'password': password1, 'role': role}
+    return values, errors
+
+
+def taken(usernames, emails):
+    """Usernames and emails already in use, from one query."""
+    User = get_user_model()
+    rows = User.objects.filter(Q(username__in=usernames) | Q(email__in=emails)).values_list('username', 'email')
+    taken_usernames, taken_emails = set(), set()
+    for username, email in rows:
+        taken_usernames.add(username)
+        taken_emails.add(email)
+    return taken_usernames & set(usernames), taken_emails & set(emails)
+
+
+def add_conflict_errors(values, errors, taken_usernames, taken_emails):
+    if 'username' not in errors and values['username'] in taken_usernames:
+        errors['username'] = ['Username already exists']
+    if 'email' not in errors and values['email'] in taken_emails:
+        errors['email'] = ['Email already exists']
+
+
+def user_payload(user):
+    return {'id': user.id, 'username': user.username, 'email': user.email, 'role': user.role}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _hash_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # threads, not processes: forking a threaded web worker with open
+            # connections is unsafe, and the hashers' C code runs outside the GIL
+            _pool = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'PASSWORD_HASH_WORKERS', 2),
+                thread_name_prefix='password-hash',
+            )
+        return _pool
+
+
+def hash_passwords(passwords):
+    if len(passwords) < 2:
+        return [make_password(p) for p in passwords]
+    return list(_hash_pool().map(make_password, passwords, chunksize=max(len(passwords) // 16, 1)))
+
+
+def provision_users(rows):
+    """Create users from ``register_user``-style dicts.
+
+    Returns one result per row, in order: ``{'index', 'user'}`` for a created
+    user or ``{'index', 'errors'}`` with ``register_user``'s error format.
+    """
+    User = get_user_model()
+    cleaned = [clean_registration(row) for row in rows]
+
+    def check(cleaned):
+        taken_usernames, taken_emails = taken(
+            [v['username'] for v, _ in cleaned], [v['email'] for v, _ in cleaned]
+        )
+        for values, errors in cleaned:
+            add_conflict_errors(values, errors, taken_usernames, taken_emails)
+            if not errors:
+                # later rows in the same batch can't reuse what an earlier one claims
+                taken_usernames.add(values['username'])
+                taken_emails.add(values['email'])
+
+    check(cleaned)
+    valid = [i for i, (_, errors) in enumerate(cleaned) if not errors]
+    hashes = dict(zip(valid, hash_passwords([cleaned[i][0]['password'] for i in valid])))
+
+    for attempt in range(2):
+        valid = [i for i, (_, errors) in enumerate(cleaned) if not errors]
+        users = [User(**{**cleaned[i][0], 'password': hashes[i]}) for i in valid]
+        try:
+            with transaction.atomic():
+                User.objects.bulk_create(users)
+            break
+        except IntegrityError:
+            if attempt:
+                for i in valid:
+                    cleaned[i][1]['non_field_errors'] = ['User with this username or email already exists']
+                valid, users = [], []
+            else:
+                # someone registered one of these names in between; recheck and retry once
+                check(cleaned)
+
+    created = dict(zip(valid, users))
+    results = []
+    for i, (_, errors) in enumerate(cleaned):
+        if i in created:
+            results.append({'index': i, 'user': user_payload(created[i])})
+        else:
+            results.append({'index': i, 'errors': errors})
+    return results
@@ -0,0 +1,37 @@
+import re
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from rest_framework.renderers import JSONRenderer
+
+# orjson writes exponents as 1e16 / 1e-5 where json writes 1e+16 / 1e-05
+_EXPONENT = re.compile(rb'[0-9]e-?[0-9]')
+
+
+class ORJSONRenderer(JSONRenderer):
+    """``JSONRenderer`` output, byte for byte, encoded with orjson when it is installed.
+
+    Dates and times still go through DRF's encoder, and anything orjson would
+    print differently (indented output, exponent floats, integers past 64
+    bits) falls back to the stock renderer. The one difference left is NaN
+    and infinity, which orjson writes as null where the stock renderer fails.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or not self.compact or self.ensure_ascii
+                or self.get_indent(accepted_media_type, renderer_context or {}) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data, default=self.encoder_class().default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if _EXPONENT.search(ret):
+            return super().render(data, accepted_media_type, renderer_context)
+        # JSONRenderer escapes these two so the output is also valid JavaScript
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
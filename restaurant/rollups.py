@@ -0,0 +1,170 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from functools import reduce
+from operator import or_
+
+from django.db.models import F, Q, Case, When, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import (
+    Order, OrderItem, MenuItem, Table, ArchivedOrder,
+    DailyRevenue, DailyMenuItemSales, DailyTableRevenue, DailyItemTypeSales,
+)
+
+# lines are counted at the price they were sold at, like Order.total
+LINE_FIELDS = ('order_id', 'menu_item_id', 'menu_item__item_type', 'unit_price', 'quantity')
+
+
+def sale_day(order):
+    # orders paid before paid_at existed fall back to the day they were opened
+    return timezone.localdate(order.paid_at or order.created_at)
+
+
+class Rollup:
+    """Per-day revenue deltas for a set of paid orders, keyed like the rollup tables."""
+
+    TABLES = [
+        (DailyRevenue, ('day',), ('revenue', 'orders_count', 'items_count'), 'days'),
+        (DailyMenuItemSales, ('day', 'menu_item_id'), ('quantity', 'revenue'), 'menu_items'),
+        (DailyTableRevenue, ('day', 'table_id'), ('revenue', 'orders_count'), 'tables'),
+        (DailyItemTypeSales, ('day', 'item_type'), ('quantity', 'revenue'), 'item_types'),
+    ]
+
+    def __init__(self):
+        self.days = defaultdict(lambda: [0, 0, 0])
+        self.menu_items = defaultdict(lambda: [0, 0])
+        self.tables = defaultdict(lambda: [0, 0])
+        self.item_types = defaultdict(lambda: [0, 0])
+
+    def add_order(self, day, table_id, lines):
+        """``lines`` are ``(menu_item_id, item_type, price, quantity)`` tuples. A ``None``
+        menu item or table (deleted since the sale) goes to a ``None`` bucket, as the
+        incremental rows do when the delete nulls their foreign key."""
+        revenue = 0
+        for menu_item_id, item_type, price, quantity in lines:
+            amount = price * quantity
+            revenue += amount
+            for bucket in (self.item_types[(day, item_type)], self.menu_items[(day, menu_item_id)]):
+                bucket[0] += quantity
+                bucket[1] += amount
+        totals = self.days[(day,)]
+        totals[0] += revenue
+        totals[1] += 1
+        totals[2] += len(lines)
+        table = self.tables[(day, table_id)]
+        table[0] += revenue
+        table[1] += 1
+
+    def increment(self):
+        """Add the deltas onto existing rollup rows, two queries per rollup table.
+
+        Only for live orders, whose menu items and table all exist: a ``None`` key
+        would match every nulled row of its day.
+        """
+        for model, keys, fields, attr in self.TABLES:
+            deltas = getattr(self, attr)
+            if not deltas:
+                continue
+            model.objects.bulk_create(
+                [model(**dict(zip(keys, k))) for k in deltas], ignore_conflicts=True
+            )
+            matches = [Q(**dict(zip(keys, k))) for k in deltas]
+            updates = {
+                f: F(f) + Case(
+                    *[When(m, then=Value(values[i])) for m, values in zip(matches, deltas.values())],
+                    default=Value(0),
+                )
+                for i, f in enumerate(fields)
+            }
+            model.objects.filter(reduce(or_, matches)).update(**updates)
+
+    def create(self, batch_size):
+        """Insert the deltas as fresh rows; the caller has cleared the range first."""
+        for model, keys, fields, attr in self.TABLES:
+            model.objects.bulk_create(
+                (model(**dict(zip(keys, k)), **dict(zip(fields, v))) for k, v in getattr(self, attr).items()),
+                batch_size=batch_size,
+            )
+
+
+def record_paid_order(order):
+    """Fold one just-paid order into the rollups; call inside the payment transaction."""
+    lines = OrderItem.objects.filter(order_id=order.pk).values_list(*LINE_FIELDS[1:])
+    rollup = Rollup()
+    rollup.add_order(sale_day(order), order.table_id, list(lines))
+    rollup.increment()
+
+
+def day_bounds(start, end):
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.combine(start, time.min), tz),
+        timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min), tz),
+    )
+
+
+def _keyset(qs, fields, batch_size):
+    last_pk = None
+    while True:
+        page = qs if last_pk is None else qs.filter(pk__gt=last_pk)
+        batch = list(page.values_list('pk', *fields)[:batch_size])
+        if not batch:
+            return
+        last_pk = batch[-1][0]
+        yield batch
+
+
+def rebuild(start, end, batch_size=1000):
+    """Recompute the rollups for ``start``..``end`` (inclusive) from paid orders,
+    live and archived.
+
+    Deleting a menu item or table archives its paid orders first (see
+    ``signals.archive_sales_before_delete``), so their lines are still found
+    here and land in the same ``None`` buckets the incremental rows end up in.
+
+    Orders are read in primary-key batches, so memory is bounded by the number
+    of rollup rows in the range rather than by order history. Run it inside a
+    transaction so readers never see a half-built range.
+    """
+    for model, *_ in Rollup.TABLES:
+        model.objects.filter(day__range=(start, end)).delete()
+
+    lo, hi = day_bounds(start, end)
+    rollup = Rollup()
+    count = 0
+
+    live = (
+        Order.objects.filter(is_paid=True)
+        .annotate(sold_at=Coalesce('paid_at', 'created_at'))
+        .filter(sold_at__gte=lo, sold_at__lt=hi)
+        .order_by('pk')
+    )
+    for batch in _keyset(live, ['table_id', 'sold_at'], batch_size):
+        lines = defaultdict(list)
+        for order_id, *line in OrderItem.objects.filter(order_id__in=[b[0] for b in batch]).values_list(*LINE_FIELDS):
+            lines[order_id].append(line)
+        for pk, table_id, sold_at in batch:
+            rollup.add_order(timezone.localdate(sold_at), table_id, lines[pk])
+        count += len(batch)
+
+    archived = (
+        ArchivedOrder.objects
+        .annotate(sold_at=Coalesce('paid_at', 'created_at'))
+        .filter(sold_at__gte=lo, sold_at__lt=hi)
+        .order_by('pk')
+    )
+    menu_ids = set(MenuItem.objects.values_list('id', flat=True))
+    table_ids = set(Table.objects.values_list('id', flat=True))
+    for batch in _keyset(archived, ['table_id', 'sold_at', 'lines'], batch_size):
+        for pk, table_id, sold_at, lines in batch:
+            table_id = table_id if table_id in table_ids else None
+            rollup.add_order(timezone.localdate(sold_at), table_id, [
+                (l['menu_item_id'] if l['menu_item_id'] in menu_ids else None,
+                 l['item_type'], l['price'], l['quantity'])
+                for l in lines
+            ])
+        count += len(batch)
+
+    rollup.create(batch_size)
+    return count
@@ -1,5 +1,20 @@
+from django.db import transaction
 from rest_framework import serializers
-from .models import Reservation, Table, Order, MenuItem, OrderItem, Zone
+from .models import Reservation, Table, Order, MenuItem, OrderItem, Zone, ArchivedOrder, ArchivedReservation
+from .signals import order_lines_changed
+from .catalog import menu_catalog
+from .tickets import enqueue_tickets
+
+class FieldSelectionMixin:
+    """Drops fields not listed in the ``fields`` context entry, when one is given."""
+
+    def get_fields(self):
+        fields = super().get_fields()
+        wanted = self.context.get('fields')
+        if wanted is not None:
+            for name in set(fields) - set(wanted):
+                fields.pop(name)
+        return fields
 
 class TableSerializer(serializers.ModelSerializer):
     class Meta:
@@ -19,20 +34,39 @@ class OrderItemSerializer(serializers.ModelSerializer):
         fields = ['id', 'order', 'menu_item', 'quantity', 'menu_item_detail']
         read_only_fields = ['order']
 
+    def get_fields(self):
+        fields = super().get_fields()
+        expand = self.context.get('expand')
+        if expand is not None and 'menu_item' not in expand:
+            fields.pop('menu_item_detail')
+        return fields
+
+class CatalogMenuItemField(serializers.PrimaryKeyRelatedField):
+    def to_internal_value(self, data):
+        try:
+            item = menu_catalog().by_id.get(int(data))
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if item is None:
+            self.fail('does_not_exist', pk_value=data)
+        return item
+
 class OrderCreateItemInSerializer(serializers.Serializer):
-    menu_item = serializers.PrimaryKeyRelatedField(queryset=MenuItem.objects.all())
+    menu_item = CatalogMenuItemField(queryset=MenuItem.objects.all())
     quantity = serializers.IntegerField(min_value=1)
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     orderitem_set = OrderItemSerializer(many=True, read_only=True)
     total = serializers.SerializerMethodField()
 
     class Meta:
         model = Order
-        fields = ['id', 'table', 'is_paid', 'created_at', 'orderitem_set', 'total']
+        fields = ['id', 'table', 'is_paid', 'created_at', 'orderitem_set', 'total', 'version']
+        # payment goes through the pay action, which also folds the order into the rollups
+        read_only_fields = ['is_paid', 'version']
 
     def get_total(self, obj):
-        return obj.total_price()
+        return obj.total
 
 class OrderCreateSerializer(serializers.ModelSerializer):
     items = OrderCreateItemInSerializer(many=True, write_only=True)
@@ -43,16 +77,27 @@ class OrderCreateSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         items = validated_data.pop('items', [])
-        order = Order.objects.create(**validated_data)
-        bulk = [
-            OrderItem(order=order, menu_item=it['menu_item'], quantity=it['quantity'])
-            for it in items
-        ]
-        if bulk:
-            OrderItem.objects.bulk_create(bulk)
+        # one line per menu item; repeats in the request add up
+        quantities = {}
+        for it in items:
+            quantities[it['menu_item']] = quantities.get(it['menu_item'], 0) + it['quantity']
+        with transaction.atomic():
+            order = Order.objects.create(
+                total=sum(mi.price * qty for mi, qty in quantities.items()),
+                items_count=len(quantities),
+                **validated_data
+            )
+            bulk = [
+                OrderItem(order=order, menu_item=mi, quantity=qty, unit_price=mi.price)
+                for mi, qty in quantities.items()
+            ]
+            if bulk:
+                OrderItem.objects.bulk_create(bulk)
+                enqueue_tickets(order.id, order.table.number, quantities.items())
+                order_lines_changed(order.id)
         return order
 
-class ReservationSerializer(serializers.ModelSerializer):
+class ReservationSerializer(FieldSelectionMixin, serializers.ModelSerializer):
     user_username = serializers.CharField(source='user.username', read_only=True)
     class Meta:
         model = Reservation
@@ -67,3 +112,13 @@ class ZoneSerializer(serializers.ModelSerializer):
     class Meta:
         model = Zone
         fields = '__all__'
+
+class ArchivedOrderSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ArchivedOrder
+        fields = '__all__'
+
+class ArchivedReservationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ArchivedReservation
+        fields = '__all__'
@@ -1,22 +1,133 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete
 from django.dispatch import receiver
-from .models import Reservation, Order, Table
+from .models import Reservation, Order, Table, OrderItem, MenuItem, User, Zone
+from .snapshot import bump_floor_version
+from .events import publish_table, publish_order
+from .availability import index as reservation_index
+from .catalog import bump_menu_version
+from .table_states import release, transition, transition_many
+from .authentication import forget_user_state
+from .floorplan import index as floor_index, bump_floorplan_version
+from .archive import archive_paid
 
 
-@receiver(post_save, sender=Reservation)
-def update_table_status_from_reservation(sender, instance, **kwargs):
-    if instance.status == 'approved':
-        instance.table.status = 'reserved'
-        instance.table.save()
-    elif instance.status == 'rejected':
-        instance.table.status = 'available'
-        instance.table.save()
+def order_lines_changed(order_id):
+    """Bulk line writes skip post_save, so callers report them here."""
+    transaction.on_commit(bump_floor_version)
+    transaction.on_commit(lambda: publish_order(order_id))
+
+
+def reservations_changed(rows, was_approved=()):
+    """Bulk status updates skip post_save; ``rows`` are (id, table_id, datetime, status)
+    and ``was_approved`` the ids among them that were approved before the update."""
+    rows = list(rows)
+    # only a reservation that held its table gives it back, and only from reserved
+    moves = [
+        ('reserved', {table_id for _, table_id, _, s in rows if s == 'approved'}),
+        ('available', {table_id for pk, table_id, _, s in rows if s == 'rejected' and pk in was_approved}),
+    ]
+    for target, table_ids in moves:
+        if table_ids:
+            transition_many(Table.objects.filter(pk__in=table_ids), target)
+    # only approvals gained or lost move the availability index
+    entries = [
+        (pk, table_id, dt, s == 'approved') for pk, table_id, dt, s in rows
+        if (s == 'approved') != (pk in was_approved)
+    ]
+    if entries:
+        transaction.on_commit(lambda: reservation_index.apply_many(entries))
 
 
 @receiver(post_save, sender=Order)
 def update_table_status_from_order(sender, instance, **kwargs):
     if instance.is_paid:
-        instance.table.status = 'available'
+        release(instance.table_id)
+    else:
+        transition(instance.table_id, 'occupied')
+
+
+@receiver([post_save, post_delete], sender=Table)
+@receiver([post_save, post_delete], sender=Order)
+@receiver([post_save, post_delete], sender=OrderItem)
+def invalidate_floor_snapshot(sender, **kwargs):
+    transaction.on_commit(bump_floor_version)
+
+
+@receiver(post_save, sender=Table)
+def broadcast_table(sender, instance, **kwargs):
+    table_id, number, status = instance.id, instance.number, instance.status
+    transaction.on_commit(lambda: publish_table(table_id, number, status))
+
+
+@receiver(post_save, sender=Order)
+@receiver([post_save, post_delete], sender=OrderItem)
+def broadcast_order(sender, instance, **kwargs):
+    order_id = instance.order_id if sender is OrderItem else instance.id
+    transaction.on_commit(lambda: publish_order(order_id))
+
+
+@receiver(post_save, sender=Table)
+def index_table_position(sender, instance, **kwargs):
+    args = (instance.id, instance.top, instance.left)
+    transaction.on_commit(lambda: floor_index.move_table(*args))
+
+
+@receiver(post_delete, sender=Table)
+def unindex_table_position(sender, instance, **kwargs):
+    pk = instance.id
+    transaction.on_commit(lambda: floor_index.move_table(pk, None, None))
+
+
+@receiver([post_save, post_delete], sender=Zone)
+def invalidate_floorplan(sender, **kwargs):
+    transaction.on_commit(bump_floorplan_version)
+
+
+@receiver(post_save, sender=Reservation)
+def reservation_saved(sender, instance, created, **kwargs):
+    slot = instance.approved_slot()
+    loaded = None if created else getattr(instance, '_loaded_slot', Reservation.UNKNOWN_SLOT)
+    instance._loaded_slot = slot
+    # pending creates and edits that keep the approval leave tables and occupancy alone
+    if slot == loaded:
+        return
+    if slot is not None:
+        transition(instance.table_id, 'reserved')
+    elif instance.status == 'rejected' and loaded not in (None, Reservation.UNKNOWN_SLOT):
+        # only a reservation that held the table gives it back
+        transition(loaded[0], 'available')
+    args = (instance.id, instance.table_id, instance.datetime, slot is not None)
+    transaction.on_commit(lambda: reservation_index.apply(*args))
+
+
+@receiver(post_delete, sender=Reservation)
+def unindex_reservation(sender, instance, **kwargs):
+    if instance.approved_slot() is None and getattr(instance, '_loaded_slot', Reservation.UNKNOWN_SLOT) is None:
+        return
+    pk = instance.id
+    transaction.on_commit(lambda: reservation_index.discard(pk))
+
+
+@receiver(pre_delete, sender=MenuItem)
+@receiver(pre_delete, sender=Table)
+def archive_sales_before_delete(sender, instance, **kwargs):
+    """The delete cascades to paid orders and their lines; the archive keeps
+    what they sold, so a rollup rebuild still finds it."""
+    if sender is MenuItem:
+        orders = Order.objects.filter(pk__in=OrderItem.objects.filter(menu_item=instance).values('order_id'))
     else:
-        instance.table.status = 'occupied'
-    instance.table.save()
+        orders = Order.objects.filter(table=instance)
+    for _ in archive_paid(orders):
+        pass
+
+
+@receiver([post_save, post_delete], sender=MenuItem)
+def invalidate_menu_catalog(sender, **kwargs):
+    transaction.on_commit(bump_menu_version)
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user_state(sender, instance, **kwargs):
+    user_id = instance.pk
+    transaction.on_commit(lambda: forget_user_state(user_id))
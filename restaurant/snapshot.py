@@ -0,0 +1,78 @@
+from django.core.cache import cache
+from django.db import router
+from django.db.models import F, FilteredRelation, Q
+
+from .models import Table
+from .versions import current_version, acurrent_version, bump_version
+
+FLOOR_VERSION_KEY = 'restaurant:floor:version'
+FLOOR_SNAPSHOT_KEY = 'restaurant:floor:snapshot:{}'
+FLOOR_SNAPSHOT_TIMEOUT = 60 * 60
+
+
+def floor_version() -> int:
+    return current_version(FLOOR_VERSION_KEY)
+
+
+def bump_floor_version():
+    bump_version(FLOOR_VERSION_KEY)
+
+
+def floor_etag(version: int) -> str:
+    return f'"floor-{version}"'
+
+
+def _floor_rows():
+    # built from the primary: a lagging replica would cache old data under a new version
+    return (
+        Table.objects.using(router.db_for_write(Table))
+        .annotate(active=FilteredRelation('order', condition=Q(order__is_paid=False)))
+        .annotate(
+            active_order_id=F('active__id'),
+            items_count=F('active__items_count'),
+            total=F('active__total'),
+        )
+        .order_by('id')
+        .values('id', 'number', 'chairs', 'status', 'top', 'left',
+                'active_order_id', 'items_count', 'total')
+    )
+
+
+def _floor_row(r):
+    order_id = r.pop('active_order_id')
+    items_count = r.pop('items_count')
+    total = r.pop('total')
+    if order_id is not None:
+        r['active_order'] = {
+            'order_id': order_id,
+            'items_count': items_count,
+            'total': total,
+        }
+    else:
+        r['active_order'] = None
+    return r
+
+
+def build_floor_snapshot() -> list:
+    return [_floor_row(r) for r in _floor_rows()]
+
+
+def floor_snapshot():
+    """Return ``(version, payload)`` for the floor status, served from cache when current."""
+    version = floor_version()
+    key = FLOOR_SNAPSHOT_KEY.format(version)
+    data = cache.get(key)
+    if data is None:
+        data = build_floor_snapshot()
+        cache.set(key, data, timeout=FLOOR_SNAPSHOT_TIMEOUT)
+    return version, data
+
+
+async def afloor_snapshot():
+    version = await acurrent_version(FLOOR_VERSION_KEY)
+    key = FLOOR_SNAPSHOT_KEY.format(version)
+    data = await cache.aget(key)
+    if data is None:
+        data = [_floor_row(r) async for r in _floor_rows()]
+        await cache.aset(key, data, timeout=FLOOR_SNAPSHOT_TIMEOUT)
+    return version, data
@@ -0,0 +1,86 @@
+from django.db import transaction
+
+from .models import Table
+from .snapshot import bump_floor_version
+from .events import publish_tables, publish_floor
+
+# an occupied table is only freed through ``release``, which checks for unpaid orders
+TRANSITIONS = {
+    'available': {'reserved', 'occupied'},
+    'reserved': {'available', 'occupied'},
+    'occupied': set(),
+}
+
+
+class IllegalTransition(Exception):
+    pass
+
+
+def sources_for(target):
+    return [source for source, targets in TRANSITIONS.items() if target in targets]
+
+
+def can_transition(current, target) -> bool:
+    return current == target or target in TRANSITIONS.get(current, ())
+
+
+def _changed(table_ids):
+    transaction.on_commit(bump_floor_version)
+    transaction.on_commit(lambda: publish_tables(table_ids))
+
+
+def transition(table_id, target) -> bool:
+    """Move one table to ``target`` with a single compare-and-set UPDATE.
+
+    Returns False when nothing was written, either because the table is
+    already in ``target`` or because its current status does not allow it.
+    """
+    if target not in TRANSITIONS:
+        raise IllegalTransition(f"Unknown table status {target!r}.")
+    changed = Table.objects.filter(pk=table_id, status__in=sources_for(target)).update(status=target)
+    if changed:
+        _changed([table_id])
+    return bool(changed)
+
+
+def transition_table(table: Table, target):
+    """Like ``transition`` but for a loaded table; raises on an illegal move."""
+    if not can_transition(table.status, target):
+        raise IllegalTransition(f"A table cannot go from {table.status} to {target}.")
+    if table.status != target and not transition(table.pk, target):
+        table.refresh_from_db(fields=['status'])
+        if table.status != target:
+            raise IllegalTransition(f"The table changed to {table.status} in the meantime.")
+    table.status = target
+
+
+def transition_many(queryset, target) -> int:
+    """Move every table in ``queryset`` that allows it to ``target`` in one UPDATE."""
+    if target not in TRANSITIONS:
+        raise IllegalTransition(f"Unknown table status {target!r}.")
+    changed = queryset.filter(status__in=sources_for(target)).update(status=target)
+    if changed:
+        transaction.on_commit(bump_floor_version)
+        transaction.on_commit(lambda: publish_floor(target, changed))
+    return changed
+
+
+def _releasable(queryset):
+    return queryset.exclude(status='available').exclude(order__is_paid=False)
+
+
+def release(table_id) -> bool:
+    """Free one table unless it still has an unpaid order; the pay and free paths use it."""
+    changed = _releasable(Table.objects.filter(pk=table_id)).update(status='available')
+    if changed:
+        _changed([table_id])
+    return bool(changed)
+
+
+def release_many(queryset) -> int:
+    """Free every table in ``queryset`` that has no unpaid order, whatever its status."""
+    changed = _releasable(queryset).update(status='available')
+    if changed:
+        transaction.on_commit(bump_floor_version)
+        transaction.on_commit(lambda: publish_floor('available', changed))
+    return changed
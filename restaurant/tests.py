@@ -1,3 +1,1242 @@
-from django.test import TestCase
+import asyncio
+import io
+import sys
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.core.signals import got_request_exception
+from django.db import OperationalError, connection
+from django.db.models import Prefetch, Sum
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from . import events
+from .archive import archive_orders, archive_reservations
+from .authentication import (
+    RoleClaimsJWTAuthentication, RoleTokenObtainPairSerializer, RoleTokenUser, _state_query,
+    forget_user_state,
+)
+from .benchmarks import QUERY_BUDGETS, run_suite
+from .availability import INDEX_VERSION_KEY, ReservationIndex
+from .catalog import menu_catalog
+from .events import EventHub
+from .floorplan import FloorIndex
+from .idempotency import idempotency_store
+from .imports import ImportReport, ImportSpec, import_rows
+from .jobs import JOB_LOCK_TIMEOUT, background, backoff, claim_next, heartbeat, requeue_stale, run_job
+from .models import (
+    User, Table, MenuItem, Order, OrderItem, Reservation, Zone, Ticket, Job,
+    DailyRevenue, DailyMenuItemSales, DailyTableRevenue, ArchivedOrder, ArchivedReservation,
+)
+from .notifications import SUBJECTS
+from .payloads import ORDER_FIELDS, order_payloads, table_payloads
+from .renderers import ORJSONRenderer
+from .rollups import Rollup, rebuild, record_paid_order
+from .serializers import OrderSerializer, TableSerializer, MenuItemSerializer, ZoneSerializer
+from .snapshot import build_floor_snapshot
+from .table_states import IllegalTransition, release, transition, transition_table
+from .tickets import await_tickets, bump_station, open_tickets
+from .versions import bump_version, current_version
+from restaurantBook.db_router import ReplicaRoutingMiddleware, use_replica
+from restaurantBook.metrics import RequestMetricsMiddleware
+
+
+def waiter_client(user, **kwargs):
+    client = APIClient(**kwargs)
+    token = RoleTokenObtainPairSerializer.get_token(user).access_token
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+    return client
+
+
+class ConcurrentOrderMutationTests(TransactionTestCase):
+    """Several waiters hammer one order from separate threads and connections.
+
+    Every mutation first claims the order row with a conditional UPDATE, which
+    takes a row lock on PostgreSQL and the database write lock on SQLite, so
+    the writers queue instead of overwriting each other. A request that hits a
+    lock timeout fails as a whole and is retried like a handheld would; the
+    final state must account for exactly the requests that succeeded.
+    """
+
+    THREADS = 8
+    ADDS_PER_THREAD = 10
+
+    def setUp(self):
+        self.waiter = User.objects.create_user('stress-waiter', password='x', role='waiter')
+        table = Table.objects.create(number=1, chairs=8, status='available', top=0, left=0)
+        self.shared = MenuItem.objects.create(code='SHARED', name='Shared', item_type='food', price=7)
+        self.own = [
+            MenuItem.objects.create(code=f'OWN{i}', name=f'Own {i}', item_type='drink', price=3 + i)
+            for i in range(self.THREADS)
+        ]
+        self.order = Order.objects.create(table=table)
+        # the handler reports errors in the thread that hit them; keep each thread's own
+        self.raised = threading.local()
+        got_request_exception.connect(self._record_exception)
+        self.addCleanup(got_request_exception.disconnect, self._record_exception)
+
+    def _record_exception(self, sender, **kwargs):
+        self.raised.exception = sys.exc_info()[1]
+
+    def _post(self, client, path, data):
+        for attempt in range(50):
+            self.raised.exception = None
+            response = client.post(path, data, format='json')
+            if response.status_code != 500:
+                return response
+            exception = self.raised.exception
+            # only lock contention is retried; any other server error fails the test
+            if not (isinstance(exception, OperationalError) and 'locked' in str(exception)):
+                raise AssertionError(f'{path} failed with {exception!r}')
+            time.sleep(0.01 * (attempt + 1))
+        raise AssertionError(f'{path} never got through')
+
+    def _worker(self, n, successes, errors, start):
+        # the test client re-raises errors through a process-wide signal, which would
+        # hand one thread's lock timeout to every other thread; take the 500 instead
+        client = waiter_client(self.waiter, raise_request_exception=False)
+        path = f'/api/orders/{self.order.id}/add_item/'
+        try:
+            start.wait()
+            for i in range(self.ADDS_PER_THREAD):
+                # alternate between the line every thread shares and one of our own
+                item = self.shared if i % 2 == 0 else self.own[n]
+                response = self._post(client, path, {'menu_item': item.id, 'quantity': 2})
+                if response.status_code == 200:
+                    successes.append(item.id)
+                else:
+                    errors.append(response.status_code)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            connection.close()
+
+    def test_concurrent_add_item_loses_no_updates(self):
+        successes, errors = [], []
+        start = threading.Barrier(self.THREADS)
+        threads = [
+            threading.Thread(target=self._worker, args=(n, successes, errors, start))
+            for n in range(self.THREADS)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(successes), self.THREADS * self.ADDS_PER_THREAD)
+
+        lines = {oi.menu_item_id: oi for oi in OrderItem.objects.filter(order=self.order)}
+        # one line per menu item, however the inserts interleaved
+        self.assertEqual(len(lines), 1 + self.THREADS)
+        for item_id, oi in lines.items():
+            self.assertEqual(oi.quantity, 2 * successes.count(item_id))
+
+        order = Order.objects.get(pk=self.order.pk)
+        prices = {mi.id: mi.price for mi in [self.shared, *self.own]}
+        self.assertEqual(order.total, sum(prices[i] * oi.quantity for i, oi in lines.items()))
+        self.assertEqual(order.items_count, len(lines))
+        self.assertEqual(order.version, len(successes))
+
+
+class OrderVersionTests(TestCase):
+    def setUp(self):
+        # TestCase never commits, so the menu catalog would keep the last test's items
+        cache.clear()
+        waiter = User.objects.create_user('waiter', password='x', role='waiter')
+        self.client = waiter_client(waiter)
+        table = Table.objects.create(number=1, chairs=4, status='available', top=0, left=0)
+        self.item = MenuItem.objects.create(code='A', name='A', item_type='food', price=10)
+        self.order = Order.objects.create(table=table)
+
+    def test_stale_if_match_is_rejected(self):
+        path = f'/api/orders/{self.order.id}/add_item/'
+        etag = self.client.get(f'/api/orders/{self.order.id}/')['ETag']
+
+        first = self.client.post(path, {'menu_item': self.item.id}, format='json', headers={'If-Match': etag})
+        self.assertEqual(first.status_code, 200)
+        self.assertNotEqual(first['ETag'], etag)
+
+        stale = self.client.post(path, {'menu_item': self.item.id}, format='json', headers={'If-Match': etag})
+        self.assertEqual(stale.status_code, 412)
+
+        order = Order.objects.get(pk=self.order.pk)
+        self.assertEqual((order.total, order.version), (10, 1))
+
+    def test_add_item_merges_into_one_line(self):
+        path = f'/api/orders/{self.order.id}/add_item/'
+        for qty in (1, 2, 3):
+            self.client.post(path, {'menu_item': self.item.id, 'quantity': qty}, format='json')
+        line = OrderItem.objects.get(order=self.order)
+        self.assertEqual(line.quantity, 6)
+        self.assertEqual(Order.objects.get(pk=self.order.pk).total, 60)
+
+    def test_updates_claim_the_order(self):
+        path = f'/api/orders/{self.order.id}/'
+        other = Table.objects.create(number=2, chairs=4, status='available', top=0, left=0)
+        etag = self.client.get(path)['ETag']
+
+        response = self.client.patch(path, {'table': other.id, 'is_paid': True}, format='json',
+                                     headers={'If-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        order = Order.objects.get(pk=self.order.pk)
+        self.assertEqual((order.table_id, order.is_paid, order.version), (other.id, False, 1))
+
+        stale = self.client.patch(path, {'table': other.id}, format='json', headers={'If-Match': etag})
+        self.assertEqual(stale.status_code, 412)
+
+        Order.objects.filter(pk=self.order.pk).update(is_paid=True)
+        self.assertEqual(self.client.delete(path).status_code, 400)
+        self.assertTrue(Order.objects.filter(pk=self.order.pk).exists())
+
+    def test_batch_rejects_a_bare_list(self):
+        response = self.client.post(f'/api/orders/{self.order.id}/batch/',
+                                    [{'op': 'add_item', 'menu_item': self.item.id}], format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch_totals_follow_the_lines(self):
+        other = MenuItem.objects.create(code='B', name='B', item_type='drink', price=4)
+        self.client.post(f'/api/orders/{self.order.id}/add_item/', {'menu_item': self.item.id}, format='json')
+        line = OrderItem.objects.get(order=self.order)
+        response = self.client.post(f'/api/orders/{self.order.id}/batch/', {'operations': [
+            {'op': 'add_item', 'menu_item': self.item.id, 'quantity': 2},
+            {'op': 'add_item', 'menu_item': other.id, 'quantity': 3},
+            {'op': 'set_item_qty', 'order_item_id': line.id, 'quantity': 5},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        order = Order.objects.get(pk=self.order.pk)
+        self.assertEqual((order.total, order.items_count), (5 * 10 + 3 * 4, 2))
+        self.assertEqual(order.total, order.total_price())
+
+    def test_lines_keep_the_price_they_were_ordered_at(self):
+        path = f'/api/orders/{self.order.id}/add_item/'
+        self.client.post(path, {'menu_item': self.item.id}, format='json')
+        MenuItem.objects.filter(pk=self.item.id).update(price=99)
+        cache.clear()
+        self.client.post(path, {'menu_item': self.item.id, 'quantity': 2}, format='json')
+
+        order = Order.objects.get(pk=self.order.pk)
+        self.assertEqual(order.total, 30)
+        self.assertEqual(order.total_price(), 30)
+        out = io.StringIO()
+        call_command('check_order_totals', stdout=out)
+        self.assertIn('consistent', out.getvalue())
+
+
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        idempotency_store().clear()
+        waiter = User.objects.create_user('waiter', password='x', role='waiter')
+        self.client = waiter_client(waiter)
+        table = Table.objects.create(number=1, chairs=4, status='available', top=0, left=0)
+        self.item = MenuItem.objects.create(code='A', name='A', item_type='food', price=10)
+        self.order = Order.objects.create(table=table)
+        self.path = f'/api/orders/{self.order.id}/add_item/'
+
+    def add(self, key, quantity=1):
+        return self.client.post(self.path, {'menu_item': self.item.id, 'quantity': quantity}, format='json',
+                                headers={'Idempotency-Key': key})
+
+    def test_a_retry_replays_the_body_and_headers(self):
+        first = self.add('k1')
+        retry = self.add('k1')
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(retry['ETag'], first['ETag'])
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.get(pk=self.order.pk).total, 10)
+
+    def test_a_key_reused_for_a_different_body_is_refused(self):
+        self.add('k1')
+        response = self.add('k1', quantity=2)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Idempotency-Key', response.json())
+        self.assertEqual(Order.objects.get(pk=self.order.pk).total, 10)
+
+    def test_a_retry_while_the_first_attempt_runs_gets_a_conflict(self):
+        retries = []
+        original = Order.claim
+
+        def claim_and_retry(order, *args):
+            retries.append(self.add('k1'))
+            return original(order, *args)
+
+        with mock.patch.object(Order, 'claim', autospec=True, side_effect=claim_and_retry):
+            first = self.add('k1')
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual([r.status_code for r in retries], [409])
+        self.assertEqual(self.add('k1')['Idempotent-Replayed'], 'true')
+
+    def test_a_stored_response_expires_after_the_ttl(self):
+        with self.settings(IDEMPOTENCY_TTL=60):
+            self.add('k1')
+            later = time.time() + 61
+            with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+                retry = self.add('k1')
+        self.assertFalse(retry.has_header('Idempotent-Replayed'))
+        self.assertEqual(Order.objects.get(pk=self.order.pk).total, 20)
+
+
+class FloorStatusTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = waiter_client(User.objects.create_user('waiter', password='x', role='waiter'))
+        self.table = Table.objects.create(number=1, chairs=4, status='available', top=0, left=0)
+        self.item = MenuItem.objects.create(code='A', name='A', item_type='food', price=10)
+
+    def _status(self, etag=None):
+        headers = {'If-None-Match': etag} if etag else {}
+        return self.client.get('/api/tables/status/', headers=headers)
+
+    def test_unchanged_floor_is_not_modified(self):
+        first = self._status()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.json()[0]['active_order'], None)
+
+        again = self._status(first['ETag'])
+        self.assertEqual((again.status_code, again['ETag']), (304, first['ETag']))
+        self.assertEqual(self._status('"floor-0"').status_code, 200)
+
+    def test_table_and_order_writes_invalidate_the_snapshot(self):
+        etag = self._status()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.table.chairs = 6
+            self.table.save()
+        response = self._status(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['chairs'], 6)
+
+        etag = response['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            order = Order.objects.create(table=self.table)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/orders/{order.id}/add_item/', {'menu_item': self.item.id, 'quantity': 2},
+                             format='json')
+        response = self._status(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['active_order'],
+                         {'order_id': order.id, 'items_count': 1, 'total': 20})
+        self.assertEqual(response.json()[0]['status'], 'occupied')
+
+
+class EventHubTests(TestCase):
+    def test_publish_reaches_subscribers_until_they_leave(self):
+        hub = EventHub(queue_size=2)
+
+        async def scenario():
+            sub = hub.subscribe()
+            # publishers run in request threads, outside the stream's event loop
+            await sync_to_async(hub.publish, thread_sensitive=False)('table', {'id': 1})
+            first = await asyncio.wait_for(sub.queue.get(), 1)
+            for n in range(3):
+                hub.publish('table', {'id': n})
+            await asyncio.sleep(0)
+            kept = [sub.queue.get_nowait() for _ in range(sub.queue.qsize())]
+            hub.unsubscribe(sub)
+            return first, kept
+
+        first, kept = async_to_sync(scenario)()
+        self.assertEqual(first, 'event: table\ndata: {"id":1}\n\n')
+        # a slow subscriber keeps the newest events
+        self.assertEqual([m.split('data: ')[1].strip() for m in kept], ['{"id":1}', '{"id":2}'])
+        self.assertEqual(len(hub), 0)
+
+    def test_closed_streams_and_loops_are_dropped(self):
+        async def open_and_close():
+            stream = events.stream()
+            self.assertEqual(await stream.__anext__(), 'retry: 3000\n\n')
+            self.assertEqual(len(events.hub), 1)
+            await stream.aclose()
+
+        async_to_sync(open_and_close)()
+        self.assertEqual(len(events.hub), 0)
+
+        # a subscriber whose event loop went away is dropped on the next publish
+        hub = EventHub()
+
+        async def subscribe():
+            return hub.subscribe()
+
+        loop = asyncio.new_event_loop()
+        loop.run_until_complete(subscribe())
+        loop.close()
+        hub.publish('floor', {'status': 'available', 'count': 1})
+        self.assertEqual(len(hub), 0)
+
+    def test_stream_is_for_staff_only(self):
+        client = User.objects.create_user('guest', password='x', role='client')
+        waiter = User.objects.create_user('waiter', password='x', role='waiter')
+
+        def get(user=None):
+            query = {'token': str(RoleTokenObtainPairSerializer.get_token(user).access_token)} if user else {}
+            return async_to_sync(AsyncClient().get)('/api/events/', query)
+
+        self.assertEqual(get().status_code, 401)
+        self.assertEqual(get(client).status_code, 403)
+
+        async def first_chunk():
+            token = RoleTokenObtainPairSerializer.get_token(waiter).access_token
+            response = await AsyncClient().get('/api/events/', {'token': str(token)})
+            chunks = response.streaming_content
+            chunk = await chunks.__anext__()
+            await chunks.aclose()
+            return response, chunk
+
+        response, chunk = async_to_sync(first_chunk)()
+        self.assertEqual((response.status_code, response['Content-Type']), (200, 'text/event-stream'))
+        self.assertEqual(chunk, b'retry: 3000\n\n')
+
+
+class TableStateTests(TestCase):
+    def setUp(self):
+        self.client = waiter_client(User.objects.create_user('manager', password='x', role='manager'))
+        self.table = Table.objects.create(number=1, chairs=4, status='available', top=0, left=0)
+
+    def _status(self, table=None):
+        return Table.objects.values_list('status', flat=True).get(pk=(table or self.table).pk)
+
+    def test_allowed_and_rejected_transitions(self):
+        self.assertTrue(transition(self.table.pk, 'reserved'))
+        self.assertFalse(transition(self.table.pk, 'reserved'))
+        self.assertTrue(transition(self.table.pk, 'available'))
+        self.assertTrue(transition(self.table.pk, 'occupied'))
+        # nothing but a release leaves occupied
+        self.assertFalse(transition(self.table.pk, 'available'))
+        self.assertFalse(transition(self.table.pk, 'reserved'))
+        self.assertEqual(self._status(), 'occupied')
+
+        self.table.status = 'occupied'
+        with self.assertRaises(IllegalTransition):
+            transition_table(self.table, 'available')
+        with self.assertRaises(IllegalTransition):
+            transition(self.table.pk, 'closed')
+
+    def test_only_tables_without_unpaid_orders_are_released(self):
+        order = Order.objects.create(table=self.table)
+        self.assertEqual(self._status(), 'occupied')
+        self.assertFalse(release(self.table.pk))
+        self.assertEqual(self.client.post(f'/api/tables/{self.table.pk}/free/').status_code, 400)
+        self.assertEqual(self.client.post('/api/tables/close/').json()['freed'], 0)
+        self.assertEqual(self._status(), 'occupied')
+
+        self.assertEqual(self.client.post(f'/api/orders/{order.pk}/pay/').status_code, 200)
+        self.assertEqual(self._status(), 'available')
+
+        other = Table.objects.create(number=2, chairs=4, status='occupied', top=0, left=0)
+        self.assertEqual(self.client.post(f'/api/tables/{other.pk}/free/').status_code, 200)
+        self.assertEqual(self._status(other), 'available')
+
+
+class FastPayloadTests(TestCase):
+    """The values()-based payloads and the orjson renderer must reproduce the
+    serializers and the stock renderer byte for byte."""
+
+    def setUp(self):
+        cache.clear()
+        self.tables = [
+            Table.objects.create(number=1, chairs=4, status='occupied', top=12.5, left=0.1 + 0.2),
+            Table.objects.create(number=2, chairs=2, status='available', top=0, left=1234567.0),
+        ]
+        self.items = [
+            MenuItem.objects.create(code='SAL', name='Шопска салата', item_type='food', price=250),
+            MenuItem.objects.create(code='RAK', name='Ракија \u2028 "домашна"', item_type='drink', price=120),
+            MenuItem.objects.create(code='TAV', name='Тавче гравче', item_type='food', price=300),
+        ]
+        self.order = Order.objects.create(table=self.tables[0], total=790, items_count=3, version=4)
+        # lines inserted out of menu item order
+        for mi, qty in [(self.items[2], 1), (self.items[0], 2), (self.items[1], 1)]:
+            OrderItem.objects.create(order=self.order, menu_item=mi, quantity=qty)
+        self.empty = Order.objects.create(table=self.tables[1])
+
+    def assertSameBytes(self, stock_data, fast_data):
+        self.assertEqual(JSONRenderer().render(stock_data), ORJSONRenderer().render(fast_data))
+
+    def _serialized_orders(self):
+        lines = OrderItem.objects.order_by('pk').select_related('menu_item')
+        orders = Order.objects.order_by('pk').prefetch_related(Prefetch('orderitem_set', queryset=lines))
+        return OrderSerializer(orders, many=True).data
+
+    def test_orders(self):
+        rows = list(Order.objects.order_by('pk').values(*ORDER_FIELDS))
+        self.assertSameBytes(self._serialized_orders(), order_payloads(rows))
+
+    def test_tables(self):
+        qs = Table.objects.order_by('pk')
+        self.assertSameBytes(TableSerializer(qs, many=True).data, table_payloads(qs))
+
+    def test_menu_items(self):
+        qs = MenuItem.objects.order_by('pk')
+        self.assertSameBytes(MenuItemSerializer(qs, many=True).data, menu_catalog().rows)
+
+    def test_renderer_falls_back_where_orjson_differs(self):
+        data = {'at': timezone.now(), 'day': timezone.localdate(), 'big': 1e16, 'small': 1e-5, 7: None}
+        self.assertSameBytes(data, data)
+
+    def test_async_read_endpoints(self):
+        Zone.objects.create(type='glass', top=0.1 + 0.2)
+        waiter = User.objects.create_user('Шопска', password='x', role='waiter')
+        token = RoleTokenObtainPairSerializer.get_token(waiter).access_token
+        client = AsyncClient()
+
+        def get(path):
+            response = async_to_sync(client.get)(path, headers={'Authorization': f'Bearer {token}'})
+            self.assertEqual(response['Content-Type'], 'application/json')
+            return response.content
+
+        self.assertEqual(get('/api/menu-items/'), JSONRenderer().render(
+            MenuItemSerializer(MenuItem.objects.order_by('pk'), many=True).data
+        ))
+        self.assertEqual(get('/api/zones/'), JSONRenderer().render(ZoneSerializer(Zone.objects.all(), many=True).data))
+        self.assertEqual(get('/api/me/'), JSONRenderer().render(
+            {'id': waiter.id, 'username': 'Шопска', 'email': '', 'role': 'waiter'}
+        ))
+        self.assertEqual(get('/api/tables/status/'), JSONRenderer().render(build_floor_snapshot()))
+
+    def test_api_responses(self):
+        client = waiter_client(User.objects.create_user('waiter', password='x', role='waiter'))
+        response = client.get(f'/api/orders/{self.order.id}/')
+        self.assertEqual(response.content, JSONRenderer().render(self._serialized_orders()[0]))
+
+        response = client.post(f'/api/orders/{self.order.id}/add_item/',
+                               {'menu_item': self.items[1].id}, format='json')
+        self.assertEqual(response.content, JSONRenderer().render(self._serialized_orders()[0]))
+
+        response = client.get('/api/tables/')
+        self.assertEqual(response.content, JSONRenderer().render(
+            TableSerializer(Table.objects.all(), many=True).data
+        ))
+
+
+class AvailabilityTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.manager = User.objects.create_user('manager', password='x', role='manager')
+        self.client = waiter_client(self.manager)
+        self.guest = User.objects.create_user('guest', password='x', role='client')
+        self.table = Table.objects.create(number=1, chairs=4, status='available', top=0, left=0)
+
+    def test_impossible_dates_are_rejected(self):
+        response = self.client.get('/api/tables/available/',
+                                   {'start': '2025-02-30T19:00', 'end': '2025-03-01T21:00'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_only_approvals_bump_the_index(self):
+        version = current_version(INDEX_VERSION_KEY)
+        with self.captureOnCommitCallbacks(execute=True):
+            reservation = Reservation.objects.create(
+                user=self.guest, table=self.table, datetime=timezone.now(), description='', status='pending'
+            )
+        self.assertEqual(current_version(INDEX_VERSION_KEY), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/reservations/{reservation.id}/approve/')
+        self.assertNotEqual(current_version(INDEX_VERSION_KEY), version)
+
+
+class FloorIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.manager = User.objects.create_user('manager', password='x', role='manager')
+        self.client = waiter_client(self.manager)
+        self.terrace = Zone.objects.create(type='terrace', top=0, left=0, width=200, height=100)
+        self.glass = Zone.objects.create(type='glass', top=300, left=300, width=200, height=200)
+        self.near = Table.objects.create(number=1, chairs=4, status='available', top=10, left=10)
+        self.far = Table.objects.create(number=2, chairs=4, status='available', top=350, left=350)
+
+    def test_zone_filter_uses_the_zone_rectangles(self):
+        response = self.client.get('/api/tables/', {'zone': 'terrace'})
+        self.assertEqual([t['id'] for t in response.json()], [self.near.id])
+        response = self.client.get('/api/tables/', {'zone': str(self.glass.id)})
+        self.assertEqual([t['id'] for t in response.json()], [self.far.id])
+
+    def test_nearest_follows_a_moved_table(self):
+        response = self.client.get('/api/tables/nearest/', {'top': 340, 'left': 340})
+        self.assertEqual(response.json()['id'], self.far.id)
+        self.assertEqual(response.json()['zones'], [self.glass.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.near.top = self.near.left = 345
+            self.near.save()
+        response = self.client.get('/api/tables/nearest/', {'top': 340, 'left': 340})
+        self.assertEqual(response.json()['id'], self.near.id)
+        self.assertEqual(response.json()['distance'], round((2 * 5 ** 2) ** 0.5, 2))
+        self.assertEqual(self.client.get('/api/tables/', {'zone': 'terrace'}).json(), [])
+
+    def test_a_bump_from_another_process_during_a_move_forces_a_reload(self):
+        index = FloorIndex()
+        self.assertEqual(index.nearest(0, 0)[0], self.near.id)
+        # another process moves a table and bumps between our read and our bump
+        Table.objects.filter(pk=self.far.pk).update(top=0, left=0)
+        racing_bump = mock.patch('restaurant.floorplan.bump_version',
+                                 side_effect=lambda key: [bump_version(key) for _ in range(2)][-1])
+        with racing_bump:
+            index.move_table(self.near.id, 50, 50)
+        self.assertEqual(index.nearest(0, 0), (self.far.id, 0.0))
+
+
+class ReservationIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.guest = User.objects.create_user('guest', password='x', role='client')
+        self.table = Table.objects.create(number=1, chairs=4, status='available', top=0, left=0)
+        self.at = timezone.now().replace(microsecond=0) + timedelta(days=1)
+
+    def test_a_bump_from_another_process_during_apply_forces_a_reload(self):
+        index = ReservationIndex()
+        end = self.at + timedelta(hours=1)
+        self.assertEqual(index.free_tables([self.table.id], self.at, end), [self.table.id])
+        # another process approves a reservation between our read and our bump
+        Reservation.objects.bulk_create([Reservation(user=self.guest, table=self.table, datetime=self.at,
+                                                     description='', status='approved')])
+        racing_bump = mock.patch('restaurant.availability.bump_version',
+                                 side_effect=lambda key: [bump_version(key) for _ in range(2)][-1])
+        with racing_bump:
+            index.discard(0)
+        self.assertEqual(index.free_tables([self.table.id], self.at, end), [])
+
+
+class BulkReservationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = waiter_client(User.objects.create_user('manager', password='x', role='manager'))
+        self.guest = User.objects.create_user('guest', password='x', role='client')
+        self.at = timezone.now().replace(microsecond=0) + timedelta(days=1)
+        self.tables = [
+            Table.objects.create(number=n, chairs=4, status='available', top=0, left=0) for n in (1, 2, 3)
+        ]
+
+    def _reserve(self, table, status='pending'):
+        return Reservation.objects.create(user=self.guest, table=table, datetime=self.at,
+                                          description='', status=status)
+
+    def _statuses(self):
+        return list(Table.objects.order_by('number').values_list('status', flat=True))
+
+    def test_bulk_approve_reports_each_reservation(self):
+        first, clash, other = self._reserve(self.tables[0]), self._reserve(self.tables[0]), self._reserve(self.tables[1])
+        done = self._reserve(self.tables[2], 'approved')
+        response = self.client.post('/api/reservations/bulk_approve/',
+                                    {'ids': [first.id, clash.id, other.id, done.id, 0]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['result'] for r in response.json()['results']],
+                         ['approved', 'conflict', 'approved', 'unchanged', 'not_found'])
+        self.assertEqual(Reservation.objects.get(pk=clash.pk).status, 'pending')
+        self.assertEqual(self._statuses(), ['reserved', 'reserved', 'reserved'])
+
+    def test_bulk_reject_frees_only_tables_held_by_approvals(self):
+        held = self._reserve(self.tables[0], 'approved')
+        pending = self._reserve(self.tables[1])
+        Table.objects.filter(pk=self.tables[1].pk).update(status='occupied')
+        Order.objects.create(table=self.tables[1])
+        waiting = self._reserve(self.tables[2])
+        self._reserve(self.tables[2], 'approved')
+
+        response = self.client.post('/api/reservations/bulk_reject/',
+                                    {'ids': [held.id, pending.id, waiting.id, 0]}, format='json')
+        self.assertEqual([r['result'] for r in response.json()['results']],
+                         ['rejected', 'rejected', 'rejected', 'not_found'])
+        self.assertEqual(self._statuses(), ['available', 'occupied', 'reserved'])
+
+    def test_single_reject_frees_only_a_held_table(self):
+        pending = self._reserve(self.tables[0])
+        self._reserve(self.tables[0], 'approved')
+        self.client.post(f'/api/reservations/{pending.id}/reject/')
+        self.assertEqual(self._statuses()[0], 'reserved')
+
+        held = self._reserve(self.tables[1], 'approved')
+        self.client.post(f'/api/reservations/{held.id}/reject/')
+        self.assertEqual(self._statuses()[1], 'available')
+
+    def test_bulk_bodies_must_be_objects(self):
+        for path in ('/api/reservations/bulk_approve/', '/api/reservations/bulk_reject/'):
+            self.assertEqual(self.client.post(path, [1, 2], format='json').status_code, 400)
+            self.assertEqual(self.client.post(path, {'ids': ['x']}, format='json').status_code, 400)
+
+
+class OrderPaginationTests(TestCase):
+    def setUp(self):
+        self.client = waiter_client(User.objects.create_user('waiter', password='x', role='waiter'))
+        tables = Table.objects.bulk_create(
+            Table(number=n, chairs=4, status='occupied', top=0, left=0) for n in range(1, 8)
+        )
+        # every order ties on total and most on created_at
+        now = timezone.now()
+        self.ids = [Order.objects.create(table=t, total=50).id for t in tables]
+        Order.objects.update(created_at=now)
+
+    def _walk(self, params):
+        seen, url = [], '/api/orders/'
+        while url:
+            page = self.client.get(url, {**params, 'page_size': 2} if url == '/api/orders/' else None).json()
+            seen += [o['id'] for o in page['results']]
+            url = page['next']
+        return seen
+
+    def test_pages_over_ties_neither_skip_nor_repeat(self):
+        self.assertEqual(self._walk({}), sorted(self.ids, reverse=True))
+        self.assertEqual(self._walk({'ordering': 'total'}), sorted(self.ids))
+        self.assertEqual(self._walk({'ordering': '-total'}), sorted(self.ids, reverse=True))
+
+
+class BenchmarkTests(TestCase):
+    def test_suite_stays_within_query_budgets(self):
+        cache.clear()
+        volumes = {'tables': 6, 'zones': 1, 'menu_items': 12, 'reservations': 0, 'orders': 4}
+        results = run_suite(volumes, iterations=3)
+        self.assertEqual(len(results), len(QUERY_BUDGETS))
+        for r in results:
+            self.assertEqual(r['status_codes'], [200], r['endpoint'])
+            self.assertFalse(r['over_budget'], r)
+
+
+class RoleClaimAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.waiter = User.objects.create_user('waiter', password='x', role='waiter')
+        self.token = RoleTokenObtainPairSerializer.get_token(self.waiter).access_token
+
+    def _authenticate(self):
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        return RoleClaimsJWTAuthentication().authenticate(request)
+
+    def _save(self, **changes):
+        user = User.objects.get(pk=self.waiter.pk)
+        for name, value in changes.items():
+            setattr(user, name, value)
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+
+    def test_role_comes_from_the_token(self):
+        self.assertEqual(self.token['role'], 'waiter')
+        self._authenticate()
+        with self.assertNumQueries(0):
+            user, _ = self._authenticate()
+        self.assertIsInstance(user, RoleTokenUser)
+        self.assertEqual((user.id, user.role), (str(self.waiter.id), 'waiter'))
+
+    def test_role_change_revokes_earlier_tokens(self):
+        self._authenticate()
+        self._save(role='manager')
+        with self.assertRaises(AuthenticationFailed):
+            self._authenticate()
+        self.assertEqual(waiter_client(self.waiter).get('/api/orders/').status_code, 401)
+
+        # iat has one-second resolution; a token from the next second carries the new role
+        User.objects.filter(pk=self.waiter.pk).update(role_changed_at=timezone.now() - timedelta(seconds=2))
+        forget_user_state(self.waiter.pk)
+        fresh = waiter_client(User.objects.get(pk=self.waiter.pk))
+        self.assertEqual(fresh.get('/api/reports/revenue/').status_code, 200)
+
+    def test_deactivation_revokes_tokens(self):
+        self._authenticate()
+        self._save(is_active=False)
+        with self.assertRaises(AuthenticationFailed):
+            self._authenticate()
+
+    @override_settings(REPLICA_DATABASES=['replica1'])
+    def test_user_state_is_read_from_the_primary(self):
+        token = use_replica.set(True)
+        try:
+            self.assertEqual(User.objects.all().db, 'replica1')
+            self.assertEqual(_state_query(self.waiter.pk).db, 'default')
+        finally:
+            use_replica.reset(token)
+
+
+class MetricsAccessTests(TestCase):
+    def test_metrics_are_for_managers_and_allowed_addresses(self):
+        self.assertEqual(self.client.get('/api/metrics').status_code, 401)
+        waiter = waiter_client(User.objects.create_user('waiter', password='x', role='waiter'))
+        self.assertEqual(waiter.get('/api/metrics').status_code, 403)
+        manager = waiter_client(User.objects.create_user('manager', password='x', role='manager'))
+        self.assertEqual(manager.get('/api/metrics').status_code, 200)
+        with self.settings(METRICS_ALLOWED_IPS=['127.0.0.1']):
+            self.assertEqual(self.client.get('/api/metrics').status_code, 200)
+
+    def test_timings_are_for_managers_and_methods_are_bounded(self):
+        waiter = waiter_client(User.objects.create_user('waiter', password='x', role='waiter'))
+        manager = waiter_client(User.objects.create_user('manager', password='x', role='manager'))
+        self.assertNotIn('Server-Timing', waiter.get('/api/orders/'))
+        self.assertIn('Server-Timing', manager.get('/api/orders/'))
+
+        waiter.generic('BREW', '/api/orders/')
+        exposed = manager.get('/api/metrics').content.decode()
+        self.assertNotIn('BREW', exposed)
+        self.assertIn('method="other"', exposed)
+
+
+class AsyncMiddlewareTests(TestCase):
+    def test_middleware_runs_async_and_counts_async_queries(self):
+        async def get_response(request):
+            return None
+
+        for middleware in (RequestMetricsMiddleware, ReplicaRoutingMiddleware):
+            self.assertTrue(iscoroutinefunction(middleware(get_response)))
+
+        Zone.objects.create(type='glass')
+        with self.settings(DEBUG=True):
+            response = async_to_sync(AsyncClient().get)('/api/zones/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('desc="1 queries"', response['Server-Timing'])
+
+    @override_settings(REPLICA_DATABASES=['replica1'])
+    def test_async_read_endpoints_keep_their_replica_routing(self):
+        middleware = ReplicaRoutingMiddleware(lambda request: None)
+        factory = RequestFactory()
+        self.assertTrue(middleware._wants_replica(factory.get('/api/tables/status/')))
+        self.assertTrue(middleware._wants_replica(factory.get('/api/menu-items/')))
+        self.assertFalse(middleware._wants_replica(factory.post('/api/menu-items/')))
+        self.assertFalse(middleware._wants_replica(factory.get('/api/me/')))
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.table = Table.objects.create(number=1, chairs=4, status='available', top=0, left=0)
+        self.item = MenuItem.objects.create(code='A', name='A', item_type='food', price=10)
+        self.order = Order.objects.create(table=self.table, total=30, items_count=1,
+                                          is_paid=True, paid_at=timezone.now())
+        OrderItem.objects.create(order=self.order, menu_item=self.item, quantity=3)
+
+    def test_rollups_use_the_sold_price_and_outlive_deletes(self):
+        MenuItem.objects.filter(pk=self.item.pk).update(price=99)
+        record_paid_order(self.order)
+        self.assertEqual(DailyRevenue.objects.get().revenue, self.order.total)
+
+        self.order.delete()
+        self.item.delete()
+        self.table.delete()
+        self.assertEqual(DailyMenuItemSales.objects.get().revenue, 30)
+        self.assertEqual(DailyTableRevenue.objects.get().revenue, 30)
+
+    def _rollups(self):
+        return {
+            model.__name__: list(
+                model.objects.values(*keys).annotate(**{f'sum_{f}': Sum(f) for f in fields})
+                .order_by(*keys).values_list(*keys, *[f'sum_{f}' for f in fields])
+            )
+            for model, keys, fields, _ in Rollup.TABLES
+        }
+
+    def test_rebuild_matches_the_incremental_rollups_after_deletes(self):
+        record_paid_order(self.order)
+        other_item = MenuItem.objects.create(code='B', name='B', item_type='drink', price=5)
+        other_table = Table.objects.create(number=2, chairs=2, status='available', top=0, left=0)
+        for table, lines in [(self.table, [(other_item, 1)]), (other_table, [(self.item, 1), (other_item, 2)])]:
+            order = Order.objects.create(table=table, total=sum(mi.price * q for mi, q in lines),
+                                         items_count=len(lines), is_paid=True, paid_at=timezone.now())
+            for mi, quantity in lines:
+                OrderItem.objects.create(order=order, menu_item=mi, quantity=quantity)
+            record_paid_order(order)
+
+        other_item.delete()
+        other_table.delete()
+        incremental = self._rollups()
+        self.assertEqual(DailyRevenue.objects.get().revenue, 30 + 5 + 20)
+
+        day = timezone.localdate()
+        rebuild(day, day)
+        self.assertEqual(self._rollups(), incremental)
+        self.assertEqual(ArchivedOrder.objects.count(), 2)
+
+    def test_payment_folds_the_order_before_responding(self):
+        order = Order.objects.create(table=self.table, total=20, items_count=1)
+        OrderItem.objects.create(order=order, menu_item=self.item, quantity=2)
+        client = waiter_client(User.objects.create_user('waiter', password='x', role='waiter'))
+
+        response = client.post(f'/api/orders/{order.id}/pay/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(DailyRevenue.objects.get().revenue, 20)
+        self.assertFalse(Job.objects.exists())
+
+
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.cutoff = timezone.now() - timedelta(days=90)
+        self.guest = User.objects.create_user('guest', password='x', role='client')
+        self.table = Table.objects.create(number=4, chairs=4, status='available', top=0, left=0)
+        self.item = MenuItem.objects.create(code='A', name='Ајвар', item_type='food', price=10)
+
+    def _order(self, paid_at, is_paid=True):
+        order = Order.objects.create(table=self.table, total=20, items_count=1, is_paid=is_paid, paid_at=paid_at)
+        OrderItem.objects.create(order=order, menu_item=self.item, quantity=2)
+        Ticket.objects.create(order=order, station='kitchen', table_number=4)
+        return order
+
+    def _reservation(self, at):
+        return Reservation.objects.create(user=self.guest, table=self.table, datetime=at,
+                                          description='by the window', status='approved')
+
+    def test_only_records_before_the_cutoff_move(self):
+        old = self._order(self.cutoff - timedelta(seconds=1))
+        self._order(self.cutoff)
+        Order.objects.filter(pk=old.pk).update(created_at=self.cutoff - timedelta(days=1))
+        unpaid = Order.objects.create(table=self.table)
+        Order.objects.filter(pk=unpaid.pk).update(created_at=self.cutoff - timedelta(days=1))
+        past = self._reservation(self.cutoff - timedelta(seconds=1))
+        self._reservation(self.cutoff)
+
+        self.assertEqual(sum(archive_orders(self.cutoff)), 1)
+        self.assertEqual(sum(archive_reservations(self.cutoff)), 1)
+        self.assertEqual(list(ArchivedOrder.objects.values_list('id', flat=True)), [old.id])
+        self.assertEqual(list(ArchivedReservation.objects.values_list('id', flat=True)), [past.id])
+        self.assertEqual(Order.objects.count(), 2)
+        self.assertEqual(Reservation.objects.count(), 1)
+
+    def test_archived_rows_carry_what_was_deleted(self):
+        order = self._order(self.cutoff - timedelta(days=1))
+        reservation = self._reservation(self.cutoff - timedelta(days=1))
+        list(archive_orders(self.cutoff))
+        list(archive_reservations(self.cutoff))
+
+        archived = ArchivedOrder.objects.get()
+        self.assertEqual(
+            (archived.id, archived.table_id, archived.table_number, archived.paid_at, archived.total,
+             archived.items_count),
+            (order.id, self.table.id, 4, order.paid_at, 20, 1),
+        )
+        self.assertEqual(archived.lines, [{'menu_item_id': self.item.id, 'code': 'A', 'name': 'Ајвар',
+                                           'item_type': 'food', 'price': 10, 'quantity': 2}])
+        self.assertFalse(OrderItem.objects.exists())
+        self.assertFalse(Ticket.objects.exists())
+
+        row = ArchivedReservation.objects.get()
+        self.assertEqual(
+            (row.id, row.user_id, row.username, row.table_number, row.datetime, row.description, row.status),
+            (reservation.id, self.guest.id, 'guest', 4, reservation.datetime, 'by the window', 'approved'),
+        )
+
+    def test_command_dry_run_and_rerun(self):
+        for days in (100, 120, 140):
+            self._order(timezone.now() - timedelta(days=days))
+            self._reservation(timezone.now() - timedelta(days=days))
+
+        out = io.StringIO()
+        call_command('archive_records', dry_run=True, stdout=out)
+        self.assertIn('Would archive 3 orders', out.getvalue())
+        self.assertIn('Would archive 3 reservations', out.getvalue())
+        self.assertFalse(ArchivedOrder.objects.exists())
+        self.assertEqual(Order.objects.count(), 3)
+
+        call_command('archive_records', batch_size=2, stdout=io.StringIO())
+        self.assertEqual((ArchivedOrder.objects.count(), ArchivedReservation.objects.count()), (3, 3))
+        self.assertEqual((Order.objects.count(), Reservation.objects.count()), (0, 0))
+
+        out = io.StringIO()
+        call_command('archive_records', stdout=out)
+        self.assertIn('Archived 0 orders', out.getvalue())
+        self.assertEqual((ArchivedOrder.objects.count(), ArchivedReservation.objects.count()), (3, 3))
+
+
+class ImportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = waiter_client(User.objects.create_user('manager', password='x', role='manager'))
+        MenuItem.objects.create(code='A', name='A', item_type='food', price=10)
+
+    def test_report_counts_and_caps_errors(self):
+        rows = ['code,name,item_type,price', 'A,A,food,12', 'B,B,drink,5']
+        rows += [f'X{i},X,soup,1' for i in range(ImportReport.ERROR_SAMPLE + 5)]
+        response = self.client.generic('POST', '/api/import/menu/', '\n'.join(rows) + '\n',
+                                       content_type='text/csv')
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual((report['created'], report['updated'], report['unchanged']), (1, 1, 0))
+        self.assertEqual(report['updated_fields'], {'price': 1})
+        self.assertEqual(report['failed'], ImportReport.ERROR_SAMPLE + 5)
+        self.assertEqual(len(report['errors']), ImportReport.ERROR_SAMPLE)
+        self.assertTrue(report['errors_truncated'])
+        self.assertEqual(MenuItem.objects.get(code='A').price, 12)
+
+    def test_rows_the_database_rejects_are_reported(self):
+        rows = [(1, {'code': 'A', 'name': 'A', 'item_type': 'food', 'price': '10'}),
+                (2, {'code': 'B', 'name': 'B', 'item_type': 'drink', 'price': '5'})]
+        # as if another import inserted A between the lookup and the insert
+        with mock.patch.object(ImportSpec, 'existing', return_value={}):
+            report = import_rows('menu', iter(rows))
+        self.assertEqual((report.created, report.failed), (1, 1))
+        self.assertEqual(report.errors[0]['line'], 1)
+        self.assertTrue(MenuItem.objects.filter(code='B').exists())
+
+    def test_sizes_must_be_positive(self):
+        with self.assertRaises(CommandError):
+            call_command('import_data', 'zones', '-', format='ndjson', batch_size=0)
+        with self.assertRaises(CommandError):
+            call_command('export_data', 'orders', chunk_size=0)
+        with self.assertRaises(ValueError):
+            import_rows('zones', iter([]), batch_size=0)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.manager = User.objects.create_user('manager', password='x', role='manager')
+        table = Table.objects.create(number=1, chairs=4, status='available', top=0, left=0)
+        Reservation.objects.create(user=self.manager, table=table, datetime=timezone.now(),
+                                   description='', status='pending')
+
+    def test_impossible_dates_are_rejected(self):
+        client = waiter_client(self.manager)
+        self.assertEqual(client.get('/api/reservations/export/', {'end': '2025-02-30'}).status_code, 400)
+        self.assertEqual(client.get('/api/reports/revenue/', {'start': '2025-02-30'}).status_code, 400)
+
+    def test_asgi_export_streams_asynchronously(self):
+        token = RoleTokenObtainPairSerializer.get_token(self.manager).access_token
+        async def fetch():
+            response = await AsyncClient().get('/api/reservations/export/',
+                                               headers={'Authorization': f'Bearer {token}'})
+            return response, [piece async for piece in response.streaming_content]
+
+        response, pieces = async_to_sync(fetch)()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        self.assertEqual(len(b''.join(pieces).splitlines()), 1)
+
+
+class BulkUserTests(TestCase):
+    def test_bulk_provisioning_hashes_and_reports_per_row(self):
+        client = waiter_client(User.objects.create_user('manager', password='x', role='manager'))
+        rows = [
+            {'username': f'staff{i}', 'email': f'staff{i}@example.com', 'role': 'waiter',
+             'password1': 'Sturdy-pass-42', 'password2': 'Sturdy-pass-42'}
+            for i in range(3)
+        ]
+        rows.append({**rows[0], 'email': 'other@example.com'})
+        results = client.post('/api/users/bulk/', {'users': rows}, format='json').json()['results']
+        self.assertEqual([('user' in r) for r in results], [True, True, True, False])
+        self.assertIn('username', results[3]['errors'])
+        self.assertTrue(User.objects.get(username='staff2').check_password('Sturdy-pass-42'))
+
+    def test_fields_must_be_strings_and_roles_follow_register_user(self):
+        client = waiter_client(User.objects.create_user('manager', password='x', role='manager'))
+        row = {'username': 'staff', 'email': 'staff@example.com',
+               'password1': 'Sturdy-pass-42', 'password2': 'Sturdy-pass-42'}
+        response = client.post('/api/users/bulk/', {'users': [
+            {**row, 'username': 42}, {**row, 'email': None}, {**row, 'role': ''}, row,
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual(results[0]['errors'], {'username': ['This field must be a string']})
+        self.assertEqual(results[1]['errors'], {'email': ['This field must be a string']})
+        self.assertEqual(results[2]['errors'], {'role': ['Invalid role selected']})
+        self.assertEqual(results[3]['user']['role'], 'client')
+
+        register = self.client.post('/api/register/', {**row, 'username': 'other', 'email': 'o@example.com',
+                                                       'role': ''}, content_type='application/json')
+        self.assertEqual(register.json(), {'role': ['Invalid role selected']})
+        self.assertEqual(self.client.post('/api/register/', [row], content_type='application/json').status_code, 400)
+
+
+class TicketTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = waiter_client(User.objects.create_user('waiter', password='x', role='waiter'))
+        self.table = Table.objects.create(number=7, chairs=4, status='available', top=0, left=0)
+        self.food = MenuItem.objects.create(code='F', name='Burek', item_type='food', price=10)
+        self.drink = MenuItem.objects.create(code='D', name='Boza', item_type='drink', price=4)
+
+    def _tickets(self, station):
+        return self.client.get(f'/api/stations/{station}/tickets/').json()['tickets']
+
+    def test_lines_are_routed_by_item_type(self):
+        self.client.post('/api/orders/', {'table': self.table.id, 'items': [
+            {'menu_item': self.food.id, 'quantity': 2}, {'menu_item': self.drink.id, 'quantity': 1},
+        ]}, format='json')
+        kitchen, bar = self._tickets('kitchen'), self._tickets('bar')
+        self.assertEqual([t['lines'] for t in kitchen], [[{'menu_item': self.food.id, 'name': 'Burek', 'quantity': 2}]])
+        self.assertEqual([t['lines'] for t in bar], [[{'menu_item': self.drink.id, 'name': 'Boza', 'quantity': 1}]])
+        self.assertEqual(kitchen[0]['table_number'], 7)
+
+    def test_batches_send_only_what_they_add(self):
+        order = Order.objects.create(table=self.table)
+        self.client.post(f'/api/orders/{order.id}/add_item/', {'menu_item': self.food.id}, format='json')
+        line = OrderItem.objects.get(order=order)
+        self.client.post(f'/api/orders/{order.id}/batch/', {'operations': [
+            {'op': 'set_item_qty', 'order_item_id': line.id, 'quantity': 4},
+            {'op': 'add_item', 'menu_item': self.drink.id, 'quantity': 2},
+        ]}, format='json')
+        self.assertEqual([t['lines'][0]['quantity'] for t in self._tickets('kitchen')], [1, 3])
+        self.assertEqual([t['lines'][0]['quantity'] for t in self._tickets('bar')], [2])
+
+        # lowering a quantity sends nothing
+        self.client.post(f'/api/orders/{order.id}/set_item_qty/',
+                         {'order_item_id': line.id, 'quantity': 1}, format='json')
+        self.assertEqual(len(self._tickets('kitchen')), 2)
+
+    def test_ack_and_bump(self):
+        order = Order.objects.create(table=self.table)
+        first, second = (Ticket.objects.create(order=order, station='kitchen', table_number=7) for _ in range(2))
+        path = '/api/stations/kitchen/tickets/{}/'
+        self.assertEqual(self.client.post(path.format('ack'), {'ids': [first.id]}, format='json').json(),
+                         {'updated': 1})
+        self.assertEqual(self.client.post(path.format('ack'), {'ids': [first.id]}, format='json').json(),
+                         {'updated': 0})
+        self.client.post(path.format('bump'), {'ids': [first.id]}, format='json')
+        self.assertEqual([(t['id'], t['status']) for t in self._tickets('kitchen')], [(second.id, 'new')])
+        self.assertEqual(self.client.post(path.format('bump'), [first.id], format='json').status_code, 400)
+
+    def test_batch_remove_and_re_add_sends_the_new_line(self):
+        order = Order.objects.create(table=self.table)
+        self.client.post(f'/api/orders/{order.id}/add_item/', {'menu_item': self.food.id, 'quantity': 2}, format='json')
+        line = OrderItem.objects.get(order=order)
+        self.client.post(f'/api/orders/{order.id}/batch/', {'operations': [
+            {'op': 'remove_item', 'order_item_id': line.id},
+            {'op': 'add_item', 'menu_item': self.food.id, 'quantity': 2},
+        ]}, format='json')
+        self.assertEqual([t['lines'][0]['quantity'] for t in self._tickets('kitchen')], [2, 2])
+
+    def test_wait_must_be_finite(self):
+        for wait in ('nan', 'inf', '-inf', 'soon'):
+            response = self.client.get('/api/stations/kitchen/tickets/', {'wait': wait})
+            self.assertEqual(response.status_code, 400, wait)
+
+    def test_long_poll_queries_only_when_the_version_moves(self):
+        order = Order.objects.create(table=self.table)
+        ticks = []
+
+        async def tick(delay):
+            ticks.append(delay)
+            if len(ticks) == 1:
+                # committed, but its bump hasn't landed yet
+                await Ticket.objects.acreate(order=order, station='kitchen', table_number=7)
+            elif len(ticks) == 3:
+                bump_station('kitchen')
+
+        with mock.patch('restaurant.tickets.asyncio.sleep', tick), \
+                mock.patch('restaurant.tickets.open_tickets', wraps=open_tickets) as queries:
+            rows = async_to_sync(await_tickets)('kitchen', 0, 2)
+        self.assertEqual([r['station'] for r in rows], ['kitchen'])
+        self.assertEqual((len(ticks), queries.call_count), (3, 2))
+
+
+@background(max_attempts=2)
+def make_zone(kind, fail=False):
+    Zone.objects.create(type=kind)
+    if fail:
+        raise RuntimeError("boom")
+
+
+class JobQueueTests(TestCase):
+    def test_claims_only_due_jobs_once(self):
+        later = make_zone.delay('glass')
+        Job.objects.filter(pk=later.pk).update(run_at=timezone.now() + timedelta(minutes=5))
+        due = make_zone.delay('terrace')
+
+        job = claim_next('w/0')
+        self.assertEqual((job.pk, job.status, job.attempts, job.locked_by), (due.pk, 'running', 1, 'w/0'))
+        self.assertIsNone(claim_next('w/1'))
+
+        self.assertTrue(run_job(job))
+        self.assertEqual(Job.objects.get(pk=due.pk).status, 'done')
+        self.assertEqual(list(Zone.objects.values_list('type', flat=True)), ['terrace'])
+
+    def test_failures_back_off_then_fail(self):
+        queued = make_zone.delay('green', fail=True)
+
+        before = timezone.now()
+        self.assertFalse(run_job(claim_next('w/0')))
+        job = Job.objects.get(pk=queued.pk)
+        self.assertEqual((job.status, job.locked_by), ('queued', ''))
+        self.assertGreaterEqual(job.run_at, before + backoff(1))
+        self.assertIn('boom', job.last_error)
+        # the failed attempt's writes rolled back with it
+        self.assertFalse(Zone.objects.exists())
+
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        self.assertFalse(run_job(claim_next('w/0')))
+        job = Job.objects.get(pk=queued.pk)
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+        self.assertIsNone(claim_next('w/0'))
+
+    def test_only_jobs_without_heartbeat_are_requeued(self):
+        make_zone.delay('glass')
+        make_zone.delay('terrace')
+        alive, dead = claim_next('a/0'), claim_next('b/0')
+        Job.objects.update(locked_at=timezone.now() - timedelta(seconds=JOB_LOCK_TIMEOUT + 1))
+
+        self.assertEqual(heartbeat([alive]), 1)
+        self.assertEqual(requeue_stale(), 1)
+        self.assertEqual(Job.objects.get(pk=alive.pk).status, 'running')
+        self.assertEqual(Job.objects.get(pk=dead.pk).status, 'queued')
+
+    def test_a_run_that_lost_its_lock_rolls_back(self):
+        make_zone.delay('glass')
+        first = claim_next('a/0')
+        Job.objects.update(locked_at=timezone.now() - timedelta(seconds=JOB_LOCK_TIMEOUT + 1))
+        requeue_stale()
+        second = claim_next('b/0')
+
+        self.assertFalse(run_job(first))
+        self.assertFalse(Zone.objects.exists())
+        self.assertEqual(Job.objects.get(pk=first.pk).locked_by, 'b/0')
+        self.assertTrue(run_job(second))
+        self.assertEqual(Zone.objects.count(), 1)
+
+
+class ReservationNotificationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = waiter_client(User.objects.create_user('manager', password='x', role='manager'))
+        self.guest = User.objects.create_user('guest', email='guest@example.com', password='x', role='client')
+        self.at = timezone.now().replace(microsecond=0) + timedelta(days=1)
+        self.table = Table.objects.create(number=4, chairs=4, status='available', top=0, left=0)
+
+    def _reserve(self, status='pending'):
+        return Reservation.objects.create(user=self.guest, table=self.table, datetime=self.at,
+                                          description='', status=status)
+
+    def _run_jobs(self):
+        while (job := claim_next('w/0')) is not None:
+            run_job(job)
+
+    def test_a_decision_queues_one_email_that_commits_with_it(self):
+        reservation = self._reserve()
+        self.client.post(f'/api/reservations/{reservation.id}/approve/')
+        self.client.post(f'/api/reservations/{reservation.id}/approve/')
+        self.assertEqual(Job.objects.count(), 1)
+        self.assertEqual(mail.outbox, [])
+
+        self._run_jobs()
+        self.assertEqual([(m.subject, m.to) for m in mail.outbox],
+                         [(SUBJECTS['approved'], ['guest@example.com'])])
+        self.assertIn('table 4', mail.outbox[0].body)
+
+    def test_refused_approvals_queue_nothing(self):
+        self._reserve('approved')
+        clash = self._reserve()
+        response = self.client.post(f'/api/reservations/{clash.id}/approve/')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Job.objects.exists())
+
+    def test_bulk_decisions_notify_only_the_reservations_they_changed(self):
+        pending, rejected = self._reserve(), self._reserve('rejected')
+        self.client.post('/api/reservations/bulk_reject/', {'ids': [pending.id, rejected.id]}, format='json')
+        self.assertEqual([(j.args, j.kwargs) for j in Job.objects.all()], [([[pending.id], 'rejected'], {})])
+
+    def test_a_failed_send_is_retried(self):
+        reservation = self._reserve()
+        self.client.post(f'/api/reservations/{reservation.id}/reject/')
+        with mock.patch('restaurant.notifications.send_mass_mail', side_effect=ConnectionRefusedError):
+            self.assertFalse(run_job(claim_next('w/0')))
+        self.assertEqual(Job.objects.get().status, 'queued')
+
+        Job.objects.update(run_at=timezone.now())
+        self._run_jobs()
+        self.assertEqual(Job.objects.get().status, 'done')
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_a_reservation_decided_again_is_not_mailed_the_old_decision(self):
+        reservation = self._reserve()
+        self.client.post(f'/api/reservations/{reservation.id}/approve/')
+        self.client.post(f'/api/reservations/{reservation.id}/reject/')
+        self._run_jobs()
+        self.assertEqual([m.subject for m in mail.outbox], [SUBJECTS['rejected']])
@@ -0,0 +1,97 @@
+"""
+Kitchen and bar ticket queue.
+
+Order mutations hand the quantities they added to ``enqueue_tickets``, which
+writes one ticket per station inside the caller's transaction. Each station
+has a cache version that is bumped once the tickets commit; a long-polling
+screen checks that version each tick and only queries the database when it
+moves. Screens served by other processes see the bump through the shared
+cache (see CACHES in settings).
+"""
+
+import asyncio
+
+from django.db import router, transaction
+from django.utils import timezone
+
+from .models import Ticket
+from .versions import acurrent_version, bump_version
+
+# MenuItem.item_type -> the station that prepares it
+STATIONS = {'food': 'kitchen', 'drink': 'bar'}
+TICKETS_VERSION_KEY = 'restaurant:tickets:{}:version'
+TICKET_FIELDS = ['id', 'order_id', 'station', 'table_number', 'lines', 'status', 'created_at', 'acked_at']
+TICKET_POLL_INTERVAL = 0.25
+TICKET_WAIT_MAX = 30
+
+
+def bump_station(station):
+    bump_version(TICKETS_VERSION_KEY.format(station))
+
+
+def enqueue_tickets(order_id, table_number, added):
+    """Queue ``(menu_item, quantity)`` pairs for their stations; returns the new tickets.
+
+    Must run inside the transaction that added the items, so a rolled back
+    mutation never reaches a screen.
+    """
+    by_station = {}
+    for mi, qty in added:
+        if qty < 1:
+            continue
+        lines = by_station.setdefault(STATIONS[mi.item_type], {})
+        line = lines.setdefault(mi.id, {'menu_item': mi.id, 'name': mi.name, 'quantity': 0})
+        line['quantity'] += qty
+    if not by_station:
+        return []
+    tickets = Ticket.objects.bulk_create(
+        Ticket(order_id=order_id, station=station, table_number=table_number, lines=list(lines.values()))
+        for station, lines in by_station.items()
+    )
+    stations = list(by_station)
+    transaction.on_commit(lambda: [bump_station(s) for s in stations])
+    return tickets
+
+
+def open_tickets(station, after=0):
+    # served by the partial (station, id) index on open tickets
+    return (
+        Ticket.objects.using(router.db_for_write(Ticket))
+        .filter(station=station, id__gt=after)
+        .exclude(status='bumped')
+        .order_by('id')
+        .values(*TICKET_FIELDS)
+    )
+
+
+async def await_tickets(station, after=0, wait=0):
+    """Open tickets past ``after``, waiting up to ``wait`` seconds for some to arrive."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + min(max(wait, 0), TICKET_WAIT_MAX)
+    key = TICKETS_VERSION_KEY.format(station)
+    seen = None
+    while True:
+        # read the version before the rows, so tickets committed mid-query bump it again
+        version = await acurrent_version(key)
+        if version != seen:
+            seen = version
+            rows = [r async for r in open_tickets(station, after)]
+            if rows:
+                return rows
+        if loop.time() >= deadline:
+            return []
+        await asyncio.sleep(TICKET_POLL_INTERVAL)
+
+
+def ack_tickets(station, ids):
+    """Mark new tickets as seen by the station; returns how many changed."""
+    return Ticket.objects.filter(station=station, pk__in=ids, status='new').update(
+        status='acked', acked_at=timezone.now()
+    )
+
+
+def bump_tickets(station, ids):
+    """Take tickets off the station's screen; returns how many changed."""
+    return Ticket.objects.filter(station=station, pk__in=ids).exclude(status='bumped').update(
+        status='bumped', bumped_at=timezone.now()
+    )
@@ -0,0 +1,31 @@
+import time
+
+from django.core.cache import cache
+
+
+def current_version(key) -> int:
+    version = cache.get(key)
+    if version is None:
+        # seed from the clock so a cleared cache never reuses an old version
+        version = time.time_ns()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(key) -> int:
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(key, version, timeout=None)
+        return version
+
+
+async def acurrent_version(key) -> int:
+    version = await cache.aget(key)
+    if version is None:
+        version = time.time_ns()
+        if not await cache.aadd(key, version, timeout=None):
+            version = await cache.aget(key, version)
+    return version
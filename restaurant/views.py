@@ -1,31 +1,137 @@
+import re
+from datetime import timedelta
+
 from django.contrib.auth import get_user_model
-from django.contrib.auth.password_validation import validate_password
-from django.db import transaction, IntegrityError
-from django.db.models import Prefetch
+from django.db import router, transaction, IntegrityError
+from django.db.models import F, Prefetch, Sum
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime, parse_date
 from rest_framework import viewsets, status
 from rest_framework.decorators import action, api_view, permission_classes
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import APIException, ValidationError, NotFound, UnsupportedMediaType
+from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .models import Reservation, Table, MenuItem, OrderItem, Order, Zone
+from .models import (
+    Reservation, Table, MenuItem, OrderItem, Order, Zone,
+    DailyRevenue, DailyMenuItemSales, DailyTableRevenue, DailyItemTypeSales,
+    ArchivedOrder, ArchivedReservation
+)
 from .permissions import IsManager, IsClient, IsManagerOrWaiter, MenuitemPermission
 from .serializers import (
     ReservationSerializer, TableSerializer, MenuItemSerializer,
-    OrderSerializer, OrderCreateSerializer, ZoneSerializer
+    OrderSerializer, OrderCreateSerializer, ZoneSerializer,
+    ArchivedOrderSerializer, ArchivedReservationSerializer
 )
-def _fresh_order(order_id: int) -> Order:
-    return (
-        Order.objects
-        .select_related('table')
-        .prefetch_related(Prefetch('orderitem_set', queryset=OrderItem.objects.select_related('menu_item')))
-        .get(pk=order_id)
+from .snapshot import floor_snapshot, floor_etag
+from .availability import index as reservation_index
+from .floorplan import index as floor_index
+from .signals import order_lines_changed, reservations_changed
+from .catalog import menu_catalog
+from .pagination import ReservationPagination, OrderPagination, TiebreakOrderingFilter
+from .table_states import IllegalTransition, transition_table, release, release_many
+from .authentication import RoleTokenUser
+from .rollups import record_paid_order
+from .exports import EXPORTS, encode, aiterate
+from .idempotency import IdempotentViewMixin
+from .notifications import queue_decisions
+from .imports import SPECS as IMPORT_SPECS, read_rows, import_rows
+from .provisioning import clean_registration, taken, add_conflict_errors, user_payload, provision_users
+from .tickets import STATIONS, enqueue_tickets, ack_tickets, bump_tickets
+from .payloads import TABLE_FIELDS, ORDER_FIELDS, table_payloads, order_payloads
+from .renderers import ORJSONRenderer
+
+BULK_USERS_LIMIT = 500
+ORDER_MUTATIONS = {'add_item', 'set_item_qty', 'remove_item', 'batch'}
+FAST_RENDERERS = [ORJSONRenderer, BrowsableAPIRenderer]
+def etag_matches(request, etag: str) -> bool:
+    if_none_match = request.headers.get('If-None-Match', '')
+    return etag in [t.strip() for t in if_none_match.split(',')]
+
+def _iso_date(value):
+    try:
+        day = parse_date(value)
+    except ValueError:
+        # well formed but impossible, e.g. 2025-02-30
+        day = None
+    if day is None:
+        raise ValidationError("start and end must be ISO dates (YYYY-MM-DD).")
+    return day
+
+def date_range(request, default_days=30):
+    """Inclusive ``?start=&end=`` ISO dates, defaulting to the last ``default_days`` days."""
+    params = request.query_params
+    end = _iso_date(params['end']) if 'end' in params else timezone.localdate()
+    start = _iso_date(params['start']) if 'start' in params else end - timedelta(days=default_days - 1)
+    if start > end:
+        raise ValidationError("start must not be after end.")
+    return start, end
+
+def export_response(request, kind, model):
+    """Streams an ``exports`` kind for the requested date range as ``?fmt=ndjson`` (default) or ``csv``."""
+    fmt = request.query_params.get('fmt', 'ndjson')
+    if fmt not in ['ndjson', 'csv']:
+        raise ValidationError("fmt must be ndjson or csv.")
+    start, end = date_range(request)
+    rows, columns = EXPORTS[kind]
+    # the body is generated after the routing middleware has returned, so pick the database now
+    using = router.db_for_read(model)
+    pieces = encode(rows(start, end, using=using), columns, fmt)
+    if getattr(request, 'scope', None) is not None:
+        # served over ASGI: a sync iterator would be read into a list before sending
+        pieces = aiterate(pieces)
+    response = StreamingHttpResponse(
+        pieces,
+        content_type='text/csv' if fmt == 'csv' else 'application/x-ndjson',
     )
-class ReservationViewSet(viewsets.ModelViewSet):
+    response['Content-Disposition'] = f'attachment; filename="{kind}-{start}-{end}.{fmt}"'
+    return response
+
+class FieldSelectionViewMixin:
+    """Reads ``?fields=`` and ``?expand=`` for list/retrieve and passes them to the serializer."""
+
+    def _query_set(self, name):
+        if self.action not in ['list', 'retrieve']:
+            return None
+        raw = self.request.query_params.get(name)
+        if raw is None:
+            return None
+        return {f.strip() for f in raw.split(',') if f.strip()}
+
+    def requested_fields(self):
+        return self._query_set('fields')
+
+    def requested_expand(self):
+        expand = self._query_set('expand')
+        # asking for specific fields means nested objects are opt-in as well
+        if expand is None and self.requested_fields() is not None:
+            return set()
+        return expand
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.requested_fields()
+        context['expand'] = self.requested_expand()
+        return context
+
+class PreconditionFailed(APIException):
+    status_code = status.HTTP_412_PRECONDITION_FAILED
+    default_detail = "The order has changed since you last loaded it."
+    default_code = 'precondition_failed'
+
+def order_etag(order_id: int, version: int) -> str:
+    return f'"order-{order_id}-v{version}"'
+
+class ReservationViewSet(FieldSelectionViewMixin, viewsets.ModelViewSet):
     queryset = Reservation.objects.all()
     serializer_class = ReservationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ReservationPagination
+    replica_actions = {'list', 'export'}
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsManager])
     def approve(self, request, pk=None):
         reservation = self.get_object()
@@ -40,17 +146,109 @@ class ReservationViewSet(viewsets.ModelViewSet):
             return Response({"detail": "There is already an approved reservation for that table and time."},
                             status=status.HTTP_400_BAD_REQUEST)
 
-        reservation.status = 'approved'
-        reservation.save()
+        try:
+            with transaction.atomic():
+                decided = reservation.status != 'approved'
+                reservation.status = 'approved'
+                reservation.save()
+                if decided:
+                    queue_decisions([reservation.pk], 'approved')
+        except IntegrityError:
+            return Response({"detail": "There is already an approved reservation for that table and time."},
+                            status=status.HTTP_400_BAD_REQUEST)
         return Response({"detail": "Reservation is approved."}, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsManager])
     def reject(self, request, pk=None):
         reservation = self.get_object()
-        reservation.status = 'rejected'
-        reservation.save()
+        decided = reservation.status != 'rejected'
+        with transaction.atomic():
+            reservation.status = 'rejected'
+            reservation.save()
+            if decided:
+                queue_decisions([reservation.pk], 'rejected')
         return Response({"detail": "Reservation is rejected."}, status=status.HTTP_200_OK)
 
+    def _bulk_ids(self, request):
+        ids = request.data.get('ids') if isinstance(request.data, dict) else None
+        if not isinstance(ids, list) or not ids:
+            raise ValidationError("A non-empty list of reservation ids is required.")
+        try:
+            return list(dict.fromkeys(int(i) for i in ids))
+        except (TypeError, ValueError):
+            raise ValidationError("Reservation ids must be numbers.")
+
+    def _approve_batch(self, ids):
+        results = {}
+        with transaction.atomic():
+            rows = {
+                r['id']: r for r in
+                Reservation.objects.select_for_update().filter(pk__in=ids).values('id', 'table_id', 'datetime', 'status')
+            }
+            wanted = [rows[i] for i in ids if i in rows and rows[i]['status'] != 'approved']
+            taken = set(
+                Reservation.objects.filter(
+                    status='approved',
+                    table_id__in={r['table_id'] for r in wanted},
+                    datetime__in={r['datetime'] for r in wanted},
+                ).values_list('table_id', 'datetime')
+            )
+
+            approve = []
+            for i in ids:
+                r = rows.get(i)
+                if r is None:
+                    results[i] = {"id": i, "result": "not_found"}
+                elif r['status'] == 'approved':
+                    results[i] = {"id": i, "result": "unchanged"}
+                elif (r['table_id'], r['datetime']) in taken:
+                    results[i] = {"id": i, "result": "conflict",
+                                  "detail": "There is already an approved reservation for that table and time."}
+                else:
+                    taken.add((r['table_id'], r['datetime']))
+                    approve.append(r)
+                    results[i] = {"id": i, "result": "approved"}
+
+            if approve:
+                Reservation.objects.filter(pk__in=[r['id'] for r in approve]).update(status='approved')
+                reservations_changed((r['id'], r['table_id'], r['datetime'], 'approved') for r in approve)
+                queue_decisions([r['id'] for r in approve], 'approved')
+        return [results[i] for i in ids]
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsManager])
+    def bulk_approve(self, request):
+        ids = self._bulk_ids(request)
+        try:
+            results = self._approve_batch(ids)
+        except IntegrityError:
+            # another manager approved a clashing reservation in between; the
+            # second pass sees it and reports the conflict instead
+            results = self._approve_batch(ids)
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsManager])
+    def export(self, request):
+        return export_response(request, 'reservations', Reservation)
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsManager])
+    def bulk_reject(self, request):
+        ids = self._bulk_ids(request)
+        with transaction.atomic():
+            rows = {
+                r['id']: r for r in
+                Reservation.objects.select_for_update().filter(pk__in=ids)
+                .values('id', 'table_id', 'datetime', 'status')
+            }
+            if rows:
+                Reservation.objects.filter(pk__in=rows).update(status='rejected')
+                reservations_changed(
+                    ((r['id'], r['table_id'], r['datetime'], 'rejected') for r in rows.values()),
+                    was_approved={r['id'] for r in rows.values() if r['status'] == 'approved'},
+                )
+                queue_decisions([r['id'] for r in rows.values() if r['status'] != 'rejected'], 'rejected')
+        results = [{"id": i, "result": "rejected" if i in rows else "not_found"} for i in ids]
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
     def perform_create(self, serializer):
         user = self.request.user
         table = serializer.validated_data['table']
@@ -59,14 +257,14 @@ class ReservationViewSet(viewsets.ModelViewSet):
         if Reservation.objects.filter(table=table, datetime=dt, status='approved').exists():
             raise ValidationError("The date is already booked.")
 
-        serializer.save(user=user, status='pending')
+        serializer.save(user_id=user.id, status='pending')
 
     def get_queryset(self):
         qs = super().get_queryset()
         user = self.request.user
 
         if user.role == 'client':
-            qs = qs.filter(user=user)
+            qs = qs.filter(user_id=user.id)
         elif user.role in ['manager', 'waiter']:
             pass
         else:
@@ -76,6 +274,10 @@ class ReservationViewSet(viewsets.ModelViewSet):
         if status_param:
             qs = qs.filter(status=status_param)
 
+        fields = self.requested_fields()
+        if self.action in ['list', 'retrieve'] and (fields is None or 'user_username' in fields):
+            qs = qs.select_related('user')
+
         return qs
 
     def get_permissions(self):
@@ -87,6 +289,8 @@ class MeView(APIView):
     permission_classes = [IsAuthenticated]
     def get(self, request):
         u = request.user
+        if isinstance(u, RoleTokenUser):
+            u = u.get_user()
         return Response({
             "id": u.id,
             "username": u.username,
@@ -98,59 +302,146 @@ class MenuItemViewSet(viewsets.ModelViewSet):
     queryset = MenuItem.objects.all()
     serializer_class = MenuItemSerializer
     permission_classes = [IsAuthenticated,MenuitemPermission]
+    renderer_classes = FAST_RENDERERS
+    replica_actions = {'list', 'retrieve', 'by_code'}
+
+    def list(self, request, *args, **kwargs):
+        catalog = menu_catalog()
+        if etag_matches(request, catalog.etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': catalog.etag})
+        return Response(catalog.rows, headers={'ETag': catalog.etag})
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            row = menu_catalog().rows_by_id.get(int(kwargs['pk']))
+        except ValueError:
+            row = None
+        if row is None:
+            raise NotFound()
+        return Response(row)
+
+    @action(detail=False, methods=['get'], url_path=r'code/(?P<code>[^/]+)')
+    def by_code(self, request, code=None):
+        catalog = menu_catalog()
+        item = catalog.by_code.get(code)
+        if item is None:
+            raise NotFound()
+        return Response(catalog.rows_by_id[item.id])
 
 
 class TableViewSet(viewsets.ModelViewSet):
     queryset = Table.objects.all()
     serializer_class = TableSerializer
+    renderer_classes = FAST_RENDERERS
+    replica_actions = {'list', 'retrieve', 'status', 'available', 'nearest'}
+
+    def get_queryset(self):
+        qs = super().get_queryset()
+        params = self.request.query_params
+        zone = params.get('zone')
+        if zone:
+            qs = qs.filter(pk__in=floor_index.tables_in(floor_index.zone_ids(zone)))
+        status_param = params.get('status')
+        if status_param:
+            qs = qs.filter(status=status_param)
+        return qs
+
+    def list(self, request, *args, **kwargs):
+        return Response(table_payloads(self.filter_queryset(self.get_queryset())))
+
+    def retrieve(self, request, *args, **kwargs):
+        qs = self.filter_queryset(self.get_queryset()).values(*TABLE_FIELDS)
+        return Response(get_object_or_404(qs, pk=kwargs['pk']))
 
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsManagerOrWaiter])
     def status(self, request):
+        version, data = floor_snapshot()
+        etag = floor_etag(version)
+        if etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+        return Response(data, headers={'ETag': etag})
 
-        tables = Table.objects.all()
-        orders = (
-            Order.objects.filter(is_paid=False)
-            .prefetch_related('orderitem_set__menu_item')
-        )
-        active_by_table = {o.table_id: o for o in orders}
-
-        data = []
-        for t in tables:
-            row = TableSerializer(t).data
-            o = active_by_table.get(t.id)
-            if o:
-                row['active_order'] = {
-                    'order_id': o.id,
-                    'items_count': o.orderitem_set.count(),
-                    'total': o.total_price(),
-                }
-            else:
-                row['active_order'] = None
-            data.append(row)
-        return Response(data)
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsManagerOrWaiter])
+    def available(self, request):
+        params = request.query_params
+        try:
+            start = parse_datetime(params.get('start', ''))
+            end = parse_datetime(params.get('end', ''))
+        except ValueError:
+            # well formed but impossible, e.g. 2025-02-30T19:00
+            start = end = None
+        if start is None or end is None:
+            raise ValidationError("Both start and end are required as ISO datetimes.")
+        if timezone.is_naive(start):
+            start = timezone.make_aware(start)
+        if timezone.is_naive(end):
+            end = timezone.make_aware(end)
+        if end <= start:
+            raise ValidationError("The end must be after the start.")
+        try:
+            chairs = int(params.get('chairs', 1))
+        except ValueError:
+            raise ValidationError("Chairs must be a number.")
+
+        tables = table_payloads(Table.objects.filter(chairs__gte=chairs).order_by('chairs', 'number'))
+        free_ids = set(reservation_index.free_tables([t['id'] for t in tables], start, end))
+        return Response([t for t in tables if t['id'] in free_ids])
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsManagerOrWaiter])
+    def nearest(self, request):
+        """Closest table to ``?top=&left=``, available by default; ``zone``/``status``/``chairs`` narrow it."""
+        params = request.query_params
+        try:
+            top, left = float(params['top']), float(params['left'])
+            chairs = int(params.get('chairs', 1))
+        except (KeyError, ValueError):
+            raise ValidationError("top and left are required numbers; chairs must be a number.")
+        qs = self.filter_queryset(self.get_queryset()).filter(chairs__gte=chairs)
+        if 'status' not in params:
+            qs = qs.filter(status='available')
+        hit = floor_index.nearest(top, left, allowed=set(qs.values_list('id', flat=True)))
+        if hit is None:
+            raise NotFound("No matching table.")
+        table_id, distance = hit
+        data = Table.objects.filter(pk=table_id).values(*TABLE_FIELDS).get()
+        return Response({**data, 'distance': round(distance, 2), 'zones': floor_index.zones_of(table_id)})
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsManagerOrWaiter])
     def seat(self, request, pk=None):
         table = self.get_object()
-        table.status = 'occupied'
-        table.save()
+        try:
+            transition_table(table, 'occupied')
+        except IllegalTransition as e:
+            return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         return Response({"detail": "Guests seated. Table is now occupied."}, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsManagerOrWaiter])
     def free(self, request, pk=None):
         table = self.get_object()
-        has_unpaid = Order.objects.filter(table=table, is_paid=False).exists()
-        if has_unpaid:
-            return Response({"detail": "Table has an active unpaid order."}, status=status.HTTP_400_BAD_REQUEST)
-        table.status = 'available'
-        table.save()
+        # the UPDATE checks for unpaid orders itself, so an order opened in between keeps the table
+        if not release(table.pk):
+            table.refresh_from_db(fields=['status'])
+            if table.status != 'available':
+                return Response({"detail": "Table has an active unpaid order."}, status=status.HTTP_400_BAD_REQUEST)
         return Response({"detail": "Table is now available."}, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsManager])
+    def close(self, request):
+        freed = release_many(Table.objects.all())
+        return Response({"detail": f"{freed} table(s) freed.", "freed": freed}, status=status.HTTP_200_OK)
+
 
-class OrderViewSet(viewsets.ModelViewSet):
-    queryset = Order.objects.all().select_related('table').prefetch_related('orderitem_set__menu_item')
+class OrderViewSet(IdempotentViewMixin, FieldSelectionViewMixin, viewsets.ModelViewSet):
+    queryset = Order.objects.all()
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated, IsManagerOrWaiter]
+    pagination_class = OrderPagination
+    # the cursor follows the filter's ordering, so the unique tiebreaker has to live there
+    filter_backends = [TiebreakOrderingFilter]
+    renderer_classes = FAST_RENDERERS
+    ordering_fields = ['total', 'created_at']
+    ordering = ['-created_at', '-id']
+    replica_actions = {'export'}
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -161,9 +452,31 @@ class OrderViewSet(viewsets.ModelViewSet):
         user = self.request.user
         if not user.is_authenticated:
             return Order.objects.none()
-        if user.role in ['waiter', 'manager']:
-            return super().get_queryset()
-        return Order.objects.none()
+        if user.role not in ['waiter', 'manager']:
+            return Order.objects.none()
+
+        qs = super().get_queryset()
+        params = self.request.query_params
+        try:
+            if params.get('min_total'):
+                qs = qs.filter(total__gte=int(params['min_total']))
+            if params.get('max_total'):
+                qs = qs.filter(total__lte=int(params['max_total']))
+        except ValueError:
+            raise ValidationError("Total filters must be whole numbers.")
+
+        if self.action in ['list', 'retrieve']:
+            fields = self.requested_fields()
+            expand = self.requested_expand()
+            if fields is None or 'orderitem_set' in fields:
+                lines = OrderItem.objects.order_by('pk')
+                if expand is None or 'menu_item' in expand:
+                    lines = lines.select_related('menu_item')
+                qs = qs.prefetch_related(Prefetch('orderitem_set', queryset=lines))
+        elif self.action in ORDER_MUTATIONS:
+            # tickets are labelled with the table number
+            qs = qs.select_related('table')
+        return qs
 
     def perform_create(self, serializer):
         table = serializer.validated_data['table']
@@ -175,10 +488,77 @@ class OrderViewSet(viewsets.ModelViewSet):
         except IntegrityError:
             raise ValidationError("There is already an active order for this table.")
 
+    def update(self, request, *args, **kwargs):
+        response = super().update(request, *args, **kwargs)
+        response['ETag'] = order_etag(response.data['id'], response.data['version'])
+        return response
+
+    def perform_update(self, serializer):
+        order = serializer.instance
+        with transaction.atomic():
+            self._claim(order)
+            # the claim bumped the version and the row may have moved since it was read
+            order.refresh_from_db(fields=['version', 'total', 'items_count'])
+            try:
+                with transaction.atomic():
+                    serializer.save()
+            except IntegrityError:
+                raise ValidationError("There is already an active order for this table.")
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            self._claim(instance)
+            instance.delete()
+
     def _ensure_not_paid(self, order: Order):
         if order.is_paid:
             raise ValidationError("The order has already been paid for.")
 
+    def _expected_version(self, order: Order):
+        """The version an ``If-Match: "order-<id>-v<version>"`` header asks for, if any."""
+        header = self.request.headers.get('If-Match', '').strip()
+        if not header or header == '*':
+            return None
+        match = re.fullmatch(r'(?:W/)?"order-(\d+)-v(\d+)"', header)
+        if match is None or int(match.group(1)) != order.pk:
+            raise PreconditionFailed("If-Match must be this order's ETag.")
+        return int(match.group(2))
+
+    def _claim(self, order: Order):
+        """Claim the order for a mutation inside the current transaction."""
+        if not order.claim(self._expected_version(order)):
+            order.refresh_from_db(fields=['is_paid', 'version'])
+            self._ensure_not_paid(order)
+            raise PreconditionFailed()
+
+    def _order_response(self, order_id: int):
+        # built inside the mutation's transaction: if this read fails the change
+        # rolls back with it, so a retry never applies it twice
+        row = Order.objects.filter(pk=order_id).values(*ORDER_FIELDS).get()
+        return Response(order_payloads([row])[0], status=status.HTTP_200_OK,
+                        headers={'ETag': order_etag(row['id'], row['version'])})
+
+    def _full_payload(self):
+        # without ?fields= or ?expand= the response is the whole order, built from values() rows
+        return self.requested_fields() is None and self.requested_expand() is None
+
+    def _order_rows(self):
+        return self.filter_queryset(self.get_queryset()).prefetch_related(None).values(*ORDER_FIELDS)
+
+    def list(self, request, *args, **kwargs):
+        if not self._full_payload():
+            return super().list(request, *args, **kwargs)
+        return self.get_paginated_response(order_payloads(self.paginate_queryset(self._order_rows())))
+
+    def retrieve(self, request, *args, **kwargs):
+        if self._full_payload():
+            row = get_object_or_404(self._order_rows(), pk=kwargs['pk'])
+            data, pk, version = order_payloads([row])[0], row['id'], row['version']
+        else:
+            order = self.get_object()
+            data, pk, version = self.get_serializer(order).data, order.id, order.version
+        return Response(data, headers={'ETag': order_etag(pk, version)})
+
     @action(detail=True, methods=['post'])
     def add_item(self, request, pk=None):
         order = self.get_object()
@@ -190,19 +570,33 @@ class OrderViewSet(viewsets.ModelViewSet):
             raise ValidationError("The quantity must be at least 1.")
 
         try:
-            mi = MenuItem.objects.get(pk=menu_item_id)
-        except MenuItem.DoesNotExist:
+            mi = menu_catalog().by_id.get(int(menu_item_id))
+        except (TypeError, ValueError):
+            mi = None
+        if mi is None:
             raise ValidationError("Non-existing item.")
 
-        oi, created = OrderItem.objects.get_or_create(
-            order=order, menu_item=mi, defaults={'quantity': qty}
-        )
-        if not created:
-            oi.quantity += qty
-            oi.save()
-
-        fresh = _fresh_order(order.id)
-        return Response(OrderSerializer(fresh).data, status=status.HTTP_200_OK)
+        with transaction.atomic():
+            self._claim(order)
+            lines = OrderItem.objects.filter(order=order, menu_item=mi)
+            # an existing line keeps the price it was first ordered at
+            unit_price = lines.values_list('unit_price', flat=True).first()
+            created = False
+            if unit_price is None:
+                try:
+                    with transaction.atomic():
+                        OrderItem.objects.create(order=order, menu_item=mi, quantity=qty, unit_price=mi.price)
+                    created = True
+                    unit_price = mi.price
+                except IntegrityError:
+                    # the line was inserted by a writer that didn't claim the order
+                    unit_price = lines.values_list('unit_price', flat=True).get()
+            if not created:
+                lines.update(quantity=F('quantity') + qty)
+                order_lines_changed(order.id)
+            order.adjust_totals(unit_price * qty, 1 if created else 0)
+            enqueue_tickets(order.id, order.table.number, [(mi, qty)])
+            return self._order_response(order.id)
 
     @action(detail=True, methods=['post'])
     def set_item_qty(self, request, pk=None):
@@ -214,16 +608,19 @@ class OrderViewSet(viewsets.ModelViewSet):
         if qty < 1:
             raise ValidationError("The quantity must be at least 1.")
 
-        try:
-            oi = OrderItem.objects.get(pk=oi_id, order=order)
-        except OrderItem.DoesNotExist:
-            raise ValidationError("The item does not exist for this order.")
-
-        oi.quantity = qty
-        oi.save()
-
-        fresh = _fresh_order(order.id)
-        return Response(OrderSerializer(fresh).data, status=status.HTTP_200_OK)
+        with transaction.atomic():
+            self._claim(order)
+            # read after the claim, so no other writer can move the quantity under us
+            try:
+                oi = OrderItem.objects.select_related('menu_item').get(pk=oi_id, order=order)
+            except (OrderItem.DoesNotExist, ValueError):
+                raise ValidationError("The item does not exist for this order.")
+            added = qty - oi.quantity
+            oi.quantity = qty
+            oi.save(update_fields=['quantity'])
+            order.adjust_totals(oi.unit_price * added)
+            enqueue_tickets(order.id, order.table.number, [(oi.menu_item, added)])
+            return self._order_response(order.id)
 
     @action(detail=True, methods=['post'])
     def remove_item(self, request, pk=None):
@@ -231,15 +628,103 @@ class OrderViewSet(viewsets.ModelViewSet):
         self._ensure_not_paid(order)
 
         oi_id = request.data.get('order_item_id')
-        try:
-            oi = OrderItem.objects.get(pk=oi_id, order=order)
-        except OrderItem.DoesNotExist:
-            raise ValidationError("The item does not exist for this order.")
+        with transaction.atomic():
+            self._claim(order)
+            try:
+                oi = OrderItem.objects.select_related('menu_item').get(pk=oi_id, order=order)
+            except (OrderItem.DoesNotExist, ValueError):
+                raise ValidationError("The item does not exist for this order.")
+            oi.delete()
+            order.adjust_totals(-oi.unit_price * oi.quantity, -1)
+            return self._order_response(order.id)
 
-        oi.delete()
+    @action(detail=True, methods=['post'])
+    def batch(self, request, pk=None):
+        order = self.get_object()
+        self._ensure_not_paid(order)
 
-        fresh = _fresh_order(order.id)
-        return Response(OrderSerializer(fresh).data, status=status.HTTP_200_OK)
+        operations = request.data.get('operations') if isinstance(request.data, dict) else None
+        if not isinstance(operations, list) or not operations:
+            raise ValidationError("A non-empty list of operations is required.")
+
+        menu_ids = set()
+        for i, op in enumerate(operations):
+            if not isinstance(op, dict) or op.get('op') not in ['add_item', 'set_item_qty', 'remove_item']:
+                raise ValidationError(f"Operation {i}: op must be add_item, set_item_qty or remove_item.")
+            if op['op'] != 'remove_item':
+                try:
+                    op['quantity'] = int(op.get('quantity', 1))
+                except (TypeError, ValueError):
+                    raise ValidationError(f"Operation {i}: the quantity must be a number.")
+                if op['quantity'] < 1:
+                    raise ValidationError(f"Operation {i}: the quantity must be at least 1.")
+            key = 'menu_item' if op['op'] == 'add_item' else 'order_item_id'
+            try:
+                op[key] = int(op.get(key))
+            except (TypeError, ValueError):
+                raise ValidationError(f"Operation {i}: {key} is required.")
+            if op['op'] == 'add_item':
+                menu_ids.add(op['menu_item'])
+
+        menu = menu_catalog().by_id
+        with transaction.atomic():
+            # lines are read after the claim, so they can't change before the writes below
+            self._claim(order)
+            lines = {oi.id: oi for oi in OrderItem.objects.filter(order=order).select_related('menu_item')}
+            by_menu_item = {oi.menu_item_id: oi for oi in lines.values()}
+            quantities = {pk: oi.quantity for pk, oi in lines.items()}
+            before = sum(oi.unit_price * oi.quantity for oi in lines.values())
+            created, changed, removed = [], set(), set()
+
+            for i, op in enumerate(operations):
+                if op['op'] == 'add_item':
+                    mi = menu.get(op['menu_item'])
+                    if mi is None:
+                        raise ValidationError(f"Operation {i}: non-existing item.")
+                    oi = by_menu_item.get(mi.id)
+                    if oi is None:
+                        oi = OrderItem(order=order, menu_item=mi, quantity=op['quantity'], unit_price=mi.price)
+                        by_menu_item[mi.id] = oi
+                        created.append(oi)
+                    else:
+                        oi.quantity += op['quantity']
+                        if oi.pk:
+                            changed.add(oi.pk)
+                    continue
+
+                oi = lines.get(op['order_item_id'])
+                if oi is None or oi.pk in removed:
+                    raise ValidationError(f"Operation {i}: the item does not exist for this order.")
+                if op['op'] == 'set_item_qty':
+                    oi.quantity = op['quantity']
+                    changed.add(oi.pk)
+                else:
+                    removed.add(oi.pk)
+                    changed.discard(oi.pk)
+                    del by_menu_item[oi.menu_item_id]
+
+            # summed over the same lines as ``before``, plus the new ones
+            kept = [oi for pk, oi in lines.items() if pk not in removed]
+            after = sum(oi.unit_price * oi.quantity for oi in kept + created)
+            # only what the batch added on top of the old lines goes to the stations; a line
+            # removed and added again is a new line, so all of it goes. Worked out before the
+            # writes, as the new lines may reuse a removed line's id.
+            added = [(oi.menu_item, oi.quantity - (quantities[oi.pk] if oi.pk else 0))
+                     for oi in by_menu_item.values()]
+            if removed:
+                OrderItem.objects.filter(pk__in=removed).delete()
+            if changed:
+                OrderItem.objects.bulk_update([lines[pk] for pk in changed], ['quantity'])
+            if created:
+                OrderItem.objects.bulk_create(created)
+            order.adjust_totals(after - before, len(created) - len(removed))
+            order_lines_changed(order.id)
+            enqueue_tickets(order.id, order.table.number, added)
+            return self._order_response(order.id)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated, IsManager])
+    def export(self, request):
+        return export_response(request, 'orders', Order)
 
     @action(detail=True, methods=['post'])
     def pay(self, request, pk=None):
@@ -247,63 +732,174 @@ class OrderViewSet(viewsets.ModelViewSet):
         self._ensure_not_paid(order)
 
         with transaction.atomic():
+            # re-read under a row lock so two payments can't both count the order
+            order = Order.objects.select_for_update().get(pk=order.pk)
+            self._ensure_not_paid(order)
+            expected = self._expected_version(order)
+            if expected is not None and expected != order.version:
+                raise PreconditionFailed()
             order.is_paid = True
+            order.paid_at = timezone.now()
+            order.version += 1
             order.save()
+            record_paid_order(order)
         return Response({"detail": "The payment has been recorded."}, status=status.HTTP_200_OK)
 
 class ZoneViewSet(viewsets.ModelViewSet):
     queryset = Zone.objects.all()
     serializer_class = ZoneSerializer
+    replica_actions = {'list', 'retrieve', 'tables'}
+
+    @action(detail=True, methods=['get'])
+    def tables(self, request, pk=None):
+        zone = self.get_object()
+        tables = Table.objects.filter(pk__in=floor_index.tables_in([zone.pk])).order_by('number')
+        return Response(table_payloads(tables))
+
+class ReportViewSet(viewsets.ViewSet):
+    """Revenue reports for ``?start=&end=`` (inclusive ISO dates, default the last 30 days),
+    answered from the daily rollups."""
+    permission_classes = [IsAuthenticated, IsManager]
+    replica_actions = {'revenue', 'menu_items', 'tables', 'item_types'}
+
+    def _range(self):
+        return date_range(self.request)
+
+    def _grouped(self, model, key, fields, order_by):
+        start, end = self._range()
+        rows = (
+            model.objects.filter(day__range=(start, end))
+            .values(*key).annotate(**{f: Sum(f) for f in fields})
+            .order_by(*order_by)
+        )
+        return Response({'start': start, 'end': end, 'results': list(rows)})
+
+    @action(detail=False, methods=['get'])
+    def revenue(self, request):
+        start, end = self._range()
+        days = list(
+            DailyRevenue.objects.filter(day__range=(start, end))
+            .order_by('day').values('day', 'revenue', 'orders_count', 'items_count')
+        )
+        totals = {f: sum(d[f] for d in days) for f in ['revenue', 'orders_count', 'items_count']}
+        return Response({'start': start, 'end': end, 'totals': totals, 'days': days})
 
+    @action(detail=False, methods=['get'], url_path='menu-items')
+    def menu_items(self, request):
+        return self._grouped(DailyMenuItemSales, ['menu_item_id', 'menu_item__code', 'menu_item__name'],
+                             ['quantity', 'revenue'], ['-revenue', 'menu_item_id'])
 
-User = get_user_model()
+    @action(detail=False, methods=['get'])
+    def tables(self, request):
+        return self._grouped(DailyTableRevenue, ['table_id', 'table__number'],
+                             ['revenue', 'orders_count'], ['-revenue', 'table_id'])
 
-@api_view(['POST'])
-@permission_classes([AllowAny])
-def register_user(request):
+    @action(detail=False, methods=['get'], url_path='item-types')
+    def item_types(self, request):
+        return self._grouped(DailyItemTypeSales, ['item_type'], ['quantity', 'revenue'], ['-revenue', 'item_type'])
 
-    data = request.data
 
-    username = data.get('username', '').strip()
-    email = data.get('email', '').strip()
-    password1 = data.get('password1', '')
-    password2 = data.get('password2', '')
-    role = data.get('role', 'client')
+class ArchivedOrderViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = ArchivedOrder.objects.all()
+    serializer_class = ArchivedOrderSerializer
+    permission_classes = [IsAuthenticated, IsManagerOrWaiter]
+    pagination_class = OrderPagination
+    replica_actions = {'list', 'retrieve'}
 
-    errors = {}
+    def get_queryset(self):
+        qs = super().get_queryset()
+        table_param = self.request.query_params.get('table')
+        if table_param:
+            qs = qs.filter(table_number=table_param)
+        return qs
 
-    if not username:
-        errors['username'] = ['Username is required']
-    elif len(username) < 3:
-        errors['username'] = ['Username must be at least 3 characters']
-    elif User.objects.filter(username=username).exists():
-        errors['username'] = ['Username already exists']
 
-    if not email:
-        errors['email'] = ['Email is required']
-    elif '@' not in email or '.' not in email:
-        errors['email'] = ['Please enter a valid email address']
-    elif User.objects.filter(email=email).exists():
-        errors['email'] = ['Email already exists']
+class ArchivedReservationViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = ArchivedReservation.objects.all()
+    serializer_class = ArchivedReservationSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = ReservationPagination
+    replica_actions = {'list', 'retrieve'}
 
-    if not password1:
-        errors['password1'] = ['Password is required']
-    elif len(password1) < 6:
-        errors['password1'] = ['Password must be at least 6 characters']
+    def get_queryset(self):
+        qs = super().get_queryset()
+        user = self.request.user
+        if user.role == 'client':
+            qs = qs.filter(user_id=user.id)
+        elif user.role not in ['manager', 'waiter']:
+            qs = qs.none()
 
-    if not password2:
-        errors['password2'] = ['Password confirmation is required']
-    elif password1 != password2:
-        errors['password2'] = ['Passwords do not match']
+        status_param = self.request.query_params.get("status")
+        if status_param:
+            qs = qs.filter(status=status_param)
+        return qs
 
-    if role not in ['client', 'waiter', 'manager']:
-        errors['role'] = ['Invalid role selected']
 
-    if password1 and not errors.get('password1'):
+class ImportView(APIView):
+    """Streams a CSV or NDJSON request body into ``imports.import_rows``; ``?dry_run=1`` only reports."""
+    permission_classes = [IsAuthenticated, IsManager]
+
+    def post(self, request, kind):
+        if kind not in IMPORT_SPECS:
+            raise NotFound()
+        content_type = request.content_type or ''
+        if 'csv' in content_type:
+            fmt = 'csv'
+        elif 'ndjson' in content_type or 'jsonl' in content_type:
+            fmt = 'ndjson'
+        else:
+            raise UnsupportedMediaType(content_type)
+        # iterate the body stream line by line; request.data would buffer the whole body
+        lines = (line.decode('utf-8-sig') for line in request.stream or [])
+        report = import_rows(
+            kind, read_rows(lines, fmt),
+            dry_run=request.query_params.get('dry_run') in ['1', 'true'],
+        )
+        return Response(report.as_dict(), status=status.HTTP_200_OK)
+
+
+class TicketActionView(APIView):
+    """``POST {"ids": [...]}`` to ``ack`` (seen) or ``bump`` (done) a station's tickets."""
+    permission_classes = [IsAuthenticated, IsManagerOrWaiter]
+    ACTIONS = {'ack': ack_tickets, 'bump': bump_tickets}
+
+    def post(self, request, station, verb):
+        if station not in STATIONS.values() or verb not in self.ACTIONS:
+            raise NotFound()
+        ids = request.data.get('ids') if isinstance(request.data, dict) else None
+        if not isinstance(ids, list) or not ids:
+            raise ValidationError("A non-empty list of ticket ids is required.")
         try:
-            validate_password(password1)
-        except ValidationError as e:
-            errors['password1'] = list(e.messages)
+            ids = [int(i) for i in ids]
+        except (TypeError, ValueError):
+            raise ValidationError("Ticket ids must be numbers.")
+        return Response({"updated": self.ACTIONS[verb](station, ids)}, status=status.HTTP_200_OK)
+
+
+class BulkUserView(APIView):
+    """Manager-only staff provisioning: ``{"users": [<register_user payload>, ...]}``."""
+    permission_classes = [IsAuthenticated, IsManager]
+
+    def post(self, request):
+        rows = request.data.get('users') if isinstance(request.data, dict) else None
+        if not isinstance(rows, list) or not rows or not all(isinstance(r, dict) for r in rows):
+            raise ValidationError({"users": "Send a non-empty list of user objects."})
+        if len(rows) > BULK_USERS_LIMIT:
+            raise ValidationError({"users": f"At most {BULK_USERS_LIMIT} users per request."})
+        return Response({"results": provision_users(rows)}, status=status.HTTP_200_OK)
+
+
+User = get_user_model()
+
+@api_view(['POST'])
+@permission_classes([AllowAny])
+def register_user(request):
+    if not isinstance(request.data, dict):
+        return Response({'non_field_errors': ['Send a user object.']}, status=status.HTTP_400_BAD_REQUEST)
+
+    values, errors = clean_registration(request.data)
+    add_conflict_errors(values, errors, *taken([values['username']], [values['email']]))
+    username, email, password1, role = values['username'], values['email'], values['password'], values['role']
 
     if errors:
         return Response(errors, status=status.HTTP_400_BAD_REQUEST)
@@ -319,12 +915,7 @@ def register_user(request):
 
         return Response({
             'message': 'User registered successfully',
-            'user': {
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'role': user.role
-            }
+            'user': user_payload(user)
         }, status=status.HTTP_201_CREATED)
 
     except IntegrityError:
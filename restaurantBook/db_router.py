@@ -0,0 +1,102 @@
+"""
+Read-replica routing.
+
+Replica aliases are listed in ``settings.REPLICA_DATABASES``. Only requests
+the ``ReplicaRoutingMiddleware`` marks as safe go to a replica: safe-method
+requests for a viewset action listed in that viewset's ``replica_actions``,
+from a client that has not written recently. After a successful write the
+client is pinned to the primary for ``REPLICA_PIN_SECONDS``, so it reads its
+own writes.
+"""
+
+import hashlib
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import Resolver404, resolve
+
+use_replica = ContextVar('use_replica', default=False)
+
+PIN_KEY = 'restaurant:primary-pin:{}'
+
+
+def replicas():
+    return getattr(settings, 'REPLICA_DATABASES', [])
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if use_replica.get() and replicas():
+            return random.choice(replicas())
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get their schema from the primary
+        return db not in replicas()
+
+
+def _client_key(request):
+    ident = (
+        request.META.get('HTTP_AUTHORIZATION')
+        or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        or request.META.get('REMOTE_ADDR', '')
+    )
+    return PIN_KEY.format(hashlib.blake2b(ident.encode(), digest_size=16).hexdigest())
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = use_replica.set(self._wants_replica(request) and not cache.get(_client_key(request)))
+        try:
+            response = self.get_response(request)
+        finally:
+            use_replica.reset(token)
+        if self._pins(request, response):
+            cache.set(_client_key(request), True, timeout=getattr(settings, 'REPLICA_PIN_SECONDS', 5))
+        return response
+
+    async def __acall__(self, request):
+        token = use_replica.set(self._wants_replica(request) and not await cache.aget(_client_key(request)))
+        try:
+            response = await self.get_response(request)
+        finally:
+            use_replica.reset(token)
+        if self._pins(request, response):
+            await cache.aset(_client_key(request), True, timeout=getattr(settings, 'REPLICA_PIN_SECONDS', 5))
+        return response
+
+    def _wants_replica(self, request):
+        # resolved here rather than in process_view, which an async chain
+        # would have to hop to a thread for
+        if request.method not in ('GET', 'HEAD') or not replicas():
+            return False
+        try:
+            match = resolve(request.path_info, getattr(request, 'urlconf', None))
+        except Resolver404:
+            return False
+        view_cls = getattr(match.func, 'cls', None)
+        action = (getattr(match.func, 'actions', None) or {}).get(request.method.lower())
+        return action in getattr(view_cls, 'replica_actions', ())
+
+    def _pins(self, request, response):
+        return request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400 and replicas()
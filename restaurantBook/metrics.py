@@ -0,0 +1,249 @@
+"""
+Per-request SQL and latency instrumentation.
+
+``RequestMetricsMiddleware`` times every request, counts and times its SQL
+through an execute wrapper on every connection and times response rendering.
+The middleware runs sync or async, whichever the handler is. The
+numbers are folded into in-process histograms that ``metrics_view``
+exposes in the Prometheus text format. Each worker process keeps its own registry. The endpoint is
+open to managers and to the internal addresses in ``METRICS_ALLOWED_IPS``.
+Managers, and everyone when ``DEBUG`` is on, also get them back as a
+``Server-Timing`` header.
+"""
+
+import bisect
+import threading
+from contextvars import ContextVar
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, JsonResponse
+
+from restaurant.authentication import aauthenticate
+
+# any other verb is counted as "other", so clients can't mint label values
+HTTP_METHODS = frozenset({'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'})
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+def _labels(names, values):
+    return ','.join(f'{n}="{v}"' for n, v in zip(names, values))
+
+
+class Histogram:
+    def __init__(self, name, doc, label_names, buckets):
+        self.name = name
+        self.doc = doc
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+
+    def observe(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.doc}', f'# TYPE {self.name} histogram']
+        for labels, (counts, total) in sorted(self._series.items()):
+            base = _labels(self.label_names, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{base}}} {total}')
+            lines.append(f'{self.name}_count{{{base}}} {cumulative}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, doc, label_names):
+        self.name = name
+        self.doc = doc
+        self.label_names = label_names
+        self._series = {}
+
+    def inc(self, labels):
+        self._series[labels] = self._series.get(labels, 0) + 1
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.doc}', f'# TYPE {self.name} counter']
+        for labels, value in sorted(self._series.items()):
+            lines.append(f'{self.name}{{{_labels(self.label_names, labels)}}} {value}')
+        return lines
+
+
+LABELS = ('route', 'action', 'method')
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = Counter('restaurant_http_requests_total', 'Requests by route, action, method and status.',
+                                LABELS + ('status',))
+        self.latency = Histogram('restaurant_http_request_duration_seconds', 'Total request latency.',
+                                 LABELS, LATENCY_BUCKETS)
+        self.sql_time = Histogram('restaurant_http_request_sql_seconds', 'Time spent in SQL per request.',
+                                  LABELS, LATENCY_BUCKETS)
+        self.sql_queries = Histogram('restaurant_http_request_sql_queries', 'SQL queries per request.',
+                                     LABELS, QUERY_BUCKETS)
+        self.render_time = Histogram('restaurant_http_request_serialize_seconds', 'Response rendering time per request.',
+                                     LABELS, LATENCY_BUCKETS)
+
+    def record(self, sample):
+        labels = (sample.route, sample.action, sample.method)
+        with self.lock:
+            self.requests.inc(labels + (str(sample.status),))
+            self.latency.observe(labels, sample.total)
+            self.sql_time.observe(labels, sample.sql_time)
+            self.sql_queries.observe(labels, sample.queries)
+            self.render_time.observe(labels, sample.render_time)
+
+    def expose(self):
+        with self.lock:
+            lines = []
+            for metric in (self.requests, self.latency, self.sql_time, self.sql_queries, self.render_time):
+                lines.extend(metric.expose())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class RequestSample:
+    __slots__ = ('route', 'action', 'method', 'status', 'queries', 'sql_time', 'render_time', 'total')
+
+    def __init__(self, method):
+        self.method = method if method in HTTP_METHODS else 'other'
+        self.route = 'unmatched'
+        self.action = ''
+        self.status = 0
+        self.queries = 0
+        self.sql_time = 0.0
+        self.render_time = 0.0
+        self.total = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += perf_counter() - start
+            self.queries += 1
+
+    def server_timing(self):
+        return (
+            f'db;dur={self.sql_time * 1000:.2f};desc="{self.queries} queries", '
+            f'serialize;dur={self.render_time * 1000:.2f}, '
+            f'total;dur={self.total * 1000:.2f}'
+        )
+
+
+current_sample = ContextVar('request_metrics', default=None)
+
+
+def _timed_execute(execute, sql, params, many, context):
+    sample = current_sample.get()
+    if sample is None:
+        return execute(sql, params, many, context)
+    return sample(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def instrument_connection(sender, connection, **kwargs):
+    # installed once per connection; the context variable finds the request, also from
+    # the threads async views run their queries on
+    if _timed_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _timed_execute)
+
+
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        # connections opened before this module was imported never sent the signal
+        for conn in connections.all(initialized_only=True):
+            instrument_connection(None, conn)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        sample, token, start = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_sample.reset(token)
+        return self._finish(request, response, sample, start)
+
+    async def __acall__(self, request):
+        sample, token, start = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_sample.reset(token)
+        return self._finish(request, response, sample, start)
+
+    def _start(self, request):
+        sample = request._metrics = RequestSample(request.method)
+        return sample, current_sample.set(sample), perf_counter()
+
+    def _finish(self, request, response, sample, start):
+        sample.total = perf_counter() - start
+
+        match = request.resolver_match
+        if match is not None:
+            if match.url_name == 'metrics':
+                return response
+            sample.route = match.view_name or match.route
+        view = (getattr(response, 'renderer_context', None) or {}).get('view')
+        manager = False
+        if view is not None:
+            sample.action = getattr(view, 'action', None) or ''
+            manager = getattr(view.request.user, 'role', None) == 'manager'
+        elif match is not None:
+            # native async views carry the DRF actions they stand in for
+            sample.action = (getattr(match.func, 'actions', None) or {}).get(request.method.lower(), '')
+        sample.status = response.status_code
+
+        # timings describe the backend, so they're for managers and development only
+        if settings.DEBUG or manager:
+            response['Server-Timing'] = sample.server_timing()
+        registry.record(sample)
+        return response
+
+    def process_template_response(self, request, response):
+        sample = request._metrics
+        render = response.render
+
+        def timed_render():
+            start = perf_counter()
+            try:
+                return render()
+            finally:
+                sample.render_time += perf_counter() - start
+
+        response.render = timed_render
+        return response
+
+
+async def metrics_view(request):
+    # scrapers on an address listed in METRICS_ALLOWED_IPS, otherwise managers only
+    if request.META.get('REMOTE_ADDR') not in getattr(settings, 'METRICS_ALLOWED_IPS', []):
+        user = await aauthenticate(request)
+        if user is None:
+            return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+        if user.role != 'manager':
+            return JsonResponse({"detail": "You do not have permission to perform this action."}, status=403)
+    return HttpResponse(registry.expose(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -32,6 +33,9 @@ SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=60),
     "AUTH_HEADER_TYPES": ("Bearer",),
+    # tokens carry the user's role so permission checks need no user query
+    "TOKEN_OBTAIN_SERIALIZER": "restaurant.authentication.RoleTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "restaurant.authentication.RoleTokenRefreshSerializer",
 }
 
 INSTALLED_APPS = [
@@ -48,15 +52,24 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "restaurant.authentication.RoleClaimsJWTAuthentication",
     )
 }
 
 AUTH_USER_MODEL = 'restaurant.User'
+
+# How long an approved reservation keeps its table; used by the availability search.
+RESERVATION_DURATION = timedelta(hours=2)
+# Threads that hash passwords in parallel for bulk staff provisioning.
+PASSWORD_HASH_WORKERS = 2
+# Cell size, in floor-plan units, of the grid index behind zone and nearest-table lookups.
+FLOOR_GRID_CELL = 100.0
 ALLOWED_HOSTS = ["127.0.0.1", "localhost"]
 
 
 MIDDLEWARE = [
+    "restaurantBook.metrics.RequestMetricsMiddleware",
+    "restaurantBook.db_router.ReplicaRoutingMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -98,6 +111,63 @@ DATABASES = {
     }
 }
 
+# The default cache carries state every worker process must see: the floor, menu,
+# availability and floor-plan versions, the ticket versions and the read-your-writes
+# pins. LocMemCache is per process, so it only works with a single worker; set
+# RESTAURANT_REDIS_URL (needs the redis package) whenever more than one process serves
+# the API. `manage.py check --deploy` warns while the default cache is process-local.
+REDIS_URL = os.environ.get("RESTAURANT_REDIS_URL")
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        },
+        "idempotency": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+            "KEY_PREFIX": "idempotency",
+        },
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        },
+        # Stored responses for Idempotency-Key retries: bounded, and each entry expires
+        # after IDEMPOTENCY_TTL.
+        "idempotency": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "idempotency",
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        },
+    }
+IDEMPOTENCY_TTL = 24 * 60 * 60
+
+# Read replicas, e.g. RESTAURANT_REPLICA_DBS=replica.sqlite3 for a local copy of the primary.
+# Safe reads on the viewsets that opt in go to a replica; see restaurantBook/db_router.py.
+REPLICA_DATABASES = []
+for i, name in enumerate(filter(None, os.environ.get("RESTAURANT_REPLICA_DBS", "").split(","))):
+    alias = f"replica{i + 1}"
+    DATABASES[alias] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / name,
+        "TEST": {"MIRROR": "default"},
+    }
+    REPLICA_DATABASES.append(alias)
+
+DATABASE_ROUTERS = ["restaurantBook.db_router.ReplicaRouter"]
+
+# Addresses (e.g. the Prometheus scraper) that may read /api/metrics without a manager token.
+METRICS_ALLOWED_IPS = []
+
+# Seconds a client keeps reading from the primary after it writes.
+REPLICA_PIN_SECONDS = 5
+
+# Reservation decision emails are sent by `manage.py run_jobs`. The console backend
+# prints them; set RESTAURANT_EMAIL_BACKEND (and the EMAIL_* settings) to deliver them.
+EMAIL_BACKEND = os.environ.get("RESTAURANT_EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend")
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
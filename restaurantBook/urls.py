@@ -5,8 +5,11 @@ from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from restaurant.views import (
     ReservationViewSet, TableViewSet, MenuItemViewSet, 
-    OrderViewSet, MeView, ZoneViewSet, register_user
+    OrderViewSet, MeView, ZoneViewSet, ReportViewSet,
+    ArchivedOrderViewSet, ArchivedReservationViewSet, ImportView, BulkUserView, TicketActionView, register_user
 )
+from restaurant.async_views import async_get, table_status, menu_list, zone_list, me, event_stream, station_tickets
+from restaurantBook.metrics import metrics_view
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
@@ -18,12 +21,27 @@ router.register(r'tables', TableViewSet, basename='table')
 router.register(r'menu-items', MenuItemViewSet)
 router.register(r'orders', OrderViewSet)
 router.register(r'zones', ZoneViewSet)
+router.register(r'reports', ReportViewSet, basename='report')
+router.register(r'archive/orders', ArchivedOrderViewSet)
+router.register(r'archive/reservations', ArchivedReservationViewSet)
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/register/', register_user, name='register'),  # New registration endpoint
+    path('api/users/bulk/', BulkUserView.as_view(), name='users-bulk'),
+    # native async versions of the hot read endpoints; other methods fall through to DRF
+    path('api/tables/status/', async_get(table_status, TableViewSet.as_view({'get': 'status'}, **TableViewSet.status.kwargs)), name='table-status'),
+    path('api/menu-items/', async_get(menu_list, MenuItemViewSet.as_view({'get': 'list', 'post': 'create'})),
+         name='menuitem-list'),
+    path('api/zones/', async_get(zone_list, ZoneViewSet.as_view({'get': 'list', 'post': 'create'})), name='zone-list'),
+    path('api/import/<str:kind>/', ImportView.as_view(), name='import'),
+    # kitchen/bar screens long-poll here, then ack and bump what they show
+    path('api/stations/<str:station>/tickets/', station_tickets, name='station-tickets'),
+    path('api/stations/<str:station>/tickets/<str:verb>/', TicketActionView.as_view(), name='station-tickets-action'),
     path('api/', include(router.urls)),
-    path("api/me/", MeView.as_view(), name="me")
+    path("api/me/", async_get(me, MeView.as_view()), name="me"),
+    path("api/events/", event_stream, name="events"),
+    path("api/metrics", metrics_view, name="metrics")
 ]
\ No newline at end of file